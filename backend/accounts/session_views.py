@@ -7,6 +7,7 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.db.models import Q
 from django.core.cache import cache
+from ptf.caching import ttl
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
 import logging
@@ -18,10 +19,11 @@ logger = logging.getLogger(__name__)
 User = get_user_model()
 
 # Cache configuration for optimization
+# Configured per namespace in settings.CACHE_TTLS
 CACHE_TIMEOUTS = {
-    'admin_dashboard': 30,  # 30 seconds for dashboard data
-    'session_stats': 60,    # 1 minute for stats
-    'admin_count': 300,     # 5 minutes for total admin count
+    'admin_dashboard': ttl('admin_dashboard', 30),  # dashboard data
+    'session_stats': ttl('session_stats', 60),      # stats
+    'admin_count': ttl('admin_count', 300),         # total admin count
 }
 
 
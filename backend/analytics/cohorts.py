@@ -0,0 +1,128 @@
+"""
+Cohort retention and churn
+
+Builds a month-of-joining x months-since-joining matrix. A member counts
+as retained in a month if a membership of theirs covers part of it or
+they checked in during it.
+
+The matrix comes from three flat fetches (members, membership date
+ranges, distinct member-months of attendance) and is then computed
+column-wise: every calendar month gets a bitset with one bit per member
+active in it, every cohort a bitset of its members, so each cell is a
+single AND plus a popcount rather than a loop over members.
+
+The result is precomputed nightly (manage.py precompute_cohorts) and
+served from the cache.
+"""
+
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from attendance.models import AttendanceLog
+from members.models import Member
+from memberships.models import Membership
+from ptf.caching import get_or_compute, store, ttl
+from .dates import add_months, months_between, start_of_day
+
+# Cohorts covered, ending with the current month
+COHORT_MONTHS = 12
+
+CACHE_KEY = 'analytics_cohorts'
+
+
+def _percent(part, whole):
+    return round(part / whole * 100, 1) if whole else 0.0
+
+
+class CohortAnalyzer:
+
+    @staticmethod
+    def get_matrix():
+        """Cached cohort matrix, computed on first use if the nightly run has not stored one"""
+        return get_or_compute(CACHE_KEY, CohortAnalyzer.build, ttl('cohorts', 86400))
+
+    @staticmethod
+    def precompute(today=None, months=COHORT_MONTHS):
+        """Compute the cohort matrix and cache it for get_matrix()"""
+        matrix = CohortAnalyzer.build(today, months)
+        store(CACHE_KEY, matrix, ttl('cohorts', 86400))
+        return matrix
+
+    @staticmethod
+    def build(today=None, months=COHORT_MONTHS):
+        """
+        Retention and churn for the cohorts of the last `months` calendar months
+
+        Returns:
+            Dict with one entry per cohort (size, and per month since
+            joining: retained and churned counts and rates) plus the
+            size-weighted average retention per month since joining
+        """
+        this_month = (today or timezone.localdate()).replace(day=1)
+        first = add_months(this_month, -(months - 1))
+        span = months_between(first, this_month) + 1
+
+        # Bulk fetches
+        joined = Member.objects.filter(
+            registration_date__gte=start_of_day(first)
+        ).values_list('id', 'registration_date')
+        ranges = Membership.objects.filter(
+            member__registration_date__gte=start_of_day(first),
+            end_date__gte=first,
+        ).values_list('member_id', 'start_date', 'end_date').order_by()
+        # Without order_by() the default ordering would join the DISTINCT
+        visits = AttendanceLog.objects.filter(
+            member__registration_date__gte=start_of_day(first),
+            check_in_time__gte=start_of_day(first),
+        ).annotate(month=TruncMonth('check_in_time')).values_list('member_id', 'month').order_by().distinct()
+
+        # One bit per member; cohort and active-month bitsets
+        bits = {}
+        cohort_masks = [0] * span
+        for member_id, registered in joined:
+            bits[member_id] = 1 << len(bits)
+            cohort_masks[months_between(first, timezone.localdate(registered))] |= bits[member_id]
+
+        active = [0] * span
+        for member_id, start_date, end_date in ranges:
+            low = max(months_between(first, start_date), 0)
+            high = min(months_between(first, end_date), span - 1)
+            for month in range(low, high + 1):
+                active[month] |= bits.get(member_id, 0)
+        for member_id, month in visits:
+            index = months_between(first, timezone.localdate(month))
+            if 0 <= index < span:
+                active[index] |= bits.get(member_id, 0)
+
+        cohorts = []
+        for index, mask in enumerate(cohort_masks):
+            size = mask.bit_count()
+            retained = [(active[month] & mask).bit_count() for month in range(index, span)]
+            churned = [0] + [
+                (active[month - 1] & ~active[month] & mask).bit_count()
+                for month in range(index + 1, span)
+            ]
+            cohorts.append({
+                'cohort': add_months(first, index).strftime('%Y-%m'),
+                'size': size,
+                'retained': retained,
+                'retention': [_percent(count, size) for count in retained],
+                'churned': churned,
+                'churnRate': [0.0] + [
+                    _percent(churned[k], retained[k - 1]) for k in range(1, len(retained))
+                ],
+            })
+
+        average = []
+        for offset in range(span):
+            rows = [row for row in cohorts if len(row['retained']) > offset]
+            average.append(_percent(
+                sum(row['retained'][offset] for row in rows),
+                sum(row['size'] for row in rows),
+            ))
+
+        return {
+            'generatedAt': timezone.now().isoformat(),
+            'cohorts': cohorts,
+            'averageRetention': average,
+        }
@@ -0,0 +1,27 @@
+"""Date helpers shared by the analytics modules"""
+
+from datetime import date, datetime, time
+
+from django.utils import timezone
+
+
+def start_of_day(day):
+    """Timezone-aware midnight at the start of a date"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def add_months(month, count):
+    """First day of the month `count` calendar months after `month`"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(start, end):
+    """Whole calendar months from start's month to end's month"""
+    return (end.year - start.year) * 12 + end.month - start.month
+
+
+def month_starts(today, count):
+    """First day of the last `count` calendar months, oldest first"""
+    this_month = today.replace(day=1)
+    return [add_months(this_month, -offset) for offset in range(count - 1, -1, -1)]
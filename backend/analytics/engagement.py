@@ -0,0 +1,154 @@
+"""
+Member engagement and new-member retention
+
+- Segments: visits per active member over the timeframe, bucketed by
+  visits per week. Whole calendar months are read from the MemberVisitMonth
+  snapshot, so only the partial months at the edges of the timeframe scan
+  AttendanceLog. A month's rows are final once it has ended and are never
+  recomputed; a refresh (at most once per analytics TTL) only scans
+  attendance from the earliest open month.
+- Retention: month 1 of the cached cohort matrix (analytics.cohorts)
+"""
+
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from attendance.models import AttendanceLog
+from attendance.rollups import AttendanceRollupService
+from ptf.caching import ttl
+from .cohorts import COHORT_MONTHS, CohortAnalyzer
+from .dates import add_months
+from .models import MemberVisitMonth
+
+logger = logging.getLogger(__name__)
+
+# Segment thresholds, in visits per week over the timeframe
+HIGH_VISITS_PER_WEEK = 2
+MODERATE_VISITS_PER_WEEK = 0.5
+
+REFRESHED_KEY = 'engagement_visit_months_refreshed'
+
+
+class EngagementService:
+
+    @staticmethod
+    def segments(date_range, active_members):
+        """
+        Bucket active members by visit frequency over the date range
+
+        Args:
+            date_range: {'start': date, 'end': date}
+            active_members: Number of active members (those without visits are low activity)
+
+        Returns:
+            Dict with highlyActive, moderatelyActive and lowActivity counts
+        """
+        start, end = date_range['start'], date_range['end']
+        weeks = max((end - start).days + 1, 7) / 7
+        if cache.add(REFRESHED_KEY, True, ttl('analytics')):
+            EngagementService.refresh_visit_months()
+
+        # Whole months that have ended come from the snapshot, the partial
+        # months at either edge from the logs
+        first_month = start if start.day == 1 else add_months(start.replace(day=1), 1)
+        after_months = add_months(end.replace(day=1), 1) if (end + timedelta(days=1)).day == 1 else end.replace(day=1)
+        after_months = min(after_months, timezone.localdate().replace(day=1))
+        if first_month >= after_months:
+            first_month = after_months = end + timedelta(days=1)
+
+        visits = Counter(dict(MemberVisitMonth.objects.filter(
+            month__gte=first_month, month__lt=after_months, member__status='active'
+        ).values('member').annotate(visits=Sum('visits')).order_by().values_list('member', 'visits')))
+        edges = (
+            AttendanceRollupService.logs_between(start, first_month - timedelta(days=1))
+            | AttendanceRollupService.logs_between(after_months, end)
+        )
+        visits.update(dict(edges.filter(member__status='active').values('member').annotate(
+            visits=Count('id')
+        ).order_by().values_list('member', 'visits')))
+
+        highly_active = moderately_active = 0
+        for count in visits.values():
+            if count / weeks >= HIGH_VISITS_PER_WEEK:
+                highly_active += 1
+            elif count / weeks >= MODERATE_VISITS_PER_WEEK:
+                moderately_active += 1
+        return {
+            'highlyActive': highly_active,
+            'moderatelyActive': moderately_active,
+            'lowActivity': max(active_members - highly_active - moderately_active, 0),
+        }
+
+    @staticmethod
+    def refresh_visit_months(today=None):
+        """
+        Recompute the MemberVisitMonth snapshot from its earliest open
+        month - one grouped AttendanceLog query
+
+        Returns:
+            Number of rows written
+        """
+        today = today or timezone.localdate()
+        this_month = today.replace(day=1)
+        snapshot = MemberVisitMonth.objects.aggregate(
+            first_open=Min('month', filter=Q(is_final=False)),
+            last_final=Max('month', filter=Q(is_final=True)),
+        )
+        first_open = snapshot['first_open'] or (
+            add_months(snapshot['last_final'], 1) if snapshot['last_final'] else None
+        )
+        if first_open is None:
+            first_visit = AttendanceLog.objects.aggregate(first=Min('check_in_time'))['first']
+            if first_visit is None:
+                return 0
+            first_open = timezone.localdate(first_visit).replace(day=1)
+        first_open = min(first_open, this_month)
+
+        rows = AttendanceRollupService.logs_between(first_open, today).values(
+            'member', month=TruncMonth('check_in_time')
+        ).annotate(visits=Count('id')).order_by()
+        cells = []
+        for row in rows:
+            month = timezone.localdate(row['month'])
+            cells.append(MemberVisitMonth(
+                member_id=row['member'], month=month, visits=row['visits'], is_final=month < this_month,
+            ))
+        try:
+            with transaction.atomic():
+                MemberVisitMonth.objects.filter(month__gte=first_open).delete()
+                MemberVisitMonth.objects.bulk_create(cells, batch_size=1000)
+        except IntegrityError:
+            # A concurrent refresh wrote the same months
+            logger.info("Member visit months refreshed concurrently; keeping the other result")
+        return len(cells)
+
+    @staticmethod
+    def new_member_retention(date_range):
+        """
+        Share of new members retained in the month after joining, over the
+        complete cohorts the timeframe covers (at least the latest)
+
+        Month 1 of the cohort matrix (analytics.cohorts), so it agrees with
+        analytics/cohorts/ and costs a cache read once the matrix is built.
+
+        Returns:
+            Percentage, rounded to one decimal
+        """
+        # The latest cohort whose month after joining has ended
+        latest = add_months(timezone.localdate().replace(day=1), -2)
+        cohorts = max(1, min(COHORT_MONTHS - 2, round((date_range['end'] - date_range['start']).days / 30)))
+        first, last = add_months(latest, -(cohorts - 1)).strftime('%Y-%m'), latest.strftime('%Y-%m')
+
+        size = retained = 0
+        for row in CohortAnalyzer.get_matrix()['cohorts']:
+            if first <= row['cohort'] <= last and len(row['retained']) > 1:
+                size += row['size']
+                retained += row['retained'][1]
+        return round(retained / size * 100, 1) if size else 0.0
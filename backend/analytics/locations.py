@@ -0,0 +1,176 @@
+"""
+Outdoor location analytics
+
+Everything per location comes from grouped queries keyed on location_id,
+so the cost depends on the number of locations and days, not on the
+number of outdoor memberships or visits:
+
+- memberships: one GROUP BY location over outdoor Membership rows, with
+  revenue from their ledger balances
+- attendance: one range read of the daily attendance rollups
+- revenue (drill-down): one range read of the monthly revenue rollups
+"""
+
+from collections import defaultdict
+
+from django.db.models import Count, Q, Sum
+
+from attendance.models import DailyAttendanceRollup
+from attendance.rollups import AttendanceRollupService
+from members.models import Location
+from memberships.models import Membership
+from payments.models import MonthlyRevenueRollup
+from .dates import month_starts
+from .peaks import PEAK_DAYS, WEEKDAYS
+
+# Months in a location's revenue trend
+TREND_MONTHS = 6
+
+PEAK_HOURS = 2
+
+
+def _days(date_range):
+    return (date_range['end'] - date_range['start']).days + 1
+
+
+def _peak_days(visits_by_date):
+    weekdays = defaultdict(int)
+    for day, visits in visits_by_date.items():
+        weekdays[day.weekday()] += visits
+    busiest = sorted(
+        ((visits, weekday) for weekday, visits in weekdays.items() if visits),
+        key=lambda day: (-day[0], day[1]),
+    )
+    return [WEEKDAYS[weekday] for _, weekday in busiest[:PEAK_DAYS]]
+
+
+def _membership_counts(memberships):
+    return memberships.annotate(
+        members=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        suspended=Count('id', filter=Q(status='suspended')),
+        expired=Count('id', filter=Q(status='expired')),
+        revenue=Sum('ledger_balance__paid'),
+    )
+
+
+def _utilization(row):
+    return round(row['active'] / row['members'] * 100, 1) if row['members'] else 0
+
+
+class LocationAnalyticsService:
+
+    @staticmethod
+    def _outdoor_rollups(date_range):
+        AttendanceRollupService.refresh_stale(date_range['start'], date_range['end'])
+        return DailyAttendanceRollup.objects.filter(
+            visit_type='outdoor',
+            location__isnull=False,
+            date__range=(date_range['start'], date_range['end']),
+        )
+
+    @staticmethod
+    def summary(date_range):
+        """
+        Per-location figures for the outdoor analytics page
+
+        Returns:
+            List of {id, name, members, active, revenue, utilization,
+            visits, daily_avg, peak_days}, one per location with outdoor
+            memberships
+        """
+        rows = _membership_counts(
+            Membership.objects.filter(plan__membership_type='outdoor', location__isnull=False)
+            .values('location_id', 'location__name')
+        ).order_by('location__name')
+
+        visits = defaultdict(dict)
+        daily = LocationAnalyticsService._outdoor_rollups(date_range).values(
+            'location_id', 'date'
+        ).annotate(visits=Sum('visits')).order_by()
+        for row in daily:
+            visits[row['location_id']][row['date']] = row['visits']
+
+        locations = []
+        for row in rows:
+            location_visits = visits.get(row['location_id'], {})
+            total = sum(location_visits.values())
+            locations.append({
+                'id': row['location_id'],
+                'name': row['location__name'],
+                'members': row['members'],
+                'active': row['active'],
+                'revenue': float(row['revenue'] or 0),
+                'utilization': _utilization(row),
+                'visits': total,
+                'daily_avg': round(total / _days(date_range), 1),
+                'peak_days': _peak_days(location_visits),
+            })
+        return locations
+
+    @staticmethod
+    def detail(location_id, date_range, today):
+        """
+        Drill-down for one location
+
+        Raises:
+            Location.DoesNotExist: Unknown location
+        """
+        location = Location.objects.get(pk=location_id)
+
+        plans = list(_membership_counts(
+            Membership.objects.filter(location_id=location_id).values('plan_id', 'plan__plan_name')
+        ).order_by('plan__plan_name'))
+        totals = {
+            name: sum(row[name] or 0 for row in plans)
+            for name in ('members', 'active', 'suspended', 'expired', 'revenue')
+        }
+
+        daily, hourly = {}, [0] * 24
+        rollups = LocationAnalyticsService._outdoor_rollups(date_range).filter(
+            location_id=location_id
+        ).values_list('date', 'visits', 'hourly_visits')
+        for day, visits, hours in rollups:
+            daily[day] = visits
+            for hour, count in enumerate(hours or []):
+                hourly[hour] += count
+        visits = sum(daily.values())
+        busiest_hours = sorted(
+            (hour for hour in range(24) if hourly[hour]), key=lambda hour: (-hourly[hour], hour)
+        )[:PEAK_HOURS]
+
+        months = month_starts(today, TREND_MONTHS)
+        revenue = dict(
+            MonthlyRevenueRollup.objects.filter(location_id=location_id, month__gte=months[0])
+            .values('month').annotate(amount=Sum('amount')).order_by().values_list('month', 'amount')
+        )
+
+        return {
+            'location': {'id': location.id, 'name': location.name, 'code': location.code},
+            'memberships': {
+                **totals,
+                'revenue': float(totals['revenue']),
+                'utilization': _utilization(totals),
+            },
+            'plans': [
+                {
+                    'plan': row['plan__plan_name'],
+                    'members': row['members'],
+                    'active': row['active'],
+                    'revenue': float(row['revenue'] or 0),
+                }
+                for row in plans
+            ],
+            'attendance': {
+                'visits': visits,
+                'daily_avg': round(visits / _days(date_range), 1),
+                'peak_days': _peak_days(daily),
+                'peak_hours': [f"{hour:02d}:00-{hour + 1:02d}:00" for hour in sorted(busiest_hours)],
+                'hourly': hourly,
+                'daily': [{'date': day.isoformat(), 'visits': daily[day]} for day in sorted(daily)],
+            },
+            'revenue_trend': [
+                {'month': month.strftime('%b'), 'amount': float(revenue.get(month, 0))}
+                for month in months
+            ],
+        }
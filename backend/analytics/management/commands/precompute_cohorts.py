@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.cohorts import COHORT_MONTHS, CohortAnalyzer
+
+
+class Command(BaseCommand):
+    help = 'Compute the cohort retention matrix and cache it for /analytics/cohorts/ (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=COHORT_MONTHS, help='Join cohorts covered, ending this month')
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError('--months must be at least 1')
+
+        matrix = CohortAnalyzer.precompute(months=options['months'])
+        members = sum(row['size'] for row in matrix['cohorts'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Cached retention for {len(matrix['cohorts'])} cohorts ({members} members)"
+        ))
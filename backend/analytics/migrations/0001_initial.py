@@ -0,0 +1,53 @@
+# Generated by Django 5.2.3 on 2026-10-17 19:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("members", "0005_member_other_names_trgm"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MemberVisitMonth",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("visits", models.IntegerField(default=0)),
+                ("is_final", models.BooleanField(default=False)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "member",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visit_months",
+                        to="members.member",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["month"],
+                "indexes": [
+                    models.Index(fields=["month"], name="member_visit_month_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("member", "month"), name="member_visit_month"
+                    )
+                ],
+            },
+        ),
+    ]
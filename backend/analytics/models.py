@@ -1,3 +1,28 @@
 from django.db import models
 
-# Create your models here.
+
+class MemberVisitMonth(models.Model):
+    """
+    Engagement snapshot: a member's visits in one calendar month. Months
+    that have ended are final and are never recomputed (see
+    analytics.engagement).
+    """
+
+    member = models.ForeignKey("members.Member", on_delete=models.CASCADE, related_name="visit_months")
+    month = models.DateField()
+    visits = models.IntegerField(default=0)
+    is_final = models.BooleanField(default=False)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["month"]
+        constraints = [
+            models.UniqueConstraint(fields=["member", "month"], name="member_visit_month"),
+        ]
+        indexes = [
+            models.Index(fields=["month"], name="member_visit_month_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id} {self.month:%Y-%m}: {self.visits}"
@@ -0,0 +1,149 @@
+"""
+Peak hours and days from AttendanceLog
+
+One grouped query per date range returns visits per (day, visit type,
+check-in hour, check-out hour). From it:
+
+- an hour-of-week histogram: average check-ins per weekday and hour
+- an occupancy curve: average members on site per hour, from the
+  overlapping check-in/check-out intervals (a visit without a check-out
+  is assumed to last OPEN_VISIT_HOURS past its check-in hour)
+- peak hours (the busiest PEAK_WINDOW_HOURS windows) and peak days
+
+Results are cached per date range, so the log is scanned at most once per
+range per cache period rather than on every request.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db.models import Count
+from django.db.models.functions import ExtractHour, TruncDate
+
+from attendance.rollups import AttendanceRollupService
+from ptf.caching import get_or_compute, ttl
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+OPEN_VISIT_HOURS = 1
+PEAK_WINDOW_HOURS = 2
+PEAK_WINDOWS = 2
+PEAK_DAYS = 2
+
+VISIT_GROUPS = ('all', 'indoor', 'outdoor')
+
+
+class PeakAnalyzer:
+
+    @staticmethod
+    def get_peaks(date_range):
+        """
+        Cached peak analysis for a date range
+
+        Returns:
+            {'all' | 'indoor' | 'outdoor': {'peakHours', 'peakDays',
+             'peakOccupancy', 'occupancyByHour', 'hourOfWeek'}}
+        """
+        start, end = date_range['start'], date_range['end']
+        return get_or_compute(
+            f"attendance_peaks_{start.isoformat()}_{end.isoformat()}",
+            lambda: PeakAnalyzer.analyze(start, end),
+            soft_ttl=ttl('analytics'),
+        )
+
+    @staticmethod
+    def _visit_rows(start, end):
+        return AttendanceRollupService.logs_between(start, end).values(
+            'visit_type',
+            day=TruncDate('check_in_time'),
+            in_hour=ExtractHour('check_in_time'),
+            out_day=TruncDate('check_out_time'),
+            out_hour=ExtractHour('check_out_time'),
+        ).annotate(visits=Count('id')).order_by()
+
+    @staticmethod
+    def analyze(start, end):
+        """Peak analysis from one grouped query over start..end (inclusive)"""
+        weekday_counts = Counter(
+            (start + timedelta(days=offset)).weekday() for offset in range((end - start).days + 1)
+        )
+        arrivals = {group: [[0] * 24 for _ in WEEKDAYS] for group in VISIT_GROUPS}
+        present = {group: [[0] * 24 for _ in WEEKDAYS] for group in VISIT_GROUPS}
+
+        for row in PeakAnalyzer._visit_rows(start, end):
+            weekday, first, visits = row['day'].weekday(), row['in_hour'], row['visits']
+            if row['out_hour'] is None:
+                last = min(first + OPEN_VISIT_HOURS, 23)
+            elif row['out_day'] != row['day']:
+                last = 23
+            else:
+                last = max(row['out_hour'], first)
+            for group in ('all', row['visit_type']):
+                arrivals[group][weekday][first] += visits
+                for hour in range(first, last + 1):
+                    present[group][weekday][hour] += visits
+
+        return {
+            group: PeakAnalyzer._summarize(arrivals[group], present[group], weekday_counts)
+            for group in VISIT_GROUPS
+        }
+
+    @staticmethod
+    def _summarize(arrivals, present, weekday_counts):
+        def average(grid):
+            return [
+                [round(count / weekday_counts[weekday], 2) if weekday_counts[weekday] else 0 for count in hours]
+                for weekday, hours in enumerate(grid)
+            ]
+
+        hour_of_week = average(arrivals)
+        occupancy = average(present)
+        days = sum(weekday_counts.values()) or 1
+
+        # Busiest non-overlapping windows by check-ins across the week,
+        # ties broken by how many members were on site
+        hourly = [sum(arrivals[weekday][hour] for weekday in range(7)) for hour in range(24)]
+        on_site = [sum(present[weekday][hour] for weekday in range(7)) for hour in range(24)]
+        occupancy_by_hour = [round(count / days, 2) for count in on_site]
+        windows = sorted(
+            (
+                (
+                    sum(hourly[start:start + PEAK_WINDOW_HOURS]),
+                    sum(on_site[start:start + PEAK_WINDOW_HOURS]),
+                    start,
+                )
+                for start in range(24 - PEAK_WINDOW_HOURS + 1)
+            ),
+            key=lambda window: (-window[0], -window[1], window[2]),
+        )
+        peak_hours = []
+        for visits, _, start in windows:
+            if visits == 0 or len(peak_hours) == PEAK_WINDOWS:
+                break
+            if all(abs(start - taken) >= PEAK_WINDOW_HOURS for taken in peak_hours):
+                peak_hours.append(start)
+        peak_hours = [f"{start:02d}:00-{start + PEAK_WINDOW_HOURS:02d}:00" for start in sorted(peak_hours)]
+
+        day_totals = sorted(
+            ((sum(hours), weekday) for weekday, hours in enumerate(hour_of_week) if sum(hours) > 0),
+            key=lambda day: (-day[0], day[1]),
+        )
+        peak_days = [WEEKDAYS[weekday] for _, weekday in day_totals[:PEAK_DAYS]]
+
+        # Busiest slot; ties go to the earliest in the week
+        busiest = max(
+            ((count, weekday, hour) for weekday, hours in enumerate(occupancy) for hour, count in enumerate(hours)),
+            key=lambda slot: (slot[0], -slot[1], -slot[2]),
+            default=(0, 0, 0),
+        )
+        return {
+            'peakHours': peak_hours,
+            'peakDays': peak_days,
+            'peakOccupancy': {
+                'day': WEEKDAYS[busiest[1]] if busiest[0] else None,
+                'hour': f"{busiest[2]:02d}:00" if busiest[0] else None,
+                'average': busiest[0],
+            },
+            'occupancyByHour': occupancy_by_hour,
+            'hourOfWeek': hour_of_week,
+        }
@@ -0,0 +1,170 @@
+"""
+Analytics query planner
+
+The KPI sections of the comprehensive analytics are all derived from a
+small, fixed set of grouped aggregate queries instead of one query per
+metric:
+
+- members: one conditional aggregate over Member
+- plans: one aggregate over MembershipPlan LEFT JOIN Membership (and its
+  ledger balance), GROUP BY plan, with per-status and per-payment-status
+  counts and sums
+- received: one range read of the ledger's daily revenue summaries
+- revenue: one range read of the monthly revenue rollups (derived from
+  the ledger), plus one TruncMonth GROUP BY over Membership for new members
+- attendance: one range read of the daily attendance rollups
+- peaks: one grouped AttendanceLog query (analytics.peaks), cached on
+  its own per date range
+- locations: one GROUP BY location over outdoor memberships and one range
+  read of the outdoor attendance rollups (analytics.locations)
+- engagement: one grouped AttendanceLog query per member, and a read of
+  the cached cohort matrix (analytics.cohorts)
+
+Each query runs at most once per plan, on first use, so sections can be
+computed in any order (or not at all).
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from attendance.rollups import AttendanceRollupService
+from members.models import Member
+from memberships.models import Membership, MembershipPlan
+from payments.ledger import LedgerService
+from payments.rollups import RevenueRollupService
+from .dates import month_starts, start_of_day
+from .engagement import EngagementService
+from .locations import LocationAnalyticsService
+from .peaks import PeakAnalyzer
+
+# Months shown in the revenue trend
+TREND_MONTHS = 5
+
+PLAN_COUNTERS = (
+    'total', 'active', 'suspended', 'expired', 'paid', 'pending', 'overdue',
+    'revenue', 'sessions_used',
+)
+
+
+class AnalyticsQueryPlan:
+    """Lazily evaluated aggregates for one analytics date range"""
+
+    def __init__(self, date_range):
+        self.date_range = date_range
+        self.today = timezone.now().date()
+
+    @cached_property
+    def members(self):
+        """Member totals and new registrations in this and the previous period"""
+        start = self.date_range['start']
+        previous_start = start - (self.date_range['end'] - start)
+        return Member.objects.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(status='active')),
+            new_current=Count('id', filter=Q(registration_date__gte=start_of_day(start))),
+            new_previous=Count('id', filter=Q(
+                registration_date__gte=start_of_day(previous_start),
+                registration_date__lt=start_of_day(start),
+            )),
+        )
+
+    @cached_property
+    def plans(self):
+        """
+        Membership counts and sums per plan, including plans without members
+
+        revenue is money received (ledger balances), not plan prices
+        """
+        rows = MembershipPlan.objects.values(
+            'id', 'plan_name', 'membership_type', 'is_active', 'sessions_per_week'
+        ).annotate(
+            total=Count('memberships'),
+            active=Count('memberships', filter=Q(memberships__status='active')),
+            suspended=Count('memberships', filter=Q(memberships__status='suspended')),
+            expired=Count('memberships', filter=Q(memberships__status='expired')),
+            paid=Count('memberships', filter=Q(memberships__payment_status='paid')),
+            pending=Count('memberships', filter=Q(memberships__payment_status='pending')),
+            overdue=Count('memberships', filter=Q(memberships__payment_status='overdue')),
+            revenue=Sum('memberships__ledger_balance__paid'),
+            sessions_used=Sum('memberships__sessions_used'),
+        ).order_by('membership_type', 'sessions_per_week', 'id')
+        return [
+            {**row, **{name: row[name] or 0 for name in PLAN_COUNTERS}}
+            for row in rows
+        ]
+
+    def plan_totals(self, membership_type=None):
+        """Plan counters summed over all plans, or those of one membership type"""
+        totals = dict.fromkeys(PLAN_COUNTERS, 0)
+        totals['revenue'] = Decimal('0')
+        for row in self.plans:
+            if membership_type is None or row['membership_type'] == membership_type:
+                for name in PLAN_COUNTERS:
+                    totals[name] += row[name]
+        return totals
+
+    @cached_property
+    def received(self):
+        """Money received during the date range, from the ledger"""
+        return LedgerService.revenue_between(self.date_range['start'], self.date_range['end'])
+
+    @cached_property
+    def revenue(self):
+        """Money received per calendar month of the trend, from the rollups"""
+        months = month_starts(self.today, TREND_MONTHS)
+        return RevenueRollupService.monthly_totals(months[0], months[-1])
+
+    @cached_property
+    def monthly_trend(self):
+        """Revenue and new memberships for each of the last TREND_MONTHS calendar months"""
+        months = month_starts(self.today, TREND_MONTHS)
+        rows = Membership.objects.filter(
+            created_at__gte=start_of_day(months[0])
+        ).annotate(
+            month=TruncMonth('created_at')
+        ).values('month').annotate(
+            members=Count('id'),
+        ).order_by()
+        new_members = {timezone.localdate(row['month']).replace(day=1): row['members'] for row in rows}
+        return [
+            {
+                'month': month.strftime('%b'),
+                'revenue': float(self.revenue.get(month, {}).get('revenue', 0)),
+                'members': new_members.get(month, 0),
+            }
+            for month in months
+        ]
+
+    @cached_property
+    def attendance(self):
+        """Daily attendance from the rollups, covering the range and the last week"""
+        start = min(self.date_range['start'], self.today - timedelta(days=7))
+        return AttendanceRollupService.daily_totals(start, self.today)
+
+    @cached_property
+    def peaks(self):
+        """Peak hours, days and occupancy curves per visit type"""
+        return PeakAnalyzer.get_peaks(self.date_range)
+
+    @cached_property
+    def locations(self):
+        """Per outdoor location memberships, revenue and attendance"""
+        return LocationAnalyticsService.summary(self.date_range)
+
+    @cached_property
+    def engagement(self):
+        """Active members bucketed by visit frequency"""
+        return EngagementService.segments(self.date_range, self.members['active'])
+
+    @cached_property
+    def new_member_retention(self):
+        """Month-one retention of the recent join cohorts"""
+        return EngagementService.new_member_retention(self.date_range)
+
+    def attendance_total(self, start, field='total'):
+        return sum(counts[field] for day, counts in self.attendance.items() if day >= start)
@@ -0,0 +1,172 @@
+"""
+Analytics for arbitrary date ranges
+
+Any start/end range, and a comparison range, is answered from the
+precomputed tables rather than raw logs:
+
+- attendance: one range read of the daily attendance rollups (about one
+  row per day and visit type - a year is a few hundred rows)
+- revenue: the monthly revenue rollups for whole months plus one
+  aggregate over the ledger for the partial months at the edges
+- new members: one indexed count over Member.registration_date
+"""
+
+from datetime import date, timedelta
+
+from attendance.models import DailyAttendanceRollup
+from attendance.rollups import AttendanceRollupService
+from members.models import Member
+from payments.rollups import RevenueRollupService
+from ptf.caching import get_or_compute, ttl
+from .dates import start_of_day
+from .peaks import WEEKDAYS
+
+MAX_RANGE_DAYS = 3 * 366
+
+COMPARISONS = ('previous', 'previous_year')
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+
+
+def _year_before(day):
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:  # 29 February
+        return day.replace(year=day.year - 1, day=28)
+
+
+def _change(current, previous):
+    return round((current - previous) / previous * 100, 1) if previous else None
+
+
+class RangeAnalyticsService:
+
+    @staticmethod
+    def parse(start, end, compare_to=None):
+        """
+        Validate a range and resolve its comparison range
+
+        Args:
+            start, end: ISO dates (inclusive)
+            compare_to: 'previous', 'previous_year' or 'YYYY-MM-DD:YYYY-MM-DD'
+
+        Returns:
+            ((start, end), (compare_start, compare_end) or None)
+
+        Raises:
+            ValueError: Invalid dates or comparison
+        """
+        start, end = _parse_date(start, 'start'), _parse_date(end, 'end')
+        RangeAnalyticsService._check(start, end)
+        if not compare_to:
+            return (start, end), None
+
+        if compare_to == 'previous':
+            length = end - start + timedelta(days=1)
+            comparison = (start - length, end - length)
+        elif compare_to == 'previous_year':
+            comparison = (_year_before(start), _year_before(end))
+        elif ':' in compare_to:
+            compare_start, compare_end = compare_to.split(':', 1)
+            comparison = (_parse_date(compare_start, 'compare_to'), _parse_date(compare_end, 'compare_to'))
+            RangeAnalyticsService._check(*comparison)
+        else:
+            raise ValueError(f"compare_to must be one of {', '.join(COMPARISONS)} or START:END")
+        return (start, end), comparison
+
+    @staticmethod
+    def _check(start, end):
+        if start > end:
+            raise ValueError("start must not be after end")
+        if (end - start).days + 1 > MAX_RANGE_DAYS:
+            raise ValueError(f"Ranges are limited to {MAX_RANGE_DAYS} days")
+
+    @staticmethod
+    def get_range_analytics(date_range, comparison=None):
+        """
+        Range analytics, optionally with a comparison range, cached per range
+
+        Returns:
+            Summary of the range, plus 'comparison' (the same summary for
+            the comparison range) and 'change' (percent change of the
+            headline figures) when a comparison range is given
+        """
+        start, end = date_range
+        key = f"analytics_range_{start}_{end}"
+        if comparison:
+            key += f"_vs_{comparison[0]}_{comparison[1]}"
+
+        def compute():
+            result = RangeAnalyticsService.summarize(start, end)
+            if comparison:
+                previous = RangeAnalyticsService.summarize(*comparison)
+                result['comparison'] = previous
+                result['change'] = {
+                    'visits': _change(result['attendance']['visits'], previous['attendance']['visits']),
+                    'revenue': _change(result['revenue']['total'], previous['revenue']['total']),
+                    'newMembers': _change(result['newMembers'], previous['newMembers']),
+                }
+            return result
+
+        return get_or_compute(key, compute, soft_ttl=ttl('analytics'))
+
+    @staticmethod
+    def summarize(start, end):
+        """Attendance, revenue and new members from start to end (inclusive)"""
+        days = (end - start).days + 1
+        daily, hourly = {}, [0] * 24
+        totals = {'visits': 0, 'indoor': 0, 'outdoor': 0, 'completed': 0, 'duration': 0}
+        AttendanceRollupService.refresh_stale(start, end)
+        rows = DailyAttendanceRollup.objects.filter(date__range=(start, end)).values_list(
+            'date', 'visit_type', 'visits', 'completed_visits', 'total_duration_minutes', 'hourly_visits'
+        )
+        for day, visit_type, visits, completed, duration, hours in rows:
+            daily[day] = daily.get(day, 0) + visits
+            totals['visits'] += visits
+            totals[visit_type] = totals.get(visit_type, 0) + visits
+            totals['completed'] += completed
+            totals['duration'] += duration
+            for hour, count in enumerate(hours or []):
+                hourly[hour] += count
+
+        weekdays = [0] * 7
+        for day, visits in daily.items():
+            weekdays[day.weekday()] += visits
+        busiest_day = max(daily, key=lambda day: (daily[day], -day.toordinal()), default=None)
+        busiest_hour = max(range(24), key=lambda hour: (hourly[hour], -hour))
+
+        revenue = RevenueRollupService.totals_between(start, end)
+        new_members = Member.objects.filter(
+            registration_date__gte=start_of_day(start),
+            registration_date__lt=start_of_day(end + timedelta(days=1)),
+        ).count()
+
+        return {
+            'range': {'start': start.isoformat(), 'end': end.isoformat(), 'days': days},
+            'attendance': {
+                'visits': totals['visits'],
+                'indoor': totals['indoor'],
+                'outdoor': totals['outdoor'],
+                'dailyAverage': round(totals['visits'] / days, 1),
+                'averageSessionDuration': (
+                    round(totals['duration'] / totals['completed']) if totals['completed'] else None
+                ),
+                'busiestDay': {'date': busiest_day.isoformat(), 'visits': daily[busiest_day]} if busiest_day else None,
+                'busiestHour': f"{busiest_hour:02d}:00" if hourly[busiest_hour] else None,
+                'byWeekday': dict(zip(WEEKDAYS, weekdays)),
+                'hourly': hourly,
+                'daily': [{'date': day.isoformat(), 'visits': daily[day]} for day in sorted(daily)],
+            },
+            'revenue': {
+                'total': float(revenue['revenue']),
+                'payments': revenue['payments'],
+                'indoor': float(revenue['indoor']),
+                'outdoor': float(revenue['outdoor']),
+            },
+            'newMembers': new_members,
+        }
@@ -1,12 +1,39 @@
-from django.db.models import Count, Sum, Q, Avg
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
 from django.utils import timezone
-from django.core.cache import cache
-from datetime import timedelta, date, datetime
-from decimal import Decimal
-from members.models import Member
-from memberships.models import Membership
-from attendance.models import AttendanceLog
-from bookings.models import Booking
+
+from ptf.caching import get_or_compute, ttl
+from .dates import month_starts
+from .locations import LocationAnalyticsService
+from .planner import AnalyticsQueryPlan
+
+
+# ?sections= name: (response key, section method)
+SECTIONS = {
+    'overview': ('overview', '_get_overview_analytics'),
+    'membership': ('membershipBreakdown', '_get_membership_breakdown'),
+    'payments': ('paymentAnalytics', '_get_payment_analytics'),
+    'attendance': ('attendanceAnalytics', '_get_attendance_analytics'),
+    'revenue': ('revenueAnalytics', '_get_revenue_analytics'),
+    'engagement': ('memberEngagement', '_get_member_engagement'),
+    'outdoor': ('outdoorAnalytics', '_get_outdoor_analytics'),
+}
+
+# Each pool thread keeps one persistent connection (CONN_MAX_AGE), so
+# this also caps the connections analytics holds open
+_executor = ThreadPoolExecutor(max_workers=settings.ANALYTICS_WORKERS, thread_name_prefix='analytics')
+
+
+def _in_thread(func, *args):
+    # Like a request: reuse the thread's connection unless it is too old or broken
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
 
 
 class AnalyticsService:
@@ -16,36 +43,52 @@ class AnalyticsService:
     """
 
     @staticmethod
-    def get_comprehensive_analytics(timeframe='month'):
+    def get_comprehensive_analytics(timeframe='month', sections=None):
         """
         Get comprehensive analytics data with all calculations done on backend
-        Returns: Complete analytics data structure
-        """
-        cache_key = f"comprehensive_analytics_{timeframe}"
-        cached_data = cache.get(cache_key)
 
-        if cached_data is not None:
-            return cached_data
+        Each section is cached under its own key and TTL (CACHE_TTLS
+        'analytics_<section>'). With ANALYTICS_PARALLEL, the sections are
+        split into ANALYTICS_WORKERS groups that run concurrently on a
+        thread pool; sections in a group share one query plan, so common
+        aggregates run once per group rather than once per section.
 
-        # Calculate date ranges based on timeframe
+        Args:
+            timeframe: 'week', 'month', 'quarter' or 'year'
+            sections: Section names (keys of SECTIONS); all when omitted
+
+        Returns: Complete analytics data structure
+        """
+        names = list(sections or SECTIONS)
         today = timezone.now().date()
         date_range = AnalyticsService._get_date_range(today, timeframe)
-
-        # Get all analytics sections
-        result = {
-            'overview': AnalyticsService._get_overview_analytics(date_range),
-            'membershipBreakdown': AnalyticsService._get_membership_breakdown(date_range),
-            'paymentAnalytics': AnalyticsService._get_payment_analytics(date_range),
-            'attendanceAnalytics': AnalyticsService._get_attendance_analytics(date_range),
-            'revenueAnalytics': AnalyticsService._get_revenue_analytics(date_range),
-            'memberEngagement': AnalyticsService._get_member_engagement(date_range),
-            'outdoorAnalytics': AnalyticsService._get_outdoor_analytics(date_range),
-            'timeframe': timeframe,
-            'generated_at': timezone.now().isoformat(),
-        }
-
-        # Cache for 10 minutes
-        cache.set(cache_key, result, 600)
+        workers = settings.ANALYTICS_WORKERS if getattr(settings, 'ANALYTICS_PARALLEL', True) else 1
+        groups = [group for group in (names[i::workers] for i in range(workers)) if group]
+
+        def compute(group):
+            # Sections of a group share one plan, so common aggregates run once
+            plan = AnalyticsQueryPlan(date_range)
+            values = {}
+            for name in group:
+                method = getattr(AnalyticsService, SECTIONS[name][1])
+                # Served stale while one worker refreshes it
+                values[name] = get_or_compute(
+                    f"analytics_{name}_{timeframe}",
+                    lambda method=method: method(plan),
+                    soft_ttl=ttl(f"analytics_{name}", ttl('analytics')),
+                )
+            return values
+
+        values = {}
+        if len(groups) > 1:
+            for future in [_executor.submit(_in_thread, compute, group) for group in groups]:
+                values.update(future.result())
+        else:
+            values = compute(names)
+
+        result = {SECTIONS[name][0]: values[name] for name in names}
+        result['timeframe'] = timeframe
+        result['generated_at'] = timezone.now().isoformat()
         return result
 
     @staticmethod
@@ -63,146 +106,70 @@ class AnalyticsService:
         return {'start': start_date, 'end': today}
 
     @staticmethod
-    def _get_overview_analytics(date_range):
+    def _get_overview_analytics(plan):
         """Calculate overview KPI metrics"""
-        # Get current totals
-        total_members = Member.objects.count()
-        active_members = Member.objects.filter(status='active').count()
-
-        # Calculate revenue
-        total_revenue = Membership.objects.aggregate(
-            total=Sum('amount_paid')
-        )['total'] or 0
-
-        # Calculate growth (new members in timeframe vs previous period)
-        # Convert dates to timezone-aware datetimes for comparison
-        start_datetime = timezone.make_aware(
-            timezone.datetime.combine(date_range['start'], timezone.datetime.min.time())
-        ) if timezone.is_naive(
-            timezone.datetime.combine(date_range['start'], timezone.datetime.min.time())
-        ) else timezone.datetime.combine(date_range['start'], timezone.datetime.min.time())
-
-        new_members_current = Member.objects.filter(
-            registration_date__gte=start_datetime
-        ).count()
-
-        previous_start_date = date_range['start'] - (date_range['end'] - date_range['start'])
-        previous_start_datetime = timezone.make_aware(
-            timezone.datetime.combine(previous_start_date, timezone.datetime.min.time())
-        ) if timezone.is_naive(
-            timezone.datetime.combine(previous_start_date, timezone.datetime.min.time())
-        ) else timezone.datetime.combine(previous_start_date, timezone.datetime.min.time())
-
-        new_members_previous = Member.objects.filter(
-            registration_date__gte=previous_start_datetime,
-            registration_date__lt=start_datetime
-        ).count()
+        members = plan.members
+        totals = plan.plan_totals()
+        total_members = members['total']
 
+        # Growth: new members in timeframe vs previous period
         monthly_growth = 0
-        if new_members_previous > 0:
-            monthly_growth = ((new_members_current - new_members_previous) / float(new_members_previous)) * 100
+        if members['new_previous'] > 0:
+            monthly_growth = ((members['new_current'] - members['new_previous']) / float(members['new_previous'])) * 100
 
-        # Calculate sessions per member
-        total_sessions = Membership.objects.aggregate(
-            total=Sum('sessions_used')
-        )['total'] or 0
-
-        avg_sessions = float(total_sessions) / total_members if total_members > 0 else 0
+        avg_sessions = float(totals['sessions_used']) / total_members if total_members > 0 else 0
 
         # Calculate retention rate (simplified)
-        active_rate = (active_members / total_members * 100) if total_members > 0 else 0
+        active_rate = (members['active'] / total_members * 100) if total_members > 0 else 0
 
         return {
             'totalMembers': total_members,
-            'activeMembers': active_members,
-            'totalRevenue': float(total_revenue),
+            'activeMembers': members['active'],
+            'totalRevenue': float(totals['revenue']),
             'monthlyGrowth': round(monthly_growth, 1),
             'averageSessionsPerMember': round(avg_sessions, 1),
             'memberRetentionRate': round(active_rate, 1)
         }
 
     @staticmethod
-    def _get_membership_breakdown(date_range):
+    def _get_membership_breakdown(plan):
         """Calculate membership breakdown by type"""
-        # Indoor memberships
-        indoor_stats = Membership.objects.filter(
-            plan__membership_type='indoor'
-        ).aggregate(
-            total=Count('id'),
-            active=Count('id', filter=Q(status='active')),
-            suspended=Count('id', filter=Q(status='suspended')),
-            expired=Count('id', filter=Q(status='expired')),
-            revenue=Sum('amount_paid')
-        )
+        indoor_stats = plan.plan_totals('indoor')
+        outdoor_stats = plan.plan_totals('outdoor')
 
         indoor_avg_fee = 0
         if indoor_stats['total'] > 0:
-            indoor_avg_fee = float(indoor_stats['revenue'] or 0) / indoor_stats['total']
-
-        # Outdoor memberships
-        outdoor_stats = Membership.objects.filter(
-            plan__membership_type='outdoor'
-        ).aggregate(
-            total=Count('id'),
-            active=Count('id', filter=Q(status='active')),
-            suspended=Count('id', filter=Q(status='suspended')),
-            expired=Count('id', filter=Q(status='expired')),
-            revenue=Sum('amount_paid')
-        )
+            indoor_avg_fee = float(indoor_stats['revenue']) / indoor_stats['total']
 
         outdoor_avg_fee = 0
         if outdoor_stats['total'] > 0:
-            outdoor_avg_fee = float(outdoor_stats['revenue'] or 0) / outdoor_stats['total'] / 4  # Weekly estimate
+            outdoor_avg_fee = float(outdoor_stats['revenue']) / outdoor_stats['total'] / 4  # Weekly estimate
 
         return {
             'indoor': {
-                'total': indoor_stats['total'] or 0,
-                'active': indoor_stats['active'] or 0,
-                'suspended': indoor_stats['suspended'] or 0,
-                'expired': indoor_stats['expired'] or 0,
-                'revenue': float(indoor_stats['revenue'] or 0),
+                'total': indoor_stats['total'],
+                'active': indoor_stats['active'],
+                'suspended': indoor_stats['suspended'],
+                'expired': indoor_stats['expired'],
+                'revenue': float(indoor_stats['revenue']),
                 'averageMonthlyFee': round(indoor_avg_fee, 0)
             },
             'outdoor': {
-                'total': outdoor_stats['total'] or 0,
-                'active': outdoor_stats['active'] or 0,
-                'suspended': outdoor_stats['suspended'] or 0,
-                'expired': outdoor_stats['expired'] or 0,
-                'revenue': float(outdoor_stats['revenue'] or 0),
+                'total': outdoor_stats['total'],
+                'active': outdoor_stats['active'],
+                'suspended': outdoor_stats['suspended'],
+                'expired': outdoor_stats['expired'],
+                'revenue': float(outdoor_stats['revenue']),
                 'averageWeeklyFee': round(outdoor_avg_fee, 0)
             }
         }
 
     @staticmethod
-    def _get_payment_analytics(date_range):
+    def _get_payment_analytics(plan):
         """Calculate payment analytics"""
-        # Get payment status counts
-        payment_stats = Membership.objects.aggregate(
-            total_payments=Count('id'),
-            completed_payments=Count('id', filter=Q(payment_status='paid')),
-            pending_payments=Count('id', filter=Q(payment_status='pending')),
-            overdue_payments=Count('id', filter=Q(payment_status='overdue'))
-        )
-
-        # Calculate revenue metrics
-        total_revenue = Membership.objects.aggregate(
-            total=Sum('amount_paid')
-        )['total'] or 0
-
-        # Convert date_range to timezone-aware datetime
-        start_datetime = timezone.make_aware(
-            timezone.datetime.combine(date_range['start'], timezone.datetime.min.time())
-        ) if timezone.is_naive(
-            timezone.datetime.combine(date_range['start'], timezone.datetime.min.time())
-        ) else timezone.datetime.combine(date_range['start'], timezone.datetime.min.time())
-
-        monthly_revenue = Membership.objects.filter(
-            created_at__gte=start_datetime
-        ).aggregate(
-            total=Sum('amount_paid')
-        )['total'] or 0
+        totals = plan.plan_totals()
 
-        avg_payment = float(total_revenue) / payment_stats['total_payments'] if payment_stats['total_payments'] > 0 else 0
+        avg_payment = float(totals['revenue']) / totals['total'] if totals['total'] > 0 else 0
 
         # Payment methods breakdown (simplified percentages)
         payment_methods = {
@@ -213,215 +180,107 @@ class AnalyticsService:
         }
 
         return {
-            'totalPayments': payment_stats['total_payments'] or 0,
-            'completedPayments': payment_stats['completed_payments'] or 0,
-            'pendingPayments': payment_stats['pending_payments'] or 0,
-            'overduePayments': payment_stats['overdue_payments'] or 0,
-            'totalRevenue': float(total_revenue),
-            'monthlyRevenue': float(monthly_revenue),
+            'totalPayments': totals['total'],
+            'completedPayments': totals['paid'],
+            'pendingPayments': totals['pending'],
+            'overduePayments': totals['overdue'],
+            'totalRevenue': float(totals['revenue']),
+            'monthlyRevenue': float(plan.received['received']),
             'averagePaymentValue': round(avg_payment, 0),
             'paymentMethods': payment_methods
         }
 
     @staticmethod
-    def _get_attendance_analytics(date_range):
-        """Calculate attendance analytics"""
-        # Daily attendance metrics
-        today_attendance = AttendanceLog.objects.filter(
-            check_in_time__date=timezone.now().date()
-        ).count()
-
-        weekly_attendance = AttendanceLog.objects.filter(
-            check_in_time__gte=timezone.now().date() - timedelta(days=7)
-        ).count()
-
-        monthly_attendance = AttendanceLog.objects.filter(
-            check_in_time__gte=date_range['start']
-        ).count()
-
-        # Visit breakdown by type
-        indoor_visits = AttendanceLog.objects.filter(
-            check_in_time__gte=date_range['start'],
-            visit_type='indoor'
-        ).count()
-
-        outdoor_visits = AttendanceLog.objects.filter(
-            check_in_time__gte=date_range['start'],
-            visit_type='outdoor'
-        ).count()
-
-        # Calculate average session duration
-        completed_sessions = AttendanceLog.objects.filter(
-            check_in_time__gte=date_range['start'],
-            check_out_time__isnull=False
-        )
+    def _get_attendance_analytics(plan):
+        """Calculate attendance analytics from the daily rollups"""
+        start = plan.date_range['start']
 
+        # Average session duration over completed visits
+        completed_sessions = plan.attendance_total(start, 'completed_visits')
         avg_duration = 75  # Default duration
-        if completed_sessions.exists():
-            # Calculate actual average duration
-            durations = []
-            for session in completed_sessions:
-                if session.check_out_time:
-                    duration = (session.check_out_time - session.check_in_time).total_seconds() / 60
-                    durations.append(duration)
-
-            if durations:
-                avg_duration = sum(durations) / len(durations)
+        if completed_sessions:
+            avg_duration = plan.attendance_total(start, 'total_duration_minutes') / completed_sessions
 
         return {
-            'dailyAverage': today_attendance,
-            'weeklyTotal': weekly_attendance,
-            'monthlyTotal': monthly_attendance,
-            'peakHours': ['06:00-08:00', '17:00-19:00'],  # Can be calculated from actual data
-            'indoorVisits': indoor_visits,
-            'outdoorVisits': outdoor_visits,
+            'dailyAverage': plan.attendance.get(plan.today, {}).get('total', 0),
+            'weeklyTotal': plan.attendance_total(plan.today - timedelta(days=7)),
+            'monthlyTotal': plan.attendance_total(start),
+            'peakHours': plan.peaks['all']['peakHours'],
+            'peakDays': plan.peaks['all']['peakDays'],
+            'peakOccupancy': plan.peaks['all']['peakOccupancy'],
+            'occupancyByHour': plan.peaks['all']['occupancyByHour'],
+            'hourOfWeek': plan.peaks['all']['hourOfWeek'],
+            'indoorVisits': plan.attendance_total(start, 'indoor'),
+            'outdoorVisits': plan.attendance_total(start, 'outdoor'),
             'averageSessionDuration': round(avg_duration, 0)
         }
 
     @staticmethod
-    def _get_revenue_analytics(date_range):
+    def _get_revenue_analytics(plan):
         """Calculate revenue analytics with trends"""
-        # Monthly trend (last 5 months)
-        monthly_trend = []
-        current_datetime = timezone.now()
-
-        for i in range(5):
-            # Calculate month boundaries as timezone-aware datetimes
-            month_start_date = current_datetime.date().replace(day=1) - timedelta(days=30 * i)
-            month_end_date = month_start_date + timedelta(days=30)
-
-            # Convert to timezone-aware datetimes
-            month_start = timezone.make_aware(
-                timezone.datetime.combine(month_start_date, timezone.datetime.min.time())
-            ) if timezone.is_naive(
-                timezone.datetime.combine(month_start_date, timezone.datetime.min.time())
-            ) else timezone.datetime.combine(month_start_date, timezone.datetime.min.time())
-
-            month_end = timezone.make_aware(
-                timezone.datetime.combine(month_end_date, timezone.datetime.min.time())
-            ) if timezone.is_naive(
-                timezone.datetime.combine(month_end_date, timezone.datetime.min.time())
-            ) else timezone.datetime.combine(month_end_date, timezone.datetime.min.time())
-
-            month_revenue = Membership.objects.filter(
-                created_at__gte=month_start,
-                created_at__lt=month_end
-            ).aggregate(
-                revenue=Sum('amount_paid'),
-                members=Count('id')
-            )
-
-            month_name = month_start.strftime('%b')
-            monthly_trend.append({
-                'month': month_name,
-                'revenue': float(month_revenue['revenue'] or 0),
-                'members': month_revenue['members'] or 0
-            })
-
-        monthly_trend.reverse()  # Show oldest to newest
-
-        # Plan performance
-        plan_performance = []
-        from memberships.models import MembershipPlan
-
-        for plan in MembershipPlan.objects.filter(is_active=True):
-            plan_stats = Membership.objects.filter(plan=plan).aggregate(
-                members=Count('id'),
-                revenue=Sum('amount_paid')
-            )
-
-            plan_performance.append({
-                'plan': plan.plan_name,
-                'members': plan_stats['members'] or 0,
-                'revenue': float(plan_stats['revenue'] or 0)
-            })
+        plan_performance = [
+            {
+                'plan': row['plan_name'],
+                'members': row['total'],
+                'revenue': float(row['revenue'])
+            }
+            for row in plan.plans
+            if row['is_active']
+        ]
 
         return {
-            'monthlyTrend': monthly_trend,
+            'monthlyTrend': plan.monthly_trend,
             'planPerformance': plan_performance
         }
 
     @staticmethod
-    def _get_member_engagement(date_range):
+    def _get_member_engagement(plan):
         """Calculate member engagement metrics"""
-        # Simplified engagement calculation
-        total_members = Member.objects.filter(status='active').count()
-
-        # Categorize by visit frequency (simplified)
-        highly_active = int(total_members * 0.3)  # 30% highly active
-        moderately_active = int(total_members * 0.5)  # 50% moderately active
-        low_activity = total_members - highly_active - moderately_active
-
-        # Calculate average lifetime value
-        avg_lifetime_value = Membership.objects.aggregate(
-            avg=Avg('amount_paid')
-        )['avg'] or 0
+        # Average lifetime value: mean money received per membership
+        totals = plan.plan_totals()
+        avg_lifetime_value = totals['revenue'] / totals['total'] if totals['total'] else 0
 
         return {
-            'highlyActive': highly_active,
-            'moderatelyActive': moderately_active,
-            'lowActivity': low_activity,
-            'newMemberRetention': 78.5,  # Can be calculated from actual retention data
+            **plan.engagement,
+            'newMemberRetention': plan.new_member_retention,
             'averageLifetimeValue': float(avg_lifetime_value)
         }
 
     @staticmethod
-    def _get_outdoor_analytics(date_range):
+    def _get_outdoor_analytics(plan):
         """Get outdoor-specific analytics"""
-        # Get outdoor memberships with location data
-        outdoor_memberships = Membership.objects.filter(
-            plan__membership_type='outdoor'
-        ).select_related('location')
-
-        # Group by location
-        locations = []
-        location_data = {}
-
-        for membership in outdoor_memberships:
-            if membership.location:
-                loc_id = membership.location.id
-                loc_name = membership.location.name
-
-                if loc_id not in location_data:
-                    location_data[loc_id] = {
-                        'id': loc_id,
-                        'name': loc_name,
-                        'members': 0,
-                        'active': 0,
-                        'revenue': 0,
-                        'utilization': 0
-                    }
-
-                location_data[loc_id]['members'] += 1
-                if membership.status == 'active':
-                    location_data[loc_id]['active'] += 1
-                location_data[loc_id]['revenue'] += float(membership.amount_paid or 0)
-
-        # Calculate utilization and format locations
-        for location in location_data.values():
-            if location['members'] > 0:
-                location['utilization'] = round((float(location['active']) / float(location['members'])) * 100, 1)
-            locations.append(location)
-
-        # Attendance metrics
-        outdoor_attendance = AttendanceLog.objects.filter(
-            check_in_time__gte=date_range['start'],
-            visit_type='outdoor'
-        ).count()
-
-        daily_avg = float(outdoor_attendance) / 30 if outdoor_attendance > 0 else 0
+        start = plan.date_range['start']
+        outdoor_visits = plan.attendance_total(start, 'outdoor')
+        days = (plan.date_range['end'] - start).days + 1
 
         return {
-            'locations': locations,
+            'locations': plan.locations,
             'attendance': {
-                'daily_avg': round(daily_avg, 1),
-                'peak_days': ['Saturday', 'Sunday'],
-                'monthly_visits': outdoor_attendance
+                'daily_avg': round(outdoor_visits / days, 1),
+                'peak_days': plan.peaks['outdoor']['peakDays'],
+                'monthly_visits': outdoor_visits
             },
             'revenue_trend': [
-                {'month': 'Jan', 'amount': float(location_data.get(1, {}).get('revenue', 0)) * 0.7 if location_data else 0},
-                {'month': 'Feb', 'amount': float(location_data.get(1, {}).get('revenue', 0)) * 0.8 if location_data else 0},
-                {'month': 'Mar', 'amount': float(location_data.get(1, {}).get('revenue', 0)) * 0.9 if location_data else 0},
-                {'month': 'Apr', 'amount': sum(float(loc.get('revenue', 0)) for loc in location_data.values())}
+                {'month': month.strftime('%b'), 'amount': float(plan.revenue.get(month, {}).get('outdoor', 0))}
+                for month in month_starts(plan.today, 4)
             ]
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def get_location_analytics(location_id, timeframe='month'):
+        """
+        Drill-down analytics for one outdoor location, cached per timeframe
+
+        Raises:
+            Location.DoesNotExist: Unknown location
+        """
+        def compute():
+            today = timezone.now().date()
+            date_range = AnalyticsService._get_date_range(today, timeframe)
+            return LocationAnalyticsService.detail(location_id, date_range, today)
+
+        return get_or_compute(
+            f"location_analytics_{location_id}_{timeframe}",
+            compute,
+            soft_ttl=ttl('analytics'),
+        )
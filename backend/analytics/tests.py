@@ -1,3 +1,440 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from attendance.models import AttendanceLog
+from members.models import Location, Member
+from memberships.models import Membership, MembershipPlan
+from payments.models import Payment
+from .cohorts import CohortAnalyzer
+from .dates import add_months, month_starts
+from .engagement import REFRESHED_KEY, EngagementService
+from .models import MemberVisitMonth
+from .peaks import PeakAnalyzer
+from .ranges import RangeAnalyticsService
+from .services import AnalyticsService
+
+
+class ComprehensiveAnalyticsTests(TestCase):
+    """Tests for the single-pass comprehensive analytics"""
+
+    # members, plans, ledger revenue, revenue rollups, new memberships per
+    # month, attendance rollups, peaks, engagement segments (snapshot months
+    # and edge logs; the throttled snapshot refresh is covered in
+    # EngagementTests), retention (cohort matrix: 3, cached after the first
+    # build), outdoor locations (2)
+    EXPECTED_QUERIES = 14
+
+    def setUp(self):
+        cache.clear()
+        self.indoor = MembershipPlan.objects.create(
+            plan_name="Indoor Monthly", plan_code="IN-M", membership_type="indoor",
+            plan_type="monthly", sessions_per_week=3,
+        )
+        self.outdoor = MembershipPlan.objects.create(
+            plan_name="Outdoor Weekly", plan_code="OUT-W", membership_type="outdoor",
+            plan_type="weekly", sessions_per_week=2,
+        )
+        MembershipPlan.objects.create(
+            plan_name="Unused", plan_code="UNUSED", membership_type="indoor",
+            plan_type="daily", sessions_per_week=5,
+        )
+        location = Location.objects.create(name="Karura Forest", code="karura")
+        today = timezone.now().date()
+        rows = [
+            (self.indoor, "active", "paid", 3000, 4, 3000),
+            (self.indoor, "expired", "overdue", 3000, 10, 0),
+            (self.outdoor, "active", "pending", 1000, 1, 1000),
+        ]
+        for i, (plan, status, payment_status, amount, sessions, received) in enumerate(rows):
+            member = Member.objects.create(first_name=f"Kpi{i}", last_name="Member")
+            membership = Membership.objects.create(
+                member=member, plan=plan, status=status, payment_status=payment_status,
+                amount_paid=amount, sessions_used=sessions, total_sessions_allowed=12,
+                location=location if plan == self.outdoor else None,
+                start_date=today, end_date=today + timedelta(days=30),
+            )
+            if received:
+                Payment.objects.create(membership=membership, amount=received, status="completed")
+
+    def test_query_count_is_pinned(self):
+        for timeframe in ("week", "month", "quarter", "year"):
+            cache.clear()
+            cache.set(REFRESHED_KEY, True)
+            with self.assertNumQueries(self.EXPECTED_QUERIES):
+                AnalyticsService.get_comprehensive_analytics(timeframe)
+
+    def test_sections(self):
+        data = AnalyticsService.get_comprehensive_analytics("month")
+
+        self.assertEqual(data["overview"]["totalMembers"], 3)
+        # Money received, not plan prices
+        self.assertEqual(data["overview"]["totalRevenue"], 4000.0)
+        self.assertEqual(data["overview"]["averageSessionsPerMember"], 5.0)
+
+        indoor = data["membershipBreakdown"]["indoor"]
+        self.assertEqual((indoor["total"], indoor["active"], indoor["expired"]), (2, 1, 1))
+        self.assertEqual(indoor["averageMonthlyFee"], 1500)
+
+        payments = data["paymentAnalytics"]
+        self.assertEqual(
+            (payments["completedPayments"], payments["pendingPayments"], payments["overduePayments"]),
+            (1, 1, 1),
+        )
+        self.assertEqual(payments["monthlyRevenue"], 4000.0)
+
+        revenue = data["revenueAnalytics"]
+        self.assertEqual(
+            [(p["plan"], p["members"]) for p in revenue["planPerformance"]],
+            [("Indoor Monthly", 2), ("Unused", 0), ("Outdoor Weekly", 1)],
+        )
+        self.assertEqual(len(revenue["monthlyTrend"]), 5)
+        self.assertEqual(revenue["monthlyTrend"][-1]["members"], 3)
+        self.assertEqual(data["memberEngagement"]["averageLifetimeValue"], 4000 / 3)
+
+        location, = data["outdoorAnalytics"]["locations"]
+        self.assertEqual(
+            (location["name"], location["members"], location["active"], location["revenue"], location["utilization"]),
+            ("Karura Forest", 1, 1, 1000.0, 100.0),
+        )
+
+    def test_sections_are_cached_separately(self):
+        data = AnalyticsService.get_comprehensive_analytics("month", ["overview", "revenue"])
+        self.assertEqual(set(data) - {"timeframe", "generated_at"}, {"overview", "revenueAnalytics"})
+
+        with self.assertNumQueries(0):
+            AnalyticsService.get_comprehensive_analytics("month", ["revenue"])
+        # Only the missing membership section is computed (the plans aggregate)
+        with self.assertNumQueries(1):
+            AnalyticsService.get_comprehensive_analytics("month", ["overview", "membership"])
+
+    def test_unknown_section_is_rejected(self):
+        user = get_user_model().objects.create_user("analyst@example.com", "x")
+        self.client.force_login(user)
+        response = self.client.get("/analytics/?sections=overview,bogus")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("bogus", response.json()["error"])
+
+    def test_month_starts_are_calendar_months(self):
+        self.assertEqual(
+            month_starts(date(2025, 2, 28), 3),
+            [date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)],
+        )
+
+
+@override_settings(ANALYTICS_PARALLEL=True)
+class ParallelAnalyticsTests(TransactionTestCase):
+    """Sections computed on the thread pool match the serial result"""
+
+    def setUp(self):
+        cache.clear()
+        plan = MembershipPlan.objects.create(
+            plan_name="Indoor Monthly", plan_code="IN-M", membership_type="indoor", plan_type="monthly",
+        )
+        today = timezone.localdate()
+        for i in range(3):
+            member = Member.objects.create(first_name=f"Pool{i}", last_name="Member")
+            membership = Membership.objects.create(
+                member=member, plan=plan, amount_paid=2000, total_sessions_allowed=12,
+                start_date=today, end_date=today + timedelta(days=30),
+            )
+            Payment.objects.create(membership=membership, amount=2000, status="completed")
+
+    def test_parallel_matches_serial(self):
+        parallel = AnalyticsService.get_comprehensive_analytics("month")
+        cache.clear()
+        with self.settings(ANALYTICS_PARALLEL=False):
+            serial = AnalyticsService.get_comprehensive_analytics("month")
+
+        for data in (parallel, serial):
+            data.pop("generated_at")
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel["overview"]["totalRevenue"], 6000.0)
+
+
+class PeakAnalyzerTests(TestCase):
+    """Tests for peak hours, days and occupancy from AttendanceLog"""
+
+    def setUp(self):
+        cache.clear()
+        self.members = [Member.objects.create(first_name=f"Peak{i}", last_name="Member") for i in range(3)]
+        # 2025-06-02 is a Monday
+        self.monday = date(2025, 6, 2)
+
+    def visit(self, member, day, hour, minutes=None, visit_type="indoor"):
+        check_in = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time())) + timedelta(hours=hour)
+        AttendanceLog.objects.create(
+            member=member, visit_type=visit_type, check_in_time=check_in,
+            check_out_time=check_in + timedelta(minutes=minutes) if minutes else None,
+        )
+
+    def test_peaks_and_overlapping_occupancy(self):
+        saturday = self.monday + timedelta(days=5)
+        self.visit(self.members[0], self.monday, 6, minutes=150)   # on site 06-08
+        self.visit(self.members[1], self.monday, 7, minutes=30)    # 07
+        self.visit(self.members[2], self.monday, 18)                # no check-out: 18-19
+        self.visit(self.members[1], self.monday + timedelta(days=7), 18, minutes=45)
+        self.visit(self.members[0], saturday, 9, minutes=60, visit_type="outdoor")
+
+        peaks = PeakAnalyzer.analyze(self.monday, self.monday + timedelta(days=13))
+
+        everyone = peaks["all"]
+        self.assertEqual(everyone["peakHours"], ["06:00-08:00", "18:00-20:00"])
+        self.assertEqual(everyone["peakDays"], ["Monday", "Saturday"])
+        # Two Mondays in range, two members on site at 07:00 on one of them
+        self.assertEqual(everyone["hourOfWeek"][0][6], 0.5)
+        self.assertEqual(everyone["peakOccupancy"], {"day": "Monday", "hour": "07:00", "average": 1.0})
+        self.assertEqual(peaks["outdoor"]["peakDays"], ["Saturday"])
+
+    def test_results_are_cached_per_range(self):
+        date_range = {"start": self.monday, "end": self.monday + timedelta(days=6)}
+        PeakAnalyzer.get_peaks(date_range)
+        with self.assertNumQueries(0):
+            PeakAnalyzer.get_peaks(date_range)
+
+
+class EngagementTests(TestCase):
+    """Tests for engagement segments and new-member retention"""
+
+    def setUp(self):
+        cache.clear()
+        self.this_month = timezone.localdate().replace(day=1)
+
+    def member(self, name, joined, status="active"):
+        member = Member.objects.create(first_name=name, last_name="Member", status=status)
+        Member.objects.filter(pk=member.pk).update(registration_date=self.at(joined))
+        return member
+
+    def at(self, day, hour=10):
+        return timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time())) + timedelta(hours=hour)
+
+    def visit(self, member, day):
+        AttendanceLog.objects.create(member=member, visit_type="indoor", check_in_time=self.at(day))
+
+    def test_segments_by_visits_per_week(self):
+        today = timezone.localdate()
+        regular, occasional, idle = (self.member(name, today) for name in ("Regular", "Occasional", "Idle"))
+        inactive = self.member("Inactive", today, status="inactive")
+        for offset in range(5):
+            self.visit(regular, today - timedelta(days=offset))
+            self.visit(inactive, today - timedelta(days=offset))
+        self.visit(occasional, today)
+
+        segments = EngagementService.segments({"start": today - timedelta(days=6), "end": today}, 3)
+
+        self.assertEqual(segments, {"highlyActive": 1, "moderatelyActive": 1, "lowActivity": 1})
+
+    def test_segments_read_ended_months_from_the_snapshot(self):
+        start = add_months(self.this_month, -2)
+        end = timezone.localdate()
+        regular, occasional = self.member("Regular", start), self.member("Occasional", start)
+        for month in (start, add_months(start, 1)):
+            for offset in range(28):
+                self.visit(regular, month + timedelta(days=offset))
+        self.visit(occasional, start)
+        self.visit(occasional, add_months(start, 1))
+
+        segments = EngagementService.segments({"start": start, "end": end}, 2)
+
+        self.assertEqual(MemberVisitMonth.objects.filter(is_final=True, member=regular).count(), 2)
+        self.assertEqual(segments["highlyActive"], 1)
+        # A snapshot row stands in for the logs of its month
+        MemberVisitMonth.objects.filter(member=occasional, month=start).update(visits=20)
+        segments = EngagementService.segments({"start": start, "end": end}, 2)
+        self.assertEqual(segments["highlyActive"], 1)
+        self.assertEqual(segments["moderatelyActive"], 1)
+
+    def test_refresh_only_recomputes_open_months(self):
+        last_month = add_months(self.this_month, -1)
+        member = self.member("Regular", last_month)
+        self.visit(member, last_month)
+        self.visit(member, self.this_month)
+        EngagementService.refresh_visit_months()
+        self.visit(member, last_month + timedelta(days=1))
+        self.visit(member, self.this_month)
+
+        EngagementService.refresh_visit_months()
+
+        visits = dict(MemberVisitMonth.objects.values_list("month", "visits"))
+        self.assertEqual(visits, {last_month: 1, self.this_month: 2})
+
+    def test_retention_is_month_one_of_the_cohort_matrix(self):
+        cohort = add_months(self.this_month, -2)
+        next_month = add_months(cohort, 1)
+        returning, lapsed = self.member("Returning", cohort), self.member("Lapsed", cohort)
+        self.visit(returning, cohort)
+        self.visit(lapsed, cohort)
+        self.visit(returning, next_month)
+
+        today = timezone.localdate()
+        retention = EngagementService.new_member_retention({"start": today - timedelta(days=30), "end": today})
+
+        row = next(row for row in CohortAnalyzer.get_matrix()["cohorts"] if row["cohort"] == cohort.strftime("%Y-%m"))
+        self.assertEqual(row["retention"][1], 50.0)
+        self.assertEqual(retention, row["retention"][1])
+
+
+class CohortAnalyzerTests(TestCase):
+    """Tests for the cohort retention and churn matrix"""
+
+    def setUp(self):
+        cache.clear()
+        self.this_month = timezone.localdate().replace(day=1)
+        self.cohort = add_months(self.this_month, -2)
+        self.plan = MembershipPlan.objects.create(
+            plan_name="Indoor Monthly", plan_code="IN-M", membership_type="indoor", plan_type="monthly",
+        )
+
+    def member(self, name, joined):
+        member = Member.objects.create(first_name=name, last_name="Member")
+        Member.objects.filter(pk=member.pk).update(
+            registration_date=timezone.make_aware(timezone.datetime.combine(joined, timezone.datetime.min.time()))
+        )
+        return member
+
+    def membership(self, member, start, end):
+        Membership.objects.create(
+            member=member, plan=self.plan, start_date=start, end_date=end,
+            amount_paid=3000, total_sessions_allowed=12,
+        )
+
+    def test_retention_and_churn_matrix(self):
+        # Covered for two months by a membership
+        self.membership(self.member("Renewed", self.cohort), self.cohort, add_months(self.cohort, 1))
+        # One month of membership, then a drop-in visit in the current month
+        returning = self.member("Returning", self.cohort)
+        self.membership(returning, self.cohort, self.cohort + timedelta(days=27))
+        AttendanceLog.objects.create(
+            member=returning, visit_type="indoor",
+            check_in_time=timezone.make_aware(timezone.datetime.combine(self.this_month, timezone.datetime.min.time())),
+        )
+        self.member("Newcomer", self.this_month)
+
+        with self.assertNumQueries(3):
+            matrix = CohortAnalyzer.build(months=3)
+
+        oldest, _, newest = matrix["cohorts"]
+        self.assertEqual(oldest["cohort"], self.cohort.strftime("%Y-%m"))
+        self.assertEqual(oldest["size"], 2)
+        self.assertEqual(oldest["retained"], [2, 1, 1])
+        self.assertEqual(oldest["churned"], [0, 1, 1])
+        self.assertEqual(oldest["churnRate"], [0.0, 50.0, 100.0])
+        self.assertEqual((newest["size"], newest["retained"]), (1, [0]))
+        self.assertEqual(matrix["averageRetention"], [66.7, 50.0, 50.0])
+
+    def test_endpoint_serves_precomputed_matrix(self):
+        self.member("Cohort", self.this_month)
+        call_command("precompute_cohorts", stdout=StringIO())
+
+        user = get_user_model().objects.create_user("analyst@example.com", "x")
+        self.client.force_login(user)
+        with self.assertNumQueries(3):  # session, user and last-activity only
+            response = self.client.get("/analytics/cohorts/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["cohorts"][-1]["size"], 1)
+
+
+class LocationAnalyticsTests(TestCase):
+    """Tests for per-location outdoor analytics"""
+
+    def setUp(self):
+        cache.clear()
+        self.karura = Location.objects.create(name="Karura Forest", code="karura")
+        plan = MembershipPlan.objects.create(
+            plan_name="Outdoor Weekly", plan_code="OUT-W", membership_type="outdoor", plan_type="weekly",
+        )
+        self.today = timezone.localdate()
+        for i, status in enumerate(("active", "active", "expired")):
+            member = Member.objects.create(first_name=f"Trail{i}", last_name="Member")
+            Membership.objects.create(
+                member=member, plan=plan, location=self.karura, status=status, amount_paid=1000,
+                total_sessions_allowed=8, start_date=self.today, end_date=self.today + timedelta(days=7),
+            )
+            if status == "active":
+                with self.captureOnCommitCallbacks(execute=True):
+                    AttendanceLog.objects.create(
+                        member=member, visit_type="outdoor", location=self.karura,
+                        check_in_time=timezone.now() - timedelta(minutes=5),
+                    )
+
+    def test_drill_down(self):
+        user = get_user_model().objects.create_user("analyst@example.com", "x")
+        self.client.force_login(user)
+
+        response = self.client.get(f"/analytics/outdoor/locations/{self.karura.id}/")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()["data"]
+        self.assertEqual(data["memberships"]["members"], 3)
+        self.assertEqual(data["memberships"]["utilization"], 66.7)
+        self.assertEqual(data["attendance"]["visits"], 2)
+        self.assertEqual(data["attendance"]["daily"], [{"date": self.today.isoformat(), "visits": 2}])
+        self.assertEqual(data["attendance"]["peak_days"], [self.today.strftime("%A")])
+
+        # Served from the cache (last activity was already recorded above)
+        with self.assertNumQueries(2):  # session and user lookups only
+            self.client.get(f"/analytics/outdoor/locations/{self.karura.id}/")
+        self.assertEqual(self.client.get("/analytics/outdoor/locations/999/").status_code, 404)
+
+
+class RangeAnalyticsTests(TestCase):
+    """Tests for custom date ranges composed from the rollup tables"""
+
+    def setUp(self):
+        cache.clear()
+        self.member = Member.objects.create(first_name="Range", last_name="Member")
+        # 2025-06-02 is a Monday
+        self.monday = date(2025, 6, 2)
+        for day, hour in ((0, 7), (0, 18), (1, 7), (7, 7)):
+            check_in = timezone.make_aware(timezone.datetime.combine(
+                self.monday + timedelta(days=day), timezone.datetime.min.time()
+            )) + timedelta(hours=hour)
+            with self.captureOnCommitCallbacks(execute=True):
+                AttendanceLog.objects.create(
+                    member=self.member, visit_type="indoor", check_in_time=check_in,
+                    check_out_time=check_in + timedelta(minutes=60),
+                )
+
+    def test_range_with_previous_period(self):
+        date_range, comparison = RangeAnalyticsService.parse("2025-06-09", "2025-06-15", "previous")
+        self.assertEqual(comparison, (date(2025, 6, 2), date(2025, 6, 8)))
+
+        data = RangeAnalyticsService.get_range_analytics(date_range, comparison)
+
+        self.assertEqual(data["attendance"]["visits"], 1)
+        previous = data["comparison"]["attendance"]
+        self.assertEqual((previous["visits"], previous["busiestHour"]), (3, "07:00"))
+        self.assertEqual(previous["busiestDay"], {"date": "2025-06-02", "visits": 2})
+        self.assertEqual(previous["byWeekday"]["Tuesday"], 1)
+        self.assertEqual(previous["averageSessionDuration"], 60)
+        self.assertEqual(data["change"]["visits"], -66.7)
+        self.assertIsNone(data["change"]["revenue"])
+
+    def test_invalid_ranges(self):
+        for start, end, compare_to in (
+            ("2025-06-09", "2025-06-01", None),
+            ("2025-06-01", "not-a-date", None),
+            ("2020-01-01", "2025-01-01", None),
+            ("2025-06-01", "2025-06-09", "last_week"),
+        ):
+            with self.assertRaises(ValueError):
+                RangeAnalyticsService.parse(start, end, compare_to)
+        self.assertEqual(
+            RangeAnalyticsService.parse("2024-02-29", "2024-03-01", "previous_year")[1],
+            (date(2023, 2, 28), date(2023, 3, 1)),
+        )
+
+    def test_endpoint(self):
+        user = get_user_model().objects.create_user("analyst@example.com", "x")
+        self.client.force_login(user)
+
+        response = self.client.get("/analytics/range/?start=2025-06-01&end=2025-06-30")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["data"]["attendance"]["visits"], 4)
+        self.assertEqual(self.client.get("/analytics/range/?start=2025-06-30&end=2025-06-01").status_code, 400)
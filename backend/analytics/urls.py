@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import ComprehensiveAnalyticsView, OutdoorAnalyticsView
+from .views import (
+    CohortAnalyticsView, ComprehensiveAnalyticsView, LocationAnalyticsView, OutdoorAnalyticsView,
+    RangeAnalyticsView,
+)
 
 app_name = 'analytics'
 
 urlpatterns = [
     path('analytics/', ComprehensiveAnalyticsView.as_view(), name='comprehensive-analytics'),
     path('analytics/outdoor/', OutdoorAnalyticsView.as_view(), name='outdoor-analytics'),
+    path('analytics/outdoor/locations/<int:location_id>/', LocationAnalyticsView.as_view(), name='location-analytics'),
+    path('analytics/range/', RangeAnalyticsView.as_view(), name='range-analytics'),
+    path('analytics/cohorts/', CohortAnalyticsView.as_view(), name='cohort-analytics'),
 ]
\ No newline at end of file
@@ -3,7 +3,10 @@ from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.authentication import SessionAuthentication
-from .services import AnalyticsService
+from members.models import Location
+from .cohorts import CohortAnalyzer
+from .ranges import RangeAnalyticsService
+from .services import SECTIONS, AnalyticsService
 
 
 class ComprehensiveAnalyticsView(APIView):
@@ -20,6 +23,7 @@ class ComprehensiveAnalyticsView(APIView):
         Get comprehensive analytics data
         Query params:
         - timeframe: 'week', 'month', 'quarter', 'year' (default: 'month')
+        - sections: comma-separated subset, e.g. 'overview,revenue' (default: all)
         """
         try:
             timeframe = request.query_params.get('timeframe', 'month')
@@ -35,8 +39,19 @@ class ComprehensiveAnalyticsView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
+            sections = [name for name in request.query_params.get('sections', '').split(',') if name]
+            invalid_sections = [name for name in sections if name not in SECTIONS]
+            if invalid_sections:
+                return Response(
+                    {
+                        "error": f"Invalid sections: {', '.join(invalid_sections)}",
+                        "valid_options": list(SECTIONS)
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
             # Get comprehensive analytics
-            analytics_data = AnalyticsService.get_comprehensive_analytics(timeframe)
+            analytics_data = AnalyticsService.get_comprehensive_analytics(timeframe, sections)
 
             return Response(
                 {
@@ -71,8 +86,10 @@ class OutdoorAnalyticsView(APIView):
         try:
             timeframe = request.query_params.get('timeframe', 'month')
 
-            # Get full analytics and extract outdoor data
-            full_analytics = AnalyticsService.get_comprehensive_analytics(timeframe)
+            # Get the sections outdoor data is drawn from
+            full_analytics = AnalyticsService.get_comprehensive_analytics(
+                timeframe, ['membership', 'attendance', 'outdoor']
+            )
 
             outdoor_data = {
                 'outdoor_membership': full_analytics['membershipBreakdown']['outdoor'],
@@ -100,4 +117,132 @@ class OutdoorAnalyticsView(APIView):
                     "details": str(e)
                 },
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
\ No newline at end of file
+            )
+
+
+class LocationAnalyticsView(APIView):
+    """
+    Drill-down analytics for one outdoor location
+    """
+
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, location_id):
+        """
+        Get memberships, attendance and revenue for a location
+        Query params:
+        - timeframe: 'week', 'month', 'quarter', 'year' (default: 'month')
+        """
+        try:
+            timeframe = request.query_params.get('timeframe', 'month')
+
+            valid_timeframes = ['week', 'month', 'quarter', 'year']
+            if timeframe not in valid_timeframes:
+                return Response(
+                    {
+                        "error": "Invalid timeframe",
+                        "valid_options": valid_timeframes
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            location_data = AnalyticsService.get_location_analytics(location_id, timeframe)
+
+            return Response(
+                {
+                    "success": True,
+                    "data": location_data,
+                    "timeframe": timeframe
+                },
+                status=status.HTTP_200_OK,
+            )
+
+        except Location.DoesNotExist:
+            return Response(
+                {"success": False, "error": "Location not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except Exception as e:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Failed to retrieve location analytics",
+                    "details": str(e)
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class RangeAnalyticsView(APIView):
+    """
+    Analytics for any date range, optionally compared with another one
+    """
+
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """
+        Get attendance, revenue and new members for a date range
+        Query params:
+        - start, end: dates (YYYY-MM-DD, inclusive)
+        - compare_to: 'previous', 'previous_year' or 'YYYY-MM-DD:YYYY-MM-DD' (optional)
+        """
+        try:
+            date_range, comparison = RangeAnalyticsService.parse(
+                request.query_params.get('start'),
+                request.query_params.get('end'),
+                request.query_params.get('compare_to'),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            return Response(
+                {
+                    "success": True,
+                    "data": RangeAnalyticsService.get_range_analytics(date_range, comparison),
+                },
+                status=status.HTTP_200_OK,
+            )
+
+        except Exception as e:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Failed to retrieve range analytics",
+                    "details": str(e)
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class CohortAnalyticsView(APIView):
+    """
+    Cohort retention and churn matrix, precomputed nightly
+    """
+
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        """Get the month-of-joining x months-since-joining retention matrix"""
+        try:
+            return Response(
+                {
+                    "success": True,
+                    "data": CohortAnalyzer.get_matrix(),
+                },
+                status=status.HTTP_200_OK,
+            )
+
+        except Exception as e:
+            return Response(
+                {
+                    "success": False,
+                    "error": "Failed to retrieve cohort analytics",
+                    "details": str(e)
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
@@ -0,0 +1,543 @@
+"""
+Check-in engine
+
+Every check-in entry point (kiosk check-in, attendance CheckInView,
+AttendanceService and MembershipService.use_session) goes through
+CheckInService, so all of them validate and write the same way:
+
+1. SELECT ... FOR UPDATE of the membership, joined to the member and plan,
+   with a subquery for today's check-in
+2. INSERT the AttendanceLog
+3. UPDATE ... RETURNING sessions_used on the membership; on PostgreSQL the
+   same statement (a data-modifying CTE) also bumps the member's visit
+   counters, inserts the SessionLog and upserts the daily Attendance row.
+   Other databases run those as separate statements.
+
+The membership row lock serializes concurrent kiosks for the same member,
+and the guarded UPDATE never lets sessions_used pass the allowance.
+
+Offline kiosk syncs use check_in_batch: the same checks run in memory
+against memberships loaded in one query, and the accepted check-ins are
+written with bulk inserts and grouped UPDATEs.
+"""
+
+from collections import Counter
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ptf.pagination import CountStrategy
+
+from members.models import Member
+from memberships.models import Membership, SessionLog
+from .models import AttendanceLog, Attendance
+from .occupancy import OccupancyService
+from .rollups import AttendanceRollupService
+
+
+class CheckInError(ValueError):
+    """Check-in refused; message is safe to show at the front desk"""
+
+    def __init__(self, message, status_code=400, current_checkin_id=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.current_checkin_id = current_checkin_id
+
+
+class CheckInService:
+
+    # Most check-ins accepted in one offline sync
+    MAX_BATCH_SIZE = 500
+
+    # Offline kiosk clocks may run slightly ahead of the server
+    BATCH_CLOCK_SKEW = timedelta(minutes=5)
+
+    PAYMENT_STATUS_ERRORS = {
+        'pending': "Cannot check-in: Payment is still pending. Please complete payment first.",
+        'overdue': "Cannot check-in: Payment is overdue. Please update payment to continue.",
+    }
+
+    @staticmethod
+    def check_in(member_id=None, membership_id=None, session_type='regular', notes='',
+                 activities=None, now=None):
+        """
+        Check a member in, using one session of their membership
+
+        Args:
+            member_id: Member primary key; their latest active membership is used
+            membership_id: Use this membership instead (e.g. MembershipService.use_session)
+            session_type: SessionLog session type
+            notes: Notes for the attendance and session logs
+            activities: AttendanceLog activities (defaults to the membership location)
+            now: Check-in time (defaults to timezone.now())
+
+        Returns:
+            Dict with attendance, member, membership, visit_type and
+            sessions_remaining
+
+        Raises:
+            CheckInError: If the member cannot check in
+        """
+        if member_id is None and membership_id is None:
+            raise CheckInError("member_id is required")
+
+        now = now or timezone.now()
+        today = timezone.localdate(now)
+
+        # SQLite has no row locks, and a transaction that reads before it
+        # writes fails outright under concurrent writers, so there only the
+        # writes are wrapped; the guarded UPDATE still prevents overuse
+        locking = connection.features.has_select_for_update
+        with transaction.atomic() if locking else nullcontext():
+            membership = CheckInService._lock_membership(member_id, membership_id, today)
+            member = membership.member
+            CheckInService._validate(membership, today)
+
+            visit_type = membership.plan.membership_type
+            if activities is None:
+                activities = [membership.location.name] if membership.location else []
+
+            with transaction.atomic(savepoint=False):
+                attendance = AttendanceLog.objects.create(
+                    member=member,
+                    visit_type=visit_type,
+                    location_id=membership.location_id,
+                    check_in_time=now,
+                    status='checked_in',
+                    activities=activities,
+                    notes=notes,
+                )
+
+                sessions_used = CheckInService._record_visit(
+                    membership, visit_type, session_type, notes, now, today
+                )
+                if sessions_used is None:
+                    # Another kiosk used the last session after our checks
+                    raise CheckInError("No sessions remaining on this membership.")
+
+                membership.sessions_used = sessions_used
+                transaction.on_commit(lambda: CheckInService._clear_caches(visit_type))
+                transaction.on_commit(
+                    lambda: OccupancyService.record_check_in(visit_type, membership.location_id, now)
+                )
+
+        return {
+            'attendance': attendance,
+            'member': member,
+            'membership': membership,
+            'visit_type': visit_type,
+            'sessions_remaining': membership.total_sessions_allowed - sessions_used,
+        }
+
+    @staticmethod
+    def check_in_batch(items, now=None):
+        """
+        Apply check-ins captured offline by a kiosk, validated in bulk
+
+        Each item needs member_id, checked_in_at (ISO 8601) and an
+        idempotency_key; items whose key was already synced are reported as
+        duplicates instead of being counted again.
+
+        Args:
+            items: List of check-in dicts, oldest or newest first
+            now: Sync time (defaults to timezone.now())
+
+        Returns:
+            List of per-item result dicts in input order
+        """
+        now = now or timezone.now()
+        results = [None] * len(items)
+        parsed = []
+        first_index = {}
+        for index, item in enumerate(items):
+            try:
+                key, member_id, checked_in_at = CheckInService._parse_batch_item(item, now)
+            except CheckInError as e:
+                results[index] = {'index': index, 'status': 'invalid', 'error': str(e)}
+                continue
+            if key in first_index:
+                continue
+            first_index[key] = index
+            parsed.append((index, key, member_id, checked_in_at))
+
+        # A concurrent retry of the same sync may insert some keys first;
+        # the second pass reports those as duplicates
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    applied = CheckInService._apply_batch(parsed, now)
+                break
+            except IntegrityError:
+                continue
+        else:
+            applied = CheckInService._conflicted(parsed)
+        for index, result in applied.items():
+            results[index] = {'index': index, **result}
+
+        # Repeated keys within the batch mirror the first occurrence
+        for index, item in enumerate(items):
+            if results[index] is None:
+                first = results[first_index[item['idempotency_key']]]
+                results[index] = {**first, 'index': index, 'status': 'duplicate'}
+        return results
+
+    @staticmethod
+    def _parse_batch_item(item, now):
+        if not isinstance(item, dict):
+            raise CheckInError("Each check-in must be an object")
+        key = item.get('idempotency_key')
+        if not isinstance(key, str) or not key or len(key) > 64:
+            raise CheckInError("idempotency_key is required (max 64 characters)")
+        try:
+            member_id = int(item.get('member_id'))
+        except (TypeError, ValueError):
+            raise CheckInError("member_id is required")
+
+        value = item.get('checked_in_at')
+        checked_in_at = parse_datetime(value) if isinstance(value, str) else None
+        if checked_in_at is None:
+            raise CheckInError("checked_in_at must be an ISO 8601 datetime")
+        if timezone.is_naive(checked_in_at):
+            checked_in_at = timezone.make_aware(checked_in_at)
+        if checked_in_at > now + CheckInService.BATCH_CLOCK_SKEW:
+            raise CheckInError("checked_in_at is in the future")
+        return key, member_id, checked_in_at
+
+    @staticmethod
+    def _apply_batch(parsed, now):
+        """Validate parsed check-ins against membership state and write them in bulk"""
+        results = {}
+        existing = CheckInService._existing_keys(parsed)
+        pending = []
+        for index, key, member_id, checked_in_at in parsed:
+            if key in existing:
+                results[index] = {
+                    'idempotency_key': key, 'member_id': member_id,
+                    'status': 'duplicate', 'attendance_id': existing[key],
+                }
+            else:
+                pending.append((index, key, member_id, checked_in_at))
+        if not pending:
+            return results
+
+        locking = connection.features.has_select_for_update
+        with transaction.atomic() if locking else nullcontext():
+            member_ids = {member_id for _, _, member_id, _ in pending}
+            days = {timezone.localdate(checked_in_at) for _, _, _, checked_in_at in pending}
+
+            memberships = {}
+            for membership in Membership.objects.select_for_update(of=('self',)).select_related(
+                'member', 'plan', 'location'
+            ).filter(
+                member_id__in=member_ids, member__status='active', status='active'
+            ).order_by('member_id', '-created_at'):
+                memberships.setdefault(membership.member_id, membership)
+
+            checked_in_days = {
+                (member_id, timezone.localdate(check_in_time))
+                for member_id, check_in_time in AttendanceLog.objects.filter(
+                    member_id__in=member_ids, check_in_time__date__in=days
+                ).values_list('member_id', 'check_in_time')
+            }
+
+            sessions_used = {m.id: m.sessions_used for m in memberships.values()}
+            accepted = []
+            for index, key, member_id, checked_in_at in sorted(pending, key=lambda p: p[3]):
+                result = {'idempotency_key': key, 'member_id': member_id}
+                results[index] = result
+                membership = memberships.get(member_id)
+                day = timezone.localdate(checked_in_at)
+                try:
+                    if membership is None:
+                        raise CheckInError("Member not found, inactive or without an active membership")
+                    error = CheckInService.PAYMENT_STATUS_ERRORS.get(membership.payment_status)
+                    if error:
+                        raise CheckInError(error)
+                    if membership.end_date < day:
+                        raise CheckInError("Membership has expired. Please renew to continue.")
+                    if sessions_used[membership.id] >= membership.total_sessions_allowed:
+                        raise CheckInError("No sessions remaining on this membership.")
+                    if (member_id, day) in checked_in_days:
+                        raise CheckInError("Already checked in on this day")
+                except CheckInError as e:
+                    result.update(status='rejected', error=str(e))
+                    continue
+
+                sessions_used[membership.id] += 1
+                checked_in_days.add((member_id, day))
+                result.update(
+                    status='created',
+                    sessions_remaining=membership.total_sessions_allowed - sessions_used[membership.id],
+                )
+                accepted.append((result, membership, key, checked_in_at, day))
+
+            if accepted:
+                with transaction.atomic(savepoint=False):
+                    CheckInService._write_batch(accepted, now)
+                for visit_type in {membership.plan.membership_type for _, membership, _, _, _ in accepted}:
+                    transaction.on_commit(lambda visit_type=visit_type: CheckInService._clear_caches(visit_type))
+        return results
+
+    @staticmethod
+    def _existing_keys(parsed):
+        """{idempotency_key: attendance id} of the parsed keys already synced"""
+        return dict(AttendanceLog.objects.filter(
+            idempotency_key__in=[key for _, key, _, _ in parsed]
+        ).values_list('idempotency_key', 'id'))
+
+    @staticmethod
+    def _conflicted(parsed):
+        """
+        Results for a batch that collided with a concurrent sync on both
+        passes: keys the other sync wrote are duplicates, the rest were
+        rolled back and can be sent again
+        """
+        existing = CheckInService._existing_keys(parsed)
+        results = {}
+        for index, key, member_id, _ in parsed:
+            result = {'idempotency_key': key, 'member_id': member_id}
+            if key in existing:
+                result.update(status='duplicate', attendance_id=existing[key])
+            else:
+                result.update(status='rejected', error="Sync conflicted with another sync; please retry")
+            results[index] = result
+        return results
+
+    @staticmethod
+    def _write_batch(accepted, now):
+        """
+        Bulk writes for accepted offline check-ins: AttendanceLog and
+        SessionLog inserts, one grouped UPDATE each for memberships and
+        members, and the daily Attendance upserts.
+        """
+        logs = AttendanceLog.objects.bulk_create([
+            AttendanceLog(
+                member=membership.member,
+                visit_type=membership.plan.membership_type,
+                location_id=membership.location_id,
+                check_in_time=checked_in_at,
+                status='active',
+                activities=[membership.location.name] if membership.location else [],
+                idempotency_key=key,
+            )
+            for _, membership, key, checked_in_at, _ in accepted
+        ])
+        for (result, _, _, _, _), log in zip(accepted, logs):
+            result['attendance_id'] = log.id
+            transaction.on_commit(
+                lambda log=log: OccupancyService.record_check_in(log.visit_type, log.location_id, log.check_in_time)
+            )
+        # bulk_create sends no post_save, so mark the rollups stale here
+        AttendanceRollupService.schedule(day for _, _, _, _, day in accepted)
+
+        session_counts = Counter()
+        member_visits = Counter()
+        last_visits = {}
+        daily = {}
+        for _, membership, _, checked_in_at, day in accepted:
+            session_counts[membership.id] += 1
+            member_visits[membership.member_id] += 1
+            last_visits[membership.member_id] = max(
+                checked_in_at, last_visits.get(membership.member_id, checked_in_at)
+            )
+            counts = daily.setdefault(
+                (membership.member_id, day), {'total': 0, 'indoor': 0, 'outdoor': 0, 'last': checked_in_at}
+            )
+            counts['total'] += 1
+            counts[membership.plan.membership_type] += 1
+            counts['last'] = max(checked_in_at, counts['last'])
+
+        Membership.objects.filter(id__in=session_counts).update(
+            sessions_used=F('sessions_used') + Case(
+                *[When(id=pk, then=Value(n)) for pk, n in session_counts.items()],
+                output_field=IntegerField(),
+            ),
+            updated_at=now,
+        )
+        Member.objects.filter(id__in=member_visits).update(
+            total_visits=F('total_visits') + Case(
+                *[When(id=pk, then=Value(n)) for pk, n in member_visits.items()],
+                output_field=IntegerField(),
+            ),
+            last_visit=Case(
+                *[
+                    When(Q(id=pk) & (Q(last_visit__isnull=True) | Q(last_visit__lt=at)), then=Value(at))
+                    for pk, at in last_visits.items()
+                ],
+                default=F('last_visit'),
+            ),
+            updated_at=now,
+        )
+
+        ops = connection.ops
+        adapted_now = ops.adapt_datetimefield_value(now)
+        today = timezone.localdate(now)
+        insert_session, upsert_daily = CheckInService._log_sql()
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                insert_session.format(membership_id='%s', source=''),
+                [
+                    [membership.id, ops.adapt_datetimefield_value(checked_in_at), 'regular', '', adapted_now]
+                    for _, membership, _, checked_in_at, _ in accepted
+                ],
+            )
+            cursor.executemany(
+                upsert_daily.format(member_id='%s', source='WHERE true'),
+                [
+                    [
+                        member_id, ops.adapt_datefield_value(day), counts['total'],
+                        counts['indoor'], counts['outdoor'], day == today,
+                        ops.adapt_datetimefield_value(counts['last']), adapted_now, adapted_now,
+                    ]
+                    for (member_id, day), counts in daily.items()
+                ],
+            )
+
+    @staticmethod
+    def _lock_membership(member_id, membership_id, today):
+        """Statement 1: lock the membership and read everything the checks need"""
+        todays_checkin = AttendanceLog.objects.filter(
+            member_id=OuterRef('member_id'), check_in_time__date=today
+        ).order_by('-check_in_time').values('id')[:1]
+
+        memberships = Membership.objects.select_for_update(of=('self',)).select_related(
+            'member', 'plan', 'location'
+        ).filter(member__status='active').annotate(todays_checkin_id=Subquery(todays_checkin))
+        if membership_id is not None:
+            memberships = memberships.filter(id=membership_id)
+        else:
+            memberships = memberships.filter(member_id=member_id, status='active')
+
+        membership = memberships.order_by('-created_at').first()
+        if membership is not None:
+            return membership
+
+        # Error paths only: tell a missing member apart from one without a plan
+        if membership_id is not None:
+            raise CheckInError("Membership not found or member inactive", status_code=404)
+        member = Member.objects.filter(id=member_id, status='active').only(
+            'first_name', 'last_name'
+        ).first()
+        if member is None:
+            raise CheckInError("Member not found or inactive", status_code=404)
+        raise CheckInError(f"{member.first_name} {member.last_name} has no active membership")
+
+    @staticmethod
+    def _validate(membership, today):
+        error = CheckInService.PAYMENT_STATUS_ERRORS.get(membership.payment_status)
+        if error:
+            raise CheckInError(error)
+        if membership.status != 'active':
+            raise CheckInError(f"Cannot check-in: Membership is {membership.status}.")
+        if membership.end_date < today:
+            raise CheckInError("Membership has expired. Please renew to continue.")
+        if membership.sessions_used >= membership.total_sessions_allowed:
+            raise CheckInError("No sessions remaining on this membership.")
+        if membership.todays_checkin_id:
+            member = membership.member
+            raise CheckInError(
+                f"{member.first_name} {member.last_name} has already checked in today",
+                current_checkin_id=membership.todays_checkin_id,
+            )
+
+    @staticmethod
+    def _record_visit(membership, visit_type, session_type, notes, now, today):
+        """
+        Use one session and record the visit: membership sessions_used,
+        member visit counters, SessionLog and the daily Attendance row.
+
+        Returns:
+            New sessions_used, or None if no session was left
+        """
+        ops = connection.ops
+        now = ops.adapt_datetimefield_value(now)
+        today = ops.adapt_datefield_value(today)
+        membership_table = ops.quote_name(Membership._meta.db_table)
+        member_table = ops.quote_name(Member._meta.db_table)
+        indoor, outdoor = int(visit_type == 'indoor'), int(visit_type == 'outdoor')
+
+        update_membership = (
+            f"UPDATE {membership_table} "
+            f"SET sessions_used = sessions_used + 1, updated_at = %s "
+            f"WHERE id = %s AND sessions_used < total_sessions_allowed "
+            f"RETURNING sessions_used, member_id, id"
+        )
+        update_member = (
+            f"UPDATE {member_table} "
+            f"SET total_visits = total_visits + 1, last_visit = %s, updated_at = %s "
+            f"WHERE id = {{member_id}}"
+        )
+        insert_session, upsert_daily = CheckInService._log_sql()
+        session_params = [now, session_type, notes, now]
+        daily_params = [today, 1, indoor, outdoor, True, now, now, now]
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"WITH used AS ({update_membership}), "
+                    f"visit AS ({update_member.format(member_id='(SELECT member_id FROM used)')}), "
+                    f"session AS ({insert_session.format(membership_id='id', source='FROM used')}), "
+                    f"daily AS ({upsert_daily.format(member_id='member_id', source='FROM used')}) "
+                    f"SELECT sessions_used FROM used",
+                    [now, membership.id, now, now] + session_params + daily_params,
+                )
+                row = cursor.fetchone()
+                return row[0] if row else None
+
+            cursor.execute(update_membership, [now, membership.id])
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            cursor.execute(update_member.format(member_id='%s'), [now, now, membership.member_id])
+            cursor.execute(
+                insert_session.format(membership_id='%s', source=''),
+                [membership.id] + session_params,
+            )
+            # SQLite needs a WHERE on INSERT ... SELECT before ON CONFLICT
+            cursor.execute(
+                upsert_daily.format(member_id='%s', source='WHERE true'),
+                [membership.member_id] + daily_params,
+            )
+            return row[0]
+
+    @staticmethod
+    def _log_sql():
+        """
+        INSERT templates for the SessionLog and the daily Attendance upsert.
+        {membership_id}/{member_id} and {source} are filled in per caller:
+        columns of a CTE on PostgreSQL, plain parameters elsewhere.
+        """
+        ops = connection.ops
+        session_table = ops.quote_name(SessionLog._meta.db_table)
+        daily_table = ops.quote_name(Attendance._meta.db_table)
+
+        insert_session = (
+            f"INSERT INTO {session_table} (membership_id, date_used, session_type, notes, created_at) "
+            f"SELECT {{membership_id}}, %s, %s, %s, %s {{source}}"
+        )
+        upsert_daily = (
+            f"INSERT INTO {daily_table} (member_id, date, total_visits_today, indoor_visits_today, "
+            f"outdoor_visits_today, currently_active, last_activity_time, created_at, updated_at) "
+            f"SELECT {{member_id}}, %s, %s, %s, %s, %s, %s, %s, %s {{source}} "
+            f"ON CONFLICT (member_id, date) DO UPDATE SET "
+            f"total_visits_today = {daily_table}.total_visits_today + excluded.total_visits_today, "
+            f"indoor_visits_today = {daily_table}.indoor_visits_today + excluded.indoor_visits_today, "
+            f"outdoor_visits_today = {daily_table}.outdoor_visits_today + excluded.outdoor_visits_today, "
+            f"currently_active = excluded.currently_active, "
+            f"last_activity_time = excluded.last_activity_time, "
+            f"updated_at = excluded.updated_at"
+        )
+        return insert_session, upsert_daily
+
+    @staticmethod
+    def _clear_caches(visit_type):
+        # The raw SQL and .update() writes send no post_save, so member list
+        # counts are invalidated here rather than by members.signals
+        CountStrategy.invalidate(Member)
+        # Membership stats include today's session usage
+        from memberships.services import MembershipService
+        MembershipService.clear_stats_cache(visit_type)
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from attendance.models import AttendanceLog
+from attendance.rollups import AttendanceRollupService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily attendance rollups from AttendanceLog, a chunk of days at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD); defaults to the first check-in')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--days', type=int, help='Rebuild only the last N days (e.g. nightly repair)')
+        parser.add_argument('--chunk-days', type=int, default=31, help='Days aggregated per transaction')
+
+    def handle(self, *args, **options):
+        end = self.parse_date(options['end']) or timezone.localdate()
+        if options['days']:
+            start = end - timedelta(days=options['days'] - 1)
+        else:
+            start = self.parse_date(options['start'])
+        if start is None:
+            first = AttendanceLog.objects.aggregate(first=Min('check_in_time'))['first']
+            if first is None:
+                self.stdout.write('No attendance to roll up.')
+                return
+            start = timezone.localdate(first)
+        if start > end:
+            raise CommandError('--start must not be after --end')
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be at least 1')
+
+        chunk_start, total = start, 0
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=options['chunk_days'] - 1), end)
+            rows = AttendanceRollupService.rebuild(chunk_start, chunk_end)
+            total += rows
+            self.stdout.write(f'{chunk_start} to {chunk_end}: {rows} rollup rows')
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} rollup rows from {start} to {end}'))
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f'Invalid date: {value}')
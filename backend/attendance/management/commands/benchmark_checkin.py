@@ -0,0 +1,131 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from attendance.checkin import CheckInService, CheckInError
+from attendance.models import AttendanceLog
+from members.models import Member
+from memberships.models import MembershipPlan, Membership
+
+BENCH_EMAIL_DOMAIN = '@checkin-bench.invalid'
+
+
+def legacy_check_in(member_id):
+    """The check-in flow before CheckInService, kept for comparison"""
+    member = Member.objects.select_related().prefetch_related(
+        'memberships__plan'
+    ).get(id=member_id, status="active")
+    active_membership = member.memberships.filter(status='active').select_related('plan').first()
+    if not active_membership or active_membership.payment_status in ['pending', 'overdue']:
+        raise CheckInError("Cannot check in")
+    if active_membership.is_expired:
+        raise CheckInError("Membership has expired")
+
+    today = timezone.now().date()
+    if AttendanceLog.objects.filter(member=member, check_in_time__date=today).exists():
+        raise CheckInError("Already checked in today")
+
+    with transaction.atomic():
+        AttendanceLog.objects.create(
+            member=member, visit_type=active_membership.plan.membership_type, status="checked_in"
+        )
+        Member.objects.filter(id=member.id).update(
+            total_visits=F('total_visits') + 1, last_visit=timezone.now()
+        )
+        active_membership.sessions_used = F('sessions_used') + 1
+        active_membership.save(update_fields=['sessions_used'])
+        active_membership.refresh_from_db()
+
+
+def new_check_in(member_id):
+    CheckInService.check_in(member_id)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark check-in latency (p50/p99) of the legacy flow and CheckInService under concurrent kiosk load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=200, help='Check-ins per run (one per member)')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent kiosks')
+
+    def handle(self, *args, **options):
+        member_ids = self.create_members(options['members'])
+        try:
+            for label, check_in in [('legacy', legacy_check_in), ('CheckInService', new_check_in)]:
+                self.reset(member_ids)
+                statements = self.count_statements(check_in, member_ids[0])
+                self.reset(member_ids)
+                latencies, errors = self.run(check_in, member_ids, options['workers'])
+                self.report(label, statements, latencies, errors)
+        finally:
+            Member.objects.filter(email__endswith=BENCH_EMAIL_DOMAIN).delete()
+            MembershipPlan.objects.filter(plan_code='CHECKIN_BENCH').delete()
+
+    def create_members(self, count):
+        plan, _ = MembershipPlan.objects.get_or_create(
+            plan_code='CHECKIN_BENCH',
+            defaults={
+                'plan_name': 'Check-in Benchmark', 'membership_type': 'indoor',
+                'plan_type': 'monthly', 'sessions_per_week': 7,
+            },
+        )
+        today = timezone.now().date()
+        members = Member.objects.bulk_create([
+            Member(first_name='Bench', last_name=f'Kiosk{i}', email=f'bench{i}{BENCH_EMAIL_DOMAIN}')
+            for i in range(count)
+        ])
+        Membership.objects.bulk_create([
+            Membership(
+                member=member, plan=plan, total_sessions_allowed=30, start_date=today,
+                end_date=today + timedelta(days=30), amount_paid=Decimal('0.00'), payment_status='paid',
+            )
+            for member in members
+        ])
+        return [member.id for member in members]
+
+    def reset(self, member_ids):
+        AttendanceLog.objects.filter(member_id__in=member_ids).delete()
+        Membership.objects.filter(member_id__in=member_ids).update(sessions_used=0)
+
+    def count_statements(self, check_in, member_id):
+        with CaptureQueriesContext(connection) as queries:
+            check_in(member_id)
+        return len([q for q in queries.captured_queries if q['sql'] not in ('BEGIN', 'COMMIT')])
+
+    def run(self, check_in, member_ids, workers):
+        def timed(member_id):
+            start = time.perf_counter()
+            try:
+                check_in(member_id)
+                return (time.perf_counter() - start) * 1000, None
+            except Exception as e:
+                return (time.perf_counter() - start) * 1000, e
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(timed, member_ids))
+        latencies = sorted(ms for ms, error in results if error is None)
+        errors = [error for _, error in results if error is not None]
+        return latencies, errors
+
+    def report(self, label, statements, latencies, errors):
+        if not latencies:
+            self.stdout.write(self.style.ERROR(f'{label}: every check-in failed ({errors[0]})'))
+            return
+        p50 = statistics.median(latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f'{label:>15}: {statements} statements, p50 {p50:.2f}ms, p99 {p99:.2f}ms, '
+            f'{len(latencies)} ok, {len(errors)} failed'
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f'{"":>15}  first failure: {errors[0]}'))
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.3 on 2026-10-17 05:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("members", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Attendance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(default=django.utils.timezone.now)),
+                ("total_visits_today", models.IntegerField(default=0)),
+                ("indoor_visits_today", models.IntegerField(default=0)),
+                ("outdoor_visits_today", models.IntegerField(default=0)),
+                ("currently_active", models.BooleanField(default=False)),
+                ("last_activity_time", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "member",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_attendance",
+                        to="members.member",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-date"],
+                "unique_together": {("member", "date")},
+            },
+        ),
+        migrations.CreateModel(
+            name="AttendanceLog",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "visit_type",
+                    models.CharField(
+                        choices=[("indoor", "Indoor"), ("outdoor", "Outdoor")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "check_in_time",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("check_out_time", models.DateTimeField(blank=True, null=True)),
+                ("duration_minutes", models.IntegerField(blank=True, null=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("checked_in", "Checked In"),
+                            ("checked_out", "Checked Out"),
+                            ("active", "Currently Active"),
+                        ],
+                        default="checked_in",
+                        max_length=15,
+                    ),
+                ),
+                ("activities", models.JSONField(blank=True, default=list)),
+                ("trainer", models.CharField(blank=True, max_length=100, null=True)),
+                ("notes", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "member",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attendance_logs",
+                        to="members.member",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-check_in_time"],
+                "indexes": [
+                    models.Index(
+                        fields=["member", "check_in_time"],
+                        name="attendance__member__ef3e65_idx",
+                    ),
+                    models.Index(
+                        fields=["visit_type", "check_in_time"],
+                        name="attendance__visit_t_fd99b2_idx",
+                    ),
+                    models.Index(
+                        fields=["status"], name="attendance__status_018901_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.3 on 2026-10-17 05:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("attendance", "0001_initial"),
+        ("members", "0005_member_other_names_trgm"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attendancelog",
+            name="idempotency_key",
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name="attendancelog",
+            name="location",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="attendance_logs",
+                to="members.location",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DailyAttendanceRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "visit_type",
+                    models.CharField(
+                        choices=[("indoor", "Indoor"), ("outdoor", "Outdoor")],
+                        max_length=10,
+                    ),
+                ),
+                ("visits", models.IntegerField(default=0)),
+                ("unique_members", models.IntegerField(default=0)),
+                ("completed_visits", models.IntegerField(default=0)),
+                ("total_duration_minutes", models.IntegerField(default=0)),
+                ("avg_duration_minutes", models.FloatField(blank=True, null=True)),
+                ("hourly_visits", models.JSONField(blank=True, default=list)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "location",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="attendance_rollups",
+                        to="members.location",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-date"],
+                "indexes": [
+                    models.Index(
+                        fields=["location", "date"],
+                        name="attendance_rollup_location_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("date", "visit_type", "location"),
+                        name="attendance_rollup_bucket",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("location__isnull", True)),
+                        fields=("date", "visit_type"),
+                        name="attendance_rollup_bucket_no_location",
+                    ),
+                ],
+            },
+        ),
+    ]
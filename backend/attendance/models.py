@@ -23,6 +23,14 @@ class AttendanceLog(models.Model):
         Member, on_delete=models.CASCADE, related_name="attendance_logs"
     )
     visit_type = models.CharField(max_length=10, choices=VISIT_TYPES)
+    # Outdoor location of the membership used for this visit
+    location = models.ForeignKey(
+        "members.Location",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="attendance_logs",
+    )
     check_in_time = models.DateTimeField(default=timezone.now)
     check_out_time = models.DateTimeField(null=True, blank=True)
     duration_minutes = models.IntegerField(null=True, blank=True)
@@ -37,6 +45,10 @@ class AttendanceLog(models.Model):
     trainer = models.CharField(max_length=100, blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
 
+    # Client-generated key for offline kiosk check-ins, so retried syncs
+    # don't count a visit twice
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -61,6 +73,15 @@ class AttendanceLog(models.Model):
             return int(delta.total_seconds() / 60)
         return None
 
+    # check_in_time as loaded from the database (see attendance.signals)
+    loaded_check_in_time = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_check_in_time = instance.__dict__.get("check_in_time")
+        return instance
+
     def save(self, *args, **kwargs):
         # Auto-calculate duration on save
         if self.check_out_time and not self.duration_minutes:
@@ -152,3 +173,53 @@ class Attendance(models.Model):
         if is_active:
             self.last_activity_time = timezone.now()
         self.save()
+
+
+class DailyAttendanceRollup(models.Model):
+    """
+    Precomputed attendance per (date, visit type, location), kept in step
+    with AttendanceLog by attendance.rollups. Weekly and monthly views read
+    a date range of these rows instead of counting logs.
+    """
+
+    date = models.DateField()
+    visit_type = models.CharField(max_length=10, choices=AttendanceLog.VISIT_TYPES)
+    location = models.ForeignKey(
+        "members.Location",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="attendance_rollups",
+    )
+
+    visits = models.IntegerField(default=0)
+    unique_members = models.IntegerField(default=0)
+    # Visits with a check-out, i.e. the ones durations are known for
+    completed_visits = models.IntegerField(default=0)
+    total_duration_minutes = models.IntegerField(default=0)
+    avg_duration_minutes = models.FloatField(null=True, blank=True)
+    # Check-ins per hour of the day, 24 entries
+    hourly_visits = models.JSONField(default=list, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "visit_type", "location"], name="attendance_rollup_bucket"
+            ),
+            # NULLs are distinct in the constraint above
+            models.UniqueConstraint(
+                fields=["date", "visit_type"],
+                condition=models.Q(location__isnull=True),
+                name="attendance_rollup_bucket_no_location",
+            ),
+        ]
+        indexes = [
+            # Per-location range reads (analytics.locations)
+            models.Index(fields=["location", "date"], name="attendance_rollup_location_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.visit_type} - {self.visits} visits"
@@ -0,0 +1,175 @@
+"""
+Live occupancy counters
+
+Today's attendance numbers (check-ins, members visited, currently active,
+indoor/outdoor and per location) are kept as counters in the cache so the
+dashboard reads them in O(1) instead of counting AttendanceLog rows on
+every request.
+
+- Check-ins and check-outs adjust the counters with atomic cache.incr /
+  cache.decr once their transaction commits
+- Counters are rebuilt from AttendanceLog whenever they are missing or
+  older than RECONCILE_INTERVAL, which also corrects any drift from
+  writes that bypass CheckInService (admin edits, imports)
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import AttendanceLog
+
+# Seconds before counters are rebuilt from the database
+RECONCILE_INTERVAL = 300
+
+# Counters only need to outlive the day they count
+COUNTER_TIMEOUT = 60 * 60 * 48
+
+COUNTERS = ('checked_in', 'members', 'active', 'indoor', 'indoor_active', 'outdoor', 'outdoor_active')
+
+ACTIVE_FILTER = Q(status__in=['checked_in', 'active'], check_out_time__isnull=True)
+
+
+class OccupancyService:
+
+    @staticmethod
+    def _key(day, name):
+        return f"occupancy_{day.isoformat()}_{name}"
+
+    @staticmethod
+    def _location_key(day, location_id, name):
+        return OccupancyService._key(day, f"location_{location_id}_{name}")
+
+    @staticmethod
+    def reconcile(day=None):
+        """
+        Rebuild a day's counters from AttendanceLog (two queries)
+
+        Returns:
+            Snapshot dict, as returned by snapshot()
+        """
+        from members.models import Location
+
+        day = day or timezone.localdate()
+        logs = AttendanceLog.objects.filter(check_in_time__date=day)
+        totals = logs.aggregate(
+            checked_in=Count('id'),
+            members=Count('member', distinct=True),
+            active=Count('id', filter=ACTIVE_FILTER),
+            indoor=Count('id', filter=Q(visit_type='indoor')),
+            indoor_active=Count('id', filter=Q(visit_type='indoor') & ACTIVE_FILTER),
+            outdoor=Count('id', filter=Q(visit_type='outdoor')),
+            outdoor_active=Count('id', filter=Q(visit_type='outdoor') & ACTIVE_FILTER),
+        )
+        # Every location gets counters, so check-ins there can incr them
+        todays = Q(attendance_logs__check_in_time__date=day)
+        per_location = Location.objects.annotate(
+            total=Count('attendance_logs', filter=todays),
+            active=Count('attendance_logs', filter=todays & Q(
+                attendance_logs__status__in=['checked_in', 'active'],
+                attendance_logs__check_out_time__isnull=True,
+            )),
+        ).values_list('id', 'code', 'name', 'total', 'active')
+
+        values = {OccupancyService._key(day, name): totals[name] for name in COUNTERS}
+        locations = []
+        for location_id, code, name, total, active in per_location:
+            locations.append((location_id, code, name))
+            values[OccupancyService._location_key(day, location_id, 'total')] = total
+            values[OccupancyService._location_key(day, location_id, 'active')] = active
+        values[OccupancyService._key(day, 'locations')] = locations
+
+        cache.set_many(values, COUNTER_TIMEOUT)
+        cache.set(OccupancyService._key(day, 'fresh'), True, RECONCILE_INTERVAL)
+        return OccupancyService._build_snapshot(day, values)
+
+    @staticmethod
+    def snapshot():
+        """
+        Today's occupancy counters
+
+        Returns:
+            Dict with date, checked_in_today, members_visited_today,
+            currently_active, indoor/outdoor totals and per-location counts
+        """
+        day = timezone.localdate()
+        if not cache.get(OccupancyService._key(day, 'fresh')):
+            return OccupancyService.reconcile(day)
+
+        keys = [OccupancyService._key(day, name) for name in COUNTERS + ('locations',)]
+        values = cache.get_many(keys)
+        locations = values.get(OccupancyService._key(day, 'locations'))
+        if len(values) < len(keys):
+            return OccupancyService.reconcile(day)
+
+        location_keys = [
+            OccupancyService._location_key(day, location_id, name)
+            for location_id, _, _ in locations
+            for name in ('total', 'active')
+        ]
+        location_values = cache.get_many(location_keys)
+        if len(location_values) < len(location_keys):
+            return OccupancyService.reconcile(day)
+        values.update(location_values)
+        return OccupancyService._build_snapshot(day, values)
+
+    @staticmethod
+    def _build_snapshot(day, values):
+        def counter(name):
+            return max(values.get(OccupancyService._key(day, name), 0), 0)
+
+        return {
+            'date': day.isoformat(),
+            'checked_in_today': counter('checked_in'),
+            'members_visited_today': counter('members'),
+            'currently_active': counter('active'),
+            'indoor': {'total': counter('indoor'), 'active': counter('indoor_active')},
+            'outdoor': {'total': counter('outdoor'), 'active': counter('outdoor_active')},
+            'locations': [
+                {
+                    'id': location_id,
+                    'code': code,
+                    'name': name,
+                    'total': counter(f"location_{location_id}_total"),
+                    'active': counter(f"location_{location_id}_active"),
+                }
+                for location_id, code, name in values.get(OccupancyService._key(day, 'locations'), [])
+            ],
+        }
+
+    @staticmethod
+    def record_check_in(visit_type, location_id, check_in_time):
+        """Count a committed check-in"""
+        day = timezone.localdate(check_in_time)
+        if not OccupancyService._is_tracked(day):
+            return
+        names = ['checked_in', 'members', 'active', visit_type, f"{visit_type}_active"]
+        if location_id:
+            names += [f"location_{location_id}_total", f"location_{location_id}_active"]
+        OccupancyService._adjust(day, names, 1)
+
+    @staticmethod
+    def record_check_out(attendance):
+        """Count a committed check-out of an AttendanceLog"""
+        day = timezone.localdate(attendance.check_in_time)
+        if not OccupancyService._is_tracked(day):
+            return
+        names = ['active', f"{attendance.visit_type}_active"]
+        if attendance.location_id:
+            names.append(f"location_{attendance.location_id}_active")
+        OccupancyService._adjust(day, names, -1)
+
+    @staticmethod
+    def _is_tracked(day):
+        # Only today is tracked; untracked or stale counters are rebuilt
+        # from the database on the next read, which includes this write
+        return day == timezone.localdate() and cache.get(OccupancyService._key(day, 'fresh'))
+
+    @staticmethod
+    def _adjust(day, names, delta):
+        try:
+            for name in names:
+                cache.incr(OccupancyService._key(day, name), delta)
+        except ValueError:
+            # Counter evicted or a location added today - rebuild on next read
+            cache.delete(OccupancyService._key(day, 'fresh'))
@@ -0,0 +1,179 @@
+"""
+Daily attendance rollups
+
+DailyAttendanceRollup holds one row per (date, visit type, location) with
+visits, unique members, durations and an hourly histogram, so weekly and
+monthly attendance is a single range read instead of counting and loading
+AttendanceLog rows.
+
+- An AttendanceLog write only marks its day stale in the shared cache once
+  its transaction commits (attendance.signals; bulk check-ins mark their
+  days explicitly) - no queries on the check-in path.
+- Readers call refresh_stale() for their date range first, which
+  re-aggregates the stale days - two grouped queries per day. Recomputing
+  rather than incrementing keeps rows exact after edits, deletes and
+  retries.
+- `manage.py backfill_attendance_rollups` rebuilds history in chunks, and
+  repairs days whose marker was lost with the cache.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+
+from .models import AttendanceLog, DailyAttendanceRollup
+
+logger = logging.getLogger(__name__)
+
+STALE_KEY = 'attendance_rollup_stale_{}'
+
+# Days checked per cache read in refresh_stale
+STALE_READ_DAYS = 366
+
+
+class AttendanceRollupService:
+
+    @staticmethod
+    def day(check_in_time):
+        """The rollup day a check-in time counts towards"""
+        return check_in_time.date() if timezone.is_naive(check_in_time) else timezone.localdate(check_in_time)
+
+    @staticmethod
+    def logs_between(start, end):
+        """AttendanceLog rows checked in from start to end (inclusive dates)"""
+        # Datetime bounds rather than __date so the check_in_time index is usable
+        tz = timezone.get_current_timezone()
+        return AttendanceLog.objects.filter(
+            check_in_time__gte=timezone.make_aware(datetime.combine(start, time.min), tz),
+            check_in_time__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+        )
+
+    @staticmethod
+    def _aggregate(logs):
+        """Rollup rows for a queryset of logs - two grouped queries"""
+        logs = logs.annotate(day=TruncDate('check_in_time'))
+        bucket_fields = ('day', 'visit_type', 'location_id')
+
+        histograms = {}
+        hours = logs.annotate(hour=ExtractHour('check_in_time')).values(
+            *bucket_fields, 'hour'
+        ).annotate(visits=Count('id')).order_by()
+        for row in hours:
+            key = (row['day'], row['visit_type'], row['location_id'])
+            histograms.setdefault(key, [0] * 24)[row['hour']] = row['visits']
+
+        totals = logs.values(*bucket_fields).annotate(
+            visits=Count('id'),
+            unique_members=Count('member', distinct=True),
+            completed_visits=Count('id', filter=Q(duration_minutes__isnull=False)),
+            total_duration_minutes=Sum('duration_minutes'),
+        ).order_by()
+        rows = []
+        for row in totals:
+            completed = row['completed_visits']
+            duration = row['total_duration_minutes'] or 0
+            rows.append(DailyAttendanceRollup(
+                date=row['day'],
+                visit_type=row['visit_type'],
+                location_id=row['location_id'],
+                visits=row['visits'],
+                unique_members=row['unique_members'],
+                completed_visits=completed,
+                total_duration_minutes=duration,
+                avg_duration_minutes=round(duration / completed, 1) if completed else None,
+                hourly_visits=histograms.get((row['day'], row['visit_type'], row['location_id']), [0] * 24),
+            ))
+        return rows
+
+    @staticmethod
+    def schedule(days):
+        """Mark days stale once the current transaction commits"""
+        keys = {STALE_KEY.format(day): True for day in days}
+        transaction.on_commit(lambda: cache.set_many(keys, None))
+
+    @staticmethod
+    def refresh_stale(start, end):
+        """
+        Recompute the days from start to end (inclusive) written since
+        their last refresh
+
+        Returns:
+            Number of days recomputed
+        """
+        stale = {}
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=STALE_READ_DAYS - 1), end)
+            keys = {
+                STALE_KEY.format(day): day
+                for day in (chunk_start + timedelta(days=n) for n in range((chunk_end - chunk_start).days + 1))
+            }
+            stale.update((keys[key], key) for key in cache.get_many(keys))
+            chunk_start = chunk_end + timedelta(days=1)
+        if not stale:
+            return 0
+
+        # Cleared before recomputing, so a write committed meanwhile marks
+        # its day again instead of being lost
+        cache.delete_many(stale.values())
+        for day, key in stale.items():
+            try:
+                AttendanceRollupService.rebuild(day, day)
+            except Exception as e:
+                # e.g. a concurrent reader rebuilt the day first; left for the next read
+                cache.set(key, True, None)
+                logger.warning(f"Attendance rollup refresh failed for {day}: {e}")
+        return len(stale)
+
+    @staticmethod
+    def rebuild(start, end):
+        """
+        Recompute every rollup from start to end (inclusive)
+
+        Returns:
+            Number of rollup rows written
+        """
+        rows = AttendanceRollupService._aggregate(AttendanceRollupService.logs_between(start, end))
+        with transaction.atomic():
+            DailyAttendanceRollup.objects.filter(date__range=(start, end)).delete()
+            DailyAttendanceRollup.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+
+    @staticmethod
+    def daily_totals(start, end):
+        """
+        Per-day attendance from start to end - one indexed range read
+
+        Returns:
+            {date: {'total', 'indoor', 'outdoor', 'unique_members',
+                    'completed_visits', 'total_duration_minutes'}};
+            days without visits are absent
+        """
+        AttendanceRollupService.refresh_stale(start, end)
+        rows = DailyAttendanceRollup.objects.filter(date__range=(start, end)).values(
+            'date', 'visit_type'
+        ).annotate(
+            visits=Sum('visits'),
+            unique_members=Sum('unique_members'),
+            completed_visits=Sum('completed_visits'),
+            total_duration_minutes=Sum('total_duration_minutes'),
+        ).order_by()
+
+        days = {}
+        for row in rows:
+            day = days.setdefault(row['date'], {
+                'total': 0, 'indoor': 0, 'outdoor': 0, 'unique_members': 0,
+                'completed_visits': 0, 'total_duration_minutes': 0,
+            })
+            day['total'] += row['visits']
+            day[row['visit_type']] = day.get(row['visit_type'], 0) + row['visits']
+            # Members check in once a day, so buckets don't share members
+            day['unique_members'] += row['unique_members']
+            day['completed_visits'] += row['completed_visits']
+            day['total_duration_minutes'] += row['total_duration_minutes']
+        return days
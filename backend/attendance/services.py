@@ -1,7 +1,9 @@
 # RESPONSIBILITY: Everything about attendance (check-in, check-out, tracking)
+from django.db import transaction
 from django.utils import timezone
+from .checkin import CheckInService
 from .models import AttendanceLog
-from memberships.services import MembershipService
+from .occupancy import OccupancyService
 
 
 class AttendanceService:
@@ -13,32 +15,14 @@ class AttendanceService:
         - Validates member can check in
         - Creates attendance record
         - Uses session from membership
+        All of it happens in CheckInService; visit_type always comes from
+        the active membership and the argument is kept for old callers.
         """
-        # Check if already checked in
-        if AttendanceService._is_already_checked_in(member):
-            raise ValueError("Member is already checked in")
-
-        # Create attendance record
-        attendance = AttendanceLog.objects.create(
-            member=member, visit_type=visit_type, status="checked_in"
-        )
-
-        # Use session from active membership
-        active_membership = member.memberships.filter(status="active").first()
-        if active_membership:
-            try:
-                sessions_remaining = MembershipService.use_session(active_membership)
-            except ValueError:
-                sessions_remaining = 0
-        else:
-            sessions_remaining = 0
-
-        # Update member visit count
-        member.total_visits += 1
-        member.last_visit = timezone.now()
-        member.save()
-
-        return {"attendance": attendance, "sessions_remaining": sessions_remaining}
+        result = CheckInService.check_in(member_id=member.id)
+        return {
+            "attendance": result["attendance"],
+            "sessions_remaining": result["sessions_remaining"],
+        }
 
     @staticmethod
     def check_out_member(member):
@@ -50,19 +34,14 @@ class AttendanceService:
         attendance.check_out_time = timezone.now()
         attendance.status = "checked_out"
         attendance.save()
+        transaction.on_commit(lambda: OccupancyService.record_check_out(attendance))
 
         return attendance
 
-    @staticmethod
-    def _is_already_checked_in(member):
-        """Check if member is currently checked in"""
-        return AttendanceLog.objects.filter(
-            member=member, check_out_time__isnull=True, status="checked_in"
-        ).exists()
-
     @staticmethod
     def _get_active_attendance(member):
         """Get current active attendance record"""
+        # save() stores new check-ins as "active"
         return AttendanceLog.objects.filter(
-            member=member, check_out_time__isnull=True, status="checked_in"
+            member=member, check_out_time__isnull=True, status__in=["checked_in", "active"]
         ).first()
@@ -0,0 +1,23 @@
+"""
+Model signal receivers for the attendance app.
+
+Marks the daily attendance rollups of AttendanceLog writes stale.
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import AttendanceLog
+from .rollups import AttendanceRollupService
+
+
+@receiver(post_save, sender=AttendanceLog)
+@receiver(post_delete, sender=AttendanceLog)
+def mark_attendance_rollup_stale(sender, instance, **kwargs):
+    days = {AttendanceRollupService.day(instance.check_in_time)}
+    # A save that moves the visit to another day leaves the old day stale too
+    loaded = instance.loaded_check_in_time
+    if loaded is not None:
+        days.add(AttendanceRollupService.day(loaded))
+    instance.loaded_check_in_time = instance.check_in_time
+    AttendanceRollupService.schedule(days)
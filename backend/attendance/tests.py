@@ -1,3 +1,334 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.utils import timezone
+
+from members.models import Location, Member
+from ptf.pagination import CountStrategy
+from memberships.models import Membership, MembershipPlan, SessionLog
+from memberships.services import MembershipService
+from .checkin import CheckInService, CheckInError
+from .models import AttendanceLog, Attendance, DailyAttendanceRollup
+from .occupancy import OccupancyService
+from .rollups import AttendanceRollupService
+from .services import AttendanceService
+
+
+class CheckInServiceTests(TestCase):
+    """Tests for the consolidated check-in engine"""
+
+    def setUp(self):
+        plan = MembershipPlan.objects.create(
+            plan_name="Indoor Monthly", plan_code="IN-M", membership_type="indoor",
+            plan_type="monthly", sessions_per_week=3,
+        )
+        self.member = Member.objects.create(first_name="Brian", last_name="Mwangi")
+        self.membership = Membership.objects.create(
+            member=self.member, plan=plan, total_sessions_allowed=2, payment_status="paid",
+            start_date=timezone.now().date(), end_date=timezone.now().date() + timedelta(days=30),
+            amount_paid=3000,
+        )
+
+    def test_check_in_updates_counters(self):
+        """A check-in logs the visit and bumps session and visit counters"""
+        result = CheckInService.check_in(self.member.id)
+
+        self.assertEqual(result["sessions_remaining"], 1)
+        self.assertEqual(result["visit_type"], "indoor")
+        self.membership.refresh_from_db()
+        self.member.refresh_from_db()
+        self.assertEqual(self.membership.sessions_used, 1)
+        self.assertEqual(self.member.total_visits, 1)
+        self.assertIsNotNone(self.member.last_visit)
+        self.assertEqual(AttendanceLog.objects.get(member=self.member).status, "active")
+
+    def test_check_in_statement_count(self):
+        """Lock/read, insert and counter updates - no refresh or extra lookups"""
+        # SELECT, INSERT, UPDATE ... RETURNING (one CTE on PostgreSQL; the
+        # member, SessionLog and daily Attendance writes follow separately
+        # elsewhere), plus the location codes read on commit to clear the
+        # membership stats caches. Rollups and counters run no queries.
+        with self.assertNumQueries(4 if connection.vendor == "postgresql" else 7):
+            with self.captureOnCommitCallbacks(execute=True):
+                CheckInService.check_in(self.member.id)
+
+    def test_check_in_writes_session_and_daily_rows(self):
+        """Every check-in logs a session and counts towards the daily row"""
+        CheckInService.check_in(self.member.id, session_type="trial")
+        Membership.objects.filter(id=self.membership.id).update(sessions_used=0)
+        CheckInService.check_in(self.member.id, now=timezone.now() + timedelta(days=1))
+
+        self.assertEqual(
+            list(SessionLog.objects.values_list("session_type", flat=True).order_by("id")),
+            ["trial", "regular"],
+        )
+        daily = Attendance.objects.filter(member=self.member)
+        self.assertEqual(daily.count(), 2)
+        self.assertTrue(all(row.indoor_visits_today == 1 and row.currently_active for row in daily))
+
+    def test_all_entry_points_share_the_pipeline(self):
+        """MembershipService.use_session and AttendanceService go through CheckInService"""
+        success, message = MembershipService.use_session(self.membership, notes="front desk")
+        self.assertTrue(success, message)
+        self.assertEqual(self.membership.sessions_remaining, 1)
+        self.assertEqual(AttendanceLog.objects.filter(member=self.member).count(), 1)
+
+        with self.assertRaisesMessage(ValueError, "already checked in today"):
+            AttendanceService.check_in_member(self.member)
+        success, message = MembershipService.use_session(self.membership)
+        self.assertFalse(success)
+
+    def test_refusals(self):
+        """Second check-in the same day, unpaid and missing members are refused"""
+        CheckInService.check_in(self.member.id)
+        with self.assertRaisesMessage(CheckInError, "already checked in today"):
+            CheckInService.check_in(self.member.id)
+
+        Membership.objects.filter(id=self.membership.id).update(payment_status="pending")
+        with self.assertRaisesMessage(CheckInError, "Payment is still pending"):
+            CheckInService.check_in(self.member.id)
+
+        with self.assertRaises(CheckInError) as ctx:
+            CheckInService.check_in(self.member.id + 100)
+        self.assertEqual(ctx.exception.status_code, 404)
+
+    def test_no_sessions_left(self):
+        """A used-up allowance is refused without logging a visit"""
+        Membership.objects.filter(id=self.membership.id).update(sessions_used=2)
+        with self.assertRaisesMessage(CheckInError, "No sessions remaining"):
+            CheckInService.check_in(self.member.id)
+        self.assertFalse(AttendanceLog.objects.exists())
+
+
+class CheckInBatchTests(TestCase):
+    """Tests for offline kiosk batch check-in sync"""
+
+    def setUp(self):
+        plan = MembershipPlan.objects.create(
+            plan_name="Outdoor Weekly", plan_code="OUT-W", membership_type="outdoor",
+            plan_type="weekly", sessions_per_week=3,
+        )
+        today = timezone.now().date()
+        self.members = []
+        for i in range(3):
+            member = Member.objects.create(first_name=f"Kiosk{i}", last_name="Sync")
+            Membership.objects.create(
+                member=member, plan=plan, total_sessions_allowed=2, payment_status="paid",
+                start_date=today - timedelta(days=7), end_date=today + timedelta(days=7),
+                amount_paid=1000,
+            )
+            self.members.append(member)
+        self.now = timezone.now()
+
+    def _item(self, member, days_ago, key):
+        return {
+            "member_id": member.id,
+            "checked_in_at": (self.now - timedelta(days=days_ago)).isoformat(),
+            "idempotency_key": key,
+        }
+
+    def test_batch_applies_and_validates_in_bulk(self):
+        """Valid check-ins are written; per-item results explain the rest"""
+        first, second, third = self.members
+        items = [
+            self._item(first, 2, "a"),
+            self._item(first, 1, "b"),
+            self._item(first, 0, "c"),        # third visit, only 2 sessions
+            self._item(second, 0, "d"),
+            self._item(second, 0, "e"),       # same day twice
+            {"member_id": third.id, "idempotency_key": "f"},
+        ]
+        results = CheckInService.check_in_batch(items, now=self.now)
+
+        self.assertEqual(
+            [r["status"] for r in results],
+            ["created", "created", "rejected", "created", "rejected", "invalid"],
+        )
+        self.assertEqual(results[1]["sessions_remaining"], 0)
+        self.assertEqual(Membership.objects.get(member=first).sessions_used, 2)
+        self.assertEqual(Member.objects.get(id=first.id).total_visits, 2)
+        self.assertEqual(SessionLog.objects.count(), 3)
+        self.assertEqual(Attendance.objects.filter(member=first).count(), 2)
+        self.assertEqual(
+            AttendanceLog.objects.get(idempotency_key="a").id, results[0]["attendance_id"]
+        )
+
+    def test_retried_sync_does_not_double_count(self):
+        """Keys already synced (or repeated in the batch) come back as duplicates"""
+        items = [self._item(self.members[0], 1, "k1"), self._item(self.members[1], 1, "k2")]
+        CheckInService.check_in_batch(items, now=self.now)
+
+        results = CheckInService.check_in_batch(items + [items[0]], now=self.now)
+        self.assertEqual([r["status"] for r in results], ["duplicate"] * 3)
+        self.assertEqual(AttendanceLog.objects.count(), 2)
+        self.assertEqual(Membership.objects.get(member=self.members[0]).sessions_used, 1)
+
+    def test_repeated_key_conflicts_do_not_fail_the_sync(self):
+        """A batch that collides twice reports the other sync's keys as duplicates"""
+        items = [self._item(self.members[0], 1, "k1"), self._item(self.members[1], 1, "k2")]
+        with patch.object(CheckInService, "_write_batch", side_effect=IntegrityError), \
+                patch.object(CheckInService, "_existing_keys", side_effect=[{}, {}, {"k1": 42}]):
+            results = CheckInService.check_in_batch(items, now=self.now)
+
+        self.assertEqual([r["status"] for r in results], ["duplicate", "rejected"])
+        self.assertEqual(results[0]["attendance_id"], 42)
+        self.assertFalse(AttendanceLog.objects.exists())
+        self.assertEqual(Membership.objects.get(member=self.members[1]).sessions_used, 0)
+
+    def test_single_key_conflict_is_retried(self):
+        """The first collision is rolled back and the batch applied on the second pass"""
+        write_batch = CheckInService._write_batch
+        calls = []
+
+        def collide_once(accepted, now):
+            calls.append(len(accepted))
+            if len(calls) == 1:
+                raise IntegrityError
+            write_batch(accepted, now)
+
+        with patch.object(CheckInService, "_write_batch", side_effect=collide_once):
+            results = CheckInService.check_in_batch([self._item(self.members[0], 1, "k1")], now=self.now)
+
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(results[0]["status"], "created")
+        self.assertEqual(Membership.objects.get(member=self.members[0]).sessions_used, 1)
+
+    def test_check_ins_invalidate_cached_member_counts(self):
+        """The bulk and raw SQL writes bypass post_save but still refresh cached counts"""
+        visited = Member.objects.filter(total_visits__gt=0)
+        self.assertEqual(CountStrategy.count(visited, CountStrategy.CACHED), (0, CountStrategy.CACHED))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CheckInService.check_in_batch([self._item(self.members[0], 1, "c1")], now=self.now)
+        self.assertEqual(CountStrategy.count(visited, CountStrategy.CACHED)[0], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CheckInService.check_in(member_id=self.members[1].id)
+        self.assertEqual(CountStrategy.count(visited, CountStrategy.CACHED)[0], 2)
+
+
+class OccupancyServiceTests(TestCase):
+    """Tests for the live occupancy counters"""
+
+    def setUp(self):
+        cache.clear()
+        self.location = Location.objects.create(name="Karura Forest", code="karura")
+        plan = MembershipPlan.objects.create(
+            plan_name="Outdoor Weekly", plan_code="OUT-W", membership_type="outdoor",
+            plan_type="weekly", sessions_per_week=3,
+        )
+        self.members = []
+        for i in range(2):
+            member = Member.objects.create(first_name=f"Live{i}", last_name="Count")
+            Membership.objects.create(
+                member=member, plan=plan, location=self.location, total_sessions_allowed=5,
+                payment_status="paid", start_date=timezone.now().date(),
+                end_date=timezone.now().date() + timedelta(days=7), amount_paid=1000,
+            )
+            self.members.append(member)
+
+    def test_counters_follow_check_in_and_out_without_queries(self):
+        """Check-ins and check-outs adjust warm counters; reads run no queries"""
+        self.assertEqual(OccupancyService.snapshot()["checked_in_today"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CheckInService.check_in(self.members[0].id)
+            CheckInService.check_in(self.members[1].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            AttendanceService.check_out_member(self.members[0])
+
+        with self.assertNumQueries(0):
+            snapshot = OccupancyService.snapshot()
+        self.assertEqual(snapshot["checked_in_today"], 2)
+        self.assertEqual(snapshot["currently_active"], 1)
+        self.assertEqual(snapshot["outdoor"], {"total": 2, "active": 1})
+
+        # Incremental counters match a rebuild from the database
+        self.assertEqual(snapshot, OccupancyService.reconcile())
+        self.assertEqual(
+            OccupancyService.snapshot()["locations"][0],
+            {"id": self.location.id, "code": "karura", "name": "Karura Forest", "total": 2, "active": 1},
+        )
+
+
+class DailyAttendanceRollupTests(TestCase):
+    """Tests for the precomputed daily attendance rollups"""
+
+    def setUp(self):
+        self.location = Location.objects.create(name="Ngong Road", code="ngong")
+        self.members = [Member.objects.create(first_name=f"Roll{i}", last_name="Up") for i in range(3)]
+        self.today = timezone.localdate()
+
+    def log(self, member, days_ago=0, hour=7, visit_type="outdoor", minutes=None):
+        check_in = timezone.make_aware(timezone.datetime.combine(
+            self.today - timedelta(days=days_ago), timezone.datetime.min.time()
+        )) + timedelta(hours=hour)
+        return AttendanceLog.objects.create(
+            member=member, visit_type=visit_type, location=self.location if visit_type == "outdoor" else None,
+            check_in_time=check_in,
+            check_out_time=check_in + timedelta(minutes=minutes) if minutes else None,
+        )
+
+    def test_writes_keep_their_bucket_current(self):
+        """Writes mark their days stale; the next read recomputes them"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(self.members[0], hour=6, minutes=60)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(self.members[1], hour=6, minutes=90)
+        with self.captureOnCommitCallbacks(execute=True):
+            log = self.log(self.members[2], hour=18)
+        self.assertFalse(DailyAttendanceRollup.objects.exists())
+
+        self.assertEqual(AttendanceRollupService.daily_totals(self.today, self.today)[self.today]["total"], 3)
+        self.assertEqual(AttendanceRollupService.refresh_stale(self.today, self.today), 0)
+        rollup = DailyAttendanceRollup.objects.get(date=self.today, visit_type="outdoor")
+        self.assertEqual((rollup.visits, rollup.unique_members, rollup.completed_visits), (3, 3, 2))
+        self.assertEqual(rollup.avg_duration_minutes, 75.0)
+        self.assertEqual((rollup.hourly_visits[6], rollup.hourly_visits[18]), (2, 1))
+
+        # Moving a visit to another day refreshes both buckets
+        with self.captureOnCommitCallbacks(execute=True):
+            log = AttendanceLog.objects.get(id=log.id)
+            log.check_in_time -= timedelta(days=1)
+            log.save()
+        self.assertEqual(AttendanceRollupService.refresh_stale(self.today - timedelta(days=1), self.today), 2)
+        self.assertEqual(DailyAttendanceRollup.objects.get(date=self.today).visits, 2)
+        self.assertEqual(
+            DailyAttendanceRollup.objects.get(date=self.today - timedelta(days=1)).visits, 1
+        )
+
+    def test_backfill_matches_incremental_rollups(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(self.members[0], days_ago=40, visit_type="indoor", minutes=45)
+            self.log(self.members[1], days_ago=3)
+            self.log(self.members[2], days_ago=3, visit_type="indoor")
+        AttendanceRollupService.refresh_stale(self.today - timedelta(days=40), self.today)
+        incremental = list(DailyAttendanceRollup.objects.order_by("date", "visit_type").values())
+
+        DailyAttendanceRollup.objects.all().delete()
+        call_command("backfill_attendance_rollups", chunk_days=7, stdout=StringIO())
+        backfilled = list(DailyAttendanceRollup.objects.order_by("date", "visit_type").values())
+        for rows in (incremental, backfilled):
+            for row in rows:
+                row.pop("id"), row.pop("updated_at")
+        self.assertEqual(backfilled, incremental)
+
+        with self.assertNumQueries(1):
+            daily = AttendanceRollupService.daily_totals(self.today - timedelta(days=6), self.today)
+        self.assertEqual(daily[self.today - timedelta(days=3)]["total"], 2)
+
+    def test_weekly_attendance_is_one_query(self):
+        from dashboard.services import get_weekly_attendance
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.log(self.members[0], days_ago=1)
+        get_weekly_attendance()  # recomputes the stale day
+        with self.assertNumQueries(1):
+            weekly = get_weekly_attendance()
+        self.assertEqual(len(weekly), 7)
+        self.assertEqual(weekly[-2]["outdoor_visits"], 1)
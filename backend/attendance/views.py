@@ -10,6 +10,8 @@ import json
 
 from members.models import Member
 from memberships.models import Membership
+from .checkin import CheckInService, CheckInError
+from .occupancy import OccupancyService
 from .models import AttendanceLog, Attendance
 from .serializers import AttendanceLogSerializer, AttendanceSerializer
 
@@ -40,66 +42,22 @@ class CheckInView(APIView):
                 )
 
             try:
-                member = Member.objects.select_related().prefetch_related('memberships__plan').get(id=member_id)
-            except Member.DoesNotExist:
-                return Response(
-                    {"error": "Member not found"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-
-            # Automatically determine visit_type from member's active membership
-            active_membership = member.memberships.filter(status='active').first()
-            if not active_membership:
-                return Response(
-                    {"error": "Member has no active membership"},
-                    status=status.HTTP_400_BAD_REQUEST
+                result = CheckInService.check_in(
+                    member_id=member_id, activities=activities, notes=notes
                 )
+            except CheckInError as e:
+                error = {"error": str(e)}
+                if e.current_checkin_id:
+                    current_checkin = AttendanceLog.objects.select_related('member').get(
+                        id=e.current_checkin_id
+                    )
+                    error["current_checkin"] = AttendanceLogSerializer(current_checkin).data
+                return Response(error, status=e.status_code)
 
-            visit_type = active_membership.plan.membership_type
-            
-            # Check if member is already checked in today
-            today = timezone.now().date()
-            active_checkin = AttendanceLog.objects.filter(
-                member=member,
-                check_in_time__date=today,
-                status__in=['checked_in', 'active'],
-                check_out_time__isnull=True
-            ).first()
-            
-            if active_checkin:
-                return Response(
-                    {
-                        "error": "Member is already checked in",
-                        "current_checkin": AttendanceLogSerializer(active_checkin).data
-                    },
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Create attendance log
-            with transaction.atomic():
-                attendance_log = AttendanceLog.objects.create(
-                    member=member,
-                    visit_type=visit_type,
-                    check_in_time=timezone.now(),
-                    status='checked_in',
-                    activities=activities,
-                    notes=notes
-                )
-                
-                # Update daily attendance record
-                daily_attendance = Attendance.get_or_create_today(member)
-                daily_attendance.update_visit_count(visit_type)
-                daily_attendance.set_active_status(True)
-                
-                # Update member's last visit
-                member.last_visit = timezone.now()
-                member.total_visits += 1
-                member.save()
-            
             return Response(
                 {
                     "message": "Check-in successful",
-                    "attendance": AttendanceLogSerializer(attendance_log).data
+                    "attendance": AttendanceLogSerializer(result["attendance"]).data
                 },
                 status=status.HTTP_201_CREATED
             )
@@ -180,6 +138,7 @@ class CheckOutView(APIView):
                 if notes:
                     active_checkin.notes = notes
                 active_checkin.save()
+                transaction.on_commit(lambda: OccupancyService.record_check_out(active_checkin))
                 
                 # Update daily attendance status
                 daily_attendance = Attendance.get_or_create_today(member)
@@ -282,49 +241,30 @@ class TodaysAttendanceView(APIView):
             today = timezone.now().date()
             mode = request.query_params.get('mode', 'full')  # 'full' or 'summary'
 
-            # Optimize queries with prefetch_related for member's active memberships
-            todays_checkins = AttendanceLog.objects.filter(
-                check_in_time__date=today
-            ).select_related('member').prefetch_related(
-                'member__memberships__plan'
-            )
-
-            # Get currently active members
-            currently_active = todays_checkins.filter(
-                status__in=['checked_in', 'active'],
-                check_out_time__isnull=True
-            )
-
-            # Use aggregate queries for better performance
-            from django.db.models import Count, Q
-            summary_data = todays_checkins.aggregate(
-                total_checkins=Count('id'),
-                outdoor_total=Count('id', filter=Q(visit_type='outdoor')),
-                currently_active=Count('id', filter=Q(
-                    status__in=['checked_in', 'active'],
-                    check_out_time__isnull=True
-                )),
-                outdoor_active=Count('id', filter=Q(
-                    visit_type='outdoor',
-                    status__in=['checked_in', 'active'],
-                    check_out_time__isnull=True
-                ))
-            )
+            # Summary counts come from the live occupancy counters
+            occupancy = OccupancyService.snapshot()
 
             response_data = {
                 "date": today.isoformat(),
                 "summary": {
-                    "total_checkins": summary_data['total_checkins'],
-                    "currently_active": summary_data['currently_active'],
-                    "outdoor": {
-                        "total": summary_data['outdoor_total'],
-                        "active": summary_data['outdoor_active']
-                    }
+                    "total_checkins": occupancy['checked_in_today'],
+                    "currently_active": occupancy['currently_active'],
+                    "outdoor": occupancy['outdoor'],
+                    "indoor": occupancy['indoor'],
+                    "locations": occupancy['locations'],
                 }
             }
 
             # Only include active_members in full mode to reduce data transfer
             if mode == 'full':
+                # Optimize queries with prefetch_related for member's active memberships
+                currently_active = AttendanceLog.objects.filter(
+                    check_in_time__date=today,
+                    status__in=['checked_in', 'active'],
+                    check_out_time__isnull=True
+                ).select_related('member').prefetch_related(
+                    'member__memberships__plan'
+                )
                 response_data["active_members"] = [
                     {
                         "id": log.member.id,
@@ -1,11 +1,12 @@
 from django.db.models import Count, Sum
 from django.utils import timezone
-from django.core.cache import cache
 from datetime import timedelta, date
 from members.models import Member
 from memberships.models import Membership
-from attendance.models import AttendanceLog
+from attendance.occupancy import OccupancyService
+from attendance.rollups import AttendanceRollupService
 from bookings.models import Booking
+from ptf.caching import get_or_compute, ttl
 
 
 def get_member_statistics():
@@ -76,62 +77,37 @@ def get_attendance_today():
     Get today's attendance statistics
     Returns: dict with today's check-ins and visit breakdown
     """
-    today = timezone.now().date()
-
-    # Today's attendance
-    total_checkins_today = AttendanceLog.objects.filter(
-        check_in_time__date=today
-    ).count()
-
-    indoor_visits_today = AttendanceLog.objects.filter(
-        check_in_time__date=today, visit_type="indoor"
-    ).count()
-
-    outdoor_visits_today = AttendanceLog.objects.filter(
-        check_in_time__date=today, visit_type="outdoor"
-    ).count()
-
-    # Currently active (checked in but not out)
-    currently_active = AttendanceLog.objects.filter(
-        check_in_time__date=today, check_out_time__isnull=True
-    ).count()
+    # Read from the live occupancy counters instead of counting rows
+    occupancy = OccupancyService.snapshot()
 
     return {
-        "total_checkins_today": total_checkins_today,
-        "indoor_visits_today": indoor_visits_today,
-        "outdoor_visits_today": outdoor_visits_today,
-        "currently_active": currently_active,
+        "total_checkins_today": occupancy["checked_in_today"],
+        "indoor_visits_today": occupancy["indoor"]["total"],
+        "outdoor_visits_today": occupancy["outdoor"]["total"],
+        "currently_active": occupancy["currently_active"],
     }
 
 
 def get_weekly_attendance():
     """
-    Get attendance for the last 7 days
+    Get attendance for the last 7 days from the daily rollups (one query)
     Returns: list of daily attendance data
     """
     today = timezone.now().date()
+    daily = AttendanceRollupService.daily_totals(today - timedelta(days=6), today)
     weekly_data = []
 
     for i in range(7):
         day = today - timedelta(days=i)
-
-        daily_checkins = AttendanceLog.objects.filter(check_in_time__date=day).count()
-
-        indoor_visits = AttendanceLog.objects.filter(
-            check_in_time__date=day, visit_type="indoor"
-        ).count()
-
-        outdoor_visits = AttendanceLog.objects.filter(
-            check_in_time__date=day, visit_type="outdoor"
-        ).count()
+        counts = daily.get(day, {})
 
         weekly_data.append(
             {
                 "date": day.isoformat(),
                 "day_name": day.strftime("%A"),
-                "total_visits": daily_checkins,
-                "indoor_visits": indoor_visits,
-                "outdoor_visits": outdoor_visits,
+                "total_visits": counts.get("total", 0),
+                "indoor_visits": counts.get("indoor", 0),
+                "outdoor_visits": counts.get("outdoor", 0),
             }
         )
 
@@ -238,13 +214,11 @@ def get_dashboard_summary():
     Simplified dashboard function - returns only the 5 essential metrics for dashboard cards
     Returns: lightweight dashboard data structure with caching
     """
-    # Cache key for dashboard stats (valid for 5 minutes)
-    cache_key = "dashboard_summary"
-    cached_data = cache.get(cache_key)
+    # Served stale while one worker refreshes it
+    return get_or_compute("dashboard_summary", _compute_dashboard_summary, soft_ttl=ttl("dashboard"))
 
-    if cached_data is not None:
-        return cached_data
 
+def _compute_dashboard_summary():
     # Get only essential membership statistics (fast query)
     membership_stats = get_dashboard_statistics()
 
@@ -261,9 +235,6 @@ def get_dashboard_summary():
         "date": timezone.now().date().isoformat(),
     }
 
-    # Cache for 5 minutes (300 seconds)
-    cache.set(cache_key, result, 300)
-
     return result
 
 
@@ -1,3 +1,75 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ptf import caching
+from ptf.cache_backends import SQLiteCache
+
+
+@override_settings(CACHE_BACKGROUND_REFRESH=False)
+class StaleWhileRevalidateTests(TestCase):
+    """Tests for the shared stale-while-revalidate cache helper"""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_stale_value_is_served_while_one_refresh_runs(self):
+        self.assertEqual(caching.get_or_compute("swr_test", self.compute, soft_ttl=60), 1)
+        self.assertEqual(caching.get_or_compute("swr_test", self.compute, soft_ttl=60), 1)
+
+        # Past the soft TTL: the stale value is returned and refreshed once
+        cache.set("swr_test", (0, 1), 60)
+        self.assertEqual(caching.get_or_compute("swr_test", self.compute, soft_ttl=60), 1)
+        self.assertEqual(caching.get_or_compute("swr_test", self.compute, soft_ttl=60), 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_refresh_lock_keeps_other_callers_from_recomputing(self):
+        cache.set("swr_test", (0, "stale"), 60)
+        cache.add(caching.LOCK_KEY.format("swr_test"), True)
+        self.assertEqual(caching.get_or_compute("swr_test", self.compute, soft_ttl=60), "stale")
+        self.assertEqual(self.calls, 0)
+
+    def test_dashboard_summary_is_cached_until_invalidated(self):
+        from dashboard.services import get_dashboard_summary
+
+        get_dashboard_summary()
+        with self.assertNumQueries(0):
+            get_dashboard_summary()
+        caching.invalidate("dashboard_summary")
+        self.assertIsNone(cache.get("dashboard_summary"))
+
+
+class SQLiteCacheTests(TestCase):
+    """Tests for the shared SQLite cache backend"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f"{directory.name}/cache.sqlite3"
+        self.cache = SQLiteCache(self.path, {})
+
+    def test_values_are_shared_between_instances(self):
+        other_worker = SQLiteCache(self.path, {})
+        self.cache.set_many({"a": {"x": 1}, "b": 2})
+        self.assertEqual(other_worker.get_many(["a", "b", "c"]), {"a": {"x": 1}, "b": 2})
+        other_worker.delete("a")
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_add_incr_and_expiry(self):
+        self.assertTrue(self.cache.add("lock", True, 60))
+        self.assertFalse(self.cache.add("lock", True, 60))
+        self.cache.set("expired", 1, -1)
+        self.assertTrue(self.cache.add("expired", 2))
+        self.assertEqual(self.cache.get("expired"), 2)
+
+        self.cache.set("counter", 0, None)
+        self.assertEqual(self.cache.incr("counter", 5), 5)
+        self.assertEqual(self.cache.decr("counter"), 4)
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
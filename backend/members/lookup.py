@@ -0,0 +1,213 @@
+"""
+Front-desk member lookup cache
+
+A compact, process-local copy of what the check-in search needs for every
+active member (names, phone, active membership type and payment status),
+with a trigram index over names and phone. Typing "jo", "joh", "john"
+is answered from memory instead of three database searches.
+
+Writes keep it current in two steps:
+- the process that made the write refreshes the member straight away
+  (Member, Membership and Payment signals, on commit)
+- every write also bumps a change counter in the shared cache, so other
+  worker processes replay the changed member ids on their next lookup
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Member
+from .search import NgramIndex
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'frontdesk_lookup_version'
+CHANGE_KEY = 'frontdesk_lookup_change_{}'
+
+# Change records are kept this long; workers further behind re-warm fully
+CHANGE_TIMEOUT = 3600
+
+# Most changes a worker replays one by one before re-warming instead
+MAX_REPLAY = 500
+
+
+class LookupEntry:
+    """One active member as shown in front-desk search results"""
+
+    __slots__ = ('id', 'first_name', 'last_name', 'phone', 'membership_type', 'payment_status')
+
+    def __init__(self, id, first_name, last_name, phone, membership_type='unknown', payment_status='unknown'):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.phone = phone
+        self.membership_type = membership_type
+        self.payment_status = payment_status
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            'id': self.id,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'membership_type': self.membership_type,
+            'payment_status': self.payment_status,
+        }
+
+
+class MemberLookupCache:
+    """In-memory index of active members for check-in search"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._entries: Dict[int, LookupEntry] = {}
+        self._index = NgramIndex()
+        self._version: Optional[int] = None
+        self.is_warm = False
+
+    @staticmethod
+    def _shared_version() -> int:
+        return cache.get(VERSION_KEY) or 0
+
+    @staticmethod
+    def _active_memberships(member_ids: Optional[Iterable[int]] = None) -> Dict[int, tuple]:
+        """Latest active membership (type, payment status) per member"""
+        from memberships.models import Membership
+
+        memberships = Membership.objects.filter(status='active')
+        if member_ids is not None:
+            memberships = memberships.filter(member_id__in=member_ids)
+        rows = memberships.order_by('member_id', '-created_at').values_list(
+            'member_id', 'plan__membership_type', 'payment_status'
+        )
+        result = {}
+        for member_id, membership_type, payment_status in rows:
+            result.setdefault(member_id, (membership_type, payment_status))
+        return result
+
+    def _store(self, member_id, first_name, last_name, phone, membership) -> None:
+        membership_type, payment_status = membership or ('unknown', 'unknown')
+        self._entries[member_id] = LookupEntry(
+            member_id, first_name, last_name, phone, membership_type, payment_status
+        )
+        self._index.add(member_id, (first_name, last_name, phone))
+
+    def warm(self) -> None:
+        """(Re)load every active member - two queries"""
+        with self._lock:
+            version = self._shared_version()
+            memberships = self._active_memberships()
+            rows = Member.objects.filter(status='active').values_list(
+                'id', 'first_name', 'last_name', 'phone'
+            )
+            self._entries.clear()
+            self._index.clear()
+            for member_id, first_name, last_name, phone in rows.iterator(chunk_size=2000):
+                self._store(member_id, first_name, last_name, phone, memberships.get(member_id))
+            self._version = version
+            self.is_warm = True
+            logger.info(f"Warmed front-desk lookup cache with {len(self._entries)} members")
+
+    def refresh_members(self, member_ids: Iterable[int]) -> None:
+        """Reload the given members from the database"""
+        member_ids = set(member_ids)
+        if not member_ids or not self.is_warm:
+            return
+        memberships = self._active_memberships(member_ids)
+        rows = Member.objects.filter(id__in=member_ids, status='active').values_list(
+            'id', 'first_name', 'last_name', 'phone'
+        )
+        with self._lock:
+            found = set()
+            for member_id, first_name, last_name, phone in rows:
+                found.add(member_id)
+                self._store(member_id, first_name, last_name, phone, memberships.get(member_id))
+            for member_id in member_ids - found:
+                self._entries.pop(member_id, None)
+                self._index.remove(member_id)
+
+    def apply_change(self, member_id: int, version: int) -> None:
+        """Apply a change made by this process without waiting for sync()"""
+        with self._lock:
+            self.refresh_members([member_id])
+            if self._version == version - 1:
+                self._version = version
+
+    def sync(self) -> str:
+        """
+        Warm on first use, then replay changes made by other processes
+
+        Returns:
+            'current', 'replayed' or 'warmed' (loaded from the database)
+        """
+        if not self.is_warm:
+            self.warm()
+            return 'warmed'
+
+        shared = self._shared_version()
+        if shared == self._version:
+            return 'current'
+        with self._lock:
+            local = self._version or 0
+            if shared < local or shared - local > MAX_REPLAY:
+                # Cache was cleared or we are too far behind
+                self.warm()
+                return 'warmed'
+            keys = [CHANGE_KEY.format(n) for n in range(local + 1, shared + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) < len(keys):
+                self.warm()
+                return 'warmed'
+            self.refresh_members(changes.values())
+            self._version = shared
+            return 'replayed'
+
+    def search(self, query: str, limit: int = 10) -> List[LookupEntry]:
+        """Ranked active members matching the query"""
+        self.sync()
+        return self.match(query, limit)
+
+    def match(self, query: str, limit: int = 10) -> List[LookupEntry]:
+        """search() without the sync, for callers that already synced"""
+        with self._lock:
+            ranked = self._index.search(query, limit, active_only=False)
+            return [self._entries[member_id] for member_id, _ in ranked if member_id in self._entries]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_lookup = MemberLookupCache()
+
+
+def get_lookup_cache() -> MemberLookupCache:
+    """Return the process-wide front-desk lookup cache"""
+    return _lookup
+
+
+def member_changed(member_id: int) -> None:
+    """
+    Record a write affecting a member's lookup entry. Applied locally and
+    published to other processes once the transaction commits.
+    """
+    def publish():
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, 0, None)
+            version = cache.incr(VERSION_KEY)
+        cache.set(CHANGE_KEY.format(version), member_id, CHANGE_TIMEOUT)
+        _lookup.apply_change(member_id, version)
+
+    transaction.on_commit(publish)
+
+
+def warm_lookup_cache() -> None:
+    """Warm the lookup cache at process start; failures only delay it"""
+    try:
+        _lookup.warm()
+    except Exception as e:
+        logger.warning(f"Front-desk lookup cache not warmed at startup: {e}")
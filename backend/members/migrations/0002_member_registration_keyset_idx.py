@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("members", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="member",
+            index=models.Index(
+                fields=["-registration_date", "-id"],
+                name="member_registration_keyset_idx",
+            ),
+        ),
+    ]
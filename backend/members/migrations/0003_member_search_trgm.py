@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-17 11:40
+
+from django.db import migrations
+
+# (index name, column) - expressions match TrigramSearchBackend's Upper()
+# annotations and Django's icontains SQL on PostgreSQL
+TRGM_INDEXES = [
+    ("member_first_name_trgm_idx", "first_name"),
+    ("member_last_name_trgm_idx", "last_name"),
+    ("member_phone_trgm_idx", "phone"),
+    ("member_email_trgm_idx", "email"),
+    ("member_id_passport_trgm_idx", "id_passport"),
+]
+
+
+def create_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRGM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON members_member "
+            f"USING gin (UPPER({column}::text) gin_trgm_ops)"
+        )
+
+
+def drop_trgm_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in TRGM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("members", "0002_member_registration_keyset_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_indexes, drop_trgm_indexes),
+    ]
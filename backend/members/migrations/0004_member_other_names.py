@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("members", "0003_member_search_trgm"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="member",
+            name="other_names",
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+    ]
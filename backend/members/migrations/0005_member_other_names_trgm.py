@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-17 18:05
+
+from django.db import migrations
+
+
+def create_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS member_other_names_trgm_idx ON members_member "
+        "USING gin (UPPER(other_names::text) gin_trgm_ops)"
+    )
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS member_other_names_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("members", "0004_member_other_names"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
@@ -62,6 +62,13 @@ class Member(models.Model):
     
     class Meta:
         ordering = ['-registration_date']
+        indexes = [
+            # Supports keyset pagination over (registration_date, id)
+            models.Index(
+                fields=['-registration_date', '-id'],
+                name='member_registration_keyset_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['id_passport'],
@@ -0,0 +1,435 @@
+"""
+Member search backends
+
+Front-desk search runs on every keystroke, so instead of OR-ed icontains
+scans it goes through a dedicated backend:
+
+- PostgreSQL: pg_trgm GIN indexes (see migration 0003) with ranked
+  prefix + fuzzy (word similarity) matching done in the database
+- Other databases (SQLite in development): an in-process trigram index
+  kept current through Member save/delete signals, and through the shared
+  member change feed (members.lookup) for writes made by other workers
+"""
+
+import bisect
+import logging
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Greatest, Upper
+
+from .models import Member
+
+logger = logging.getLogger(__name__)
+
+# Fields searched by the front desk
+SEARCH_FIELDS = ['first_name', 'other_names', 'last_name', 'phone', 'email', 'id_passport']
+
+# Minimum similarity for a fuzzy (typo-tolerant) match
+FUZZY_THRESHOLD = 0.3
+
+# Trigram length: shorter queries have no inner grams, so the index only
+# finds them as prefixes
+GRAM_SIZE = 3
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase and split on anything that is not a letter or digit"""
+    if not text:
+        return ''
+    return _NON_WORD.sub(' ', text.lower()).strip()
+
+
+def trigrams(word: str, trailing_pad: bool = True) -> Set[str]:
+    """
+    pg_trgm style trigrams: words are padded with two leading spaces and
+    one trailing space. Query prefixes skip the trailing pad so that "jo"
+    matches "john" through the "  j" and " jo" grams.
+    """
+    padded = f"  {word} " if trailing_pad else f"  {word}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """Jaccard similarity between two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / float(len(a | b))
+
+
+class NgramIndex:
+    """
+    In-process trigram index over member search fields.
+
+    Members are tokenized into words (names, phone, email parts, ID). The
+    index is kept at token level: a sorted vocabulary answers prefix
+    queries with a bisect, and trigram postings over the vocabulary find
+    substring and fuzzy (typo) matches. Each matching token is scored once
+    (exact > prefix > substring > fuzzy) and its members inherit the score.
+    """
+
+    # Cap on vocabulary entries scanned for a single prefix (e.g. "07" over
+    # every phone number); ranking within very broad prefixes is approximate
+    MAX_PREFIX_TOKENS = 5000
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._member_tokens: Dict[int, Tuple[str, ...]] = {}
+        self._token_members: Dict[str, Set[int]] = {}
+        self._vocabulary: List[str] = []
+        self._gram_tokens: Dict[str, Set[str]] = {}
+        self._active: Set[int] = set()
+        self.is_built = False
+
+    @staticmethod
+    def tokenize(values: Iterable[Optional[str]]) -> Tuple[str, ...]:
+        tokens = []
+        for value in values:
+            tokens.extend(normalize(value).split())
+        return tuple(dict.fromkeys(tokens))
+
+    def add(self, member_id: int, values: Iterable[Optional[str]], is_active: bool = True) -> None:
+        """Add or replace a member in the index"""
+        tokens = self.tokenize(values)
+        with self._lock:
+            self._unlink(member_id)
+            self._member_tokens[member_id] = tokens
+            for token in tokens:
+                members = self._token_members.get(token)
+                if members is None:
+                    members = self._token_members[token] = set()
+                    bisect.insort(self._vocabulary, token)
+                    for gram in trigrams(token):
+                        self._gram_tokens.setdefault(gram, set()).add(token)
+                members.add(member_id)
+            if is_active:
+                self._active.add(member_id)
+            else:
+                self._active.discard(member_id)
+
+    def remove(self, member_id: int) -> None:
+        """Remove a member from the index"""
+        with self._lock:
+            self._unlink(member_id)
+            self._member_tokens.pop(member_id, None)
+            self._active.discard(member_id)
+
+    def _unlink(self, member_id: int) -> None:
+        for token in self._member_tokens.get(member_id, ()):
+            members = self._token_members.get(token)
+            if members is None:
+                continue
+            members.discard(member_id)
+            if members:
+                continue
+            # Last member using this token - drop it from the vocabulary
+            del self._token_members[token]
+            position = bisect.bisect_left(self._vocabulary, token)
+            if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                del self._vocabulary[position]
+            for gram in trigrams(token):
+                tokens = self._gram_tokens.get(gram)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._gram_tokens[gram]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._member_tokens.clear()
+            self._token_members.clear()
+            self._vocabulary.clear()
+            self._gram_tokens.clear()
+            self._active.clear()
+            self.is_built = False
+
+    def __len__(self):
+        return len(self._member_tokens)
+
+    def _token_tiers(self, word: str) -> Iterator[List[Tuple[float, str]]]:
+        """
+        Yield scored vocabulary tokens matching one query word, one tier at
+        a time (exact/prefix, then substring, then fuzzy), best first. Later
+        tiers are only computed if the caller keeps iterating.
+        """
+        seen = set()
+
+        # Exact and prefix matches from the sorted vocabulary
+        prefix_tier = []
+        start = bisect.bisect_left(self._vocabulary, word)
+        for token in self._vocabulary[start:start + self.MAX_PREFIX_TOKENS]:
+            if not token.startswith(word):
+                break
+            seen.add(token)
+            prefix_tier.append((3.0 if token == word else 2.0 + len(word) / float(len(token)), token))
+        prefix_tier.sort(reverse=True)
+        yield prefix_tier
+
+        inner = [gram for gram in trigrams(word, trailing_pad=False) if not gram.startswith(' ')]
+        if not inner:
+            # Words shorter than a trigram ("li" in "kalimi") have no inner
+            # grams, so their substring matches come from a vocabulary scan
+            yield [(1.5, token) for token in self._vocabulary if token not in seen and word in token]
+            return
+        postings = sorted((self._gram_tokens.get(gram, set()) for gram in inner), key=len)
+
+        # Substring matches: tokens containing every inner gram of the word
+        if postings[0]:
+            yield [
+                (1.5, token)
+                for token in postings[0].intersection(*postings[1:])
+                if token not in seen and word in token and not seen.add(token)
+            ]
+
+        # Fuzzy matches: tokens sharing at least half the grams (typos)
+        if len(word) >= 4:
+            needed = max(1, len(inner) // 2)
+            overlap = Counter()
+            for tokens in postings:
+                overlap.update(tokens)
+            word_grams = trigrams(word)
+            fuzzy_tier = []
+            for token, shared in overlap.items():
+                if shared < needed or token in seen:
+                    continue
+                score = similarity(word_grams, trigrams(token))
+                if score >= FUZZY_THRESHOLD:
+                    fuzzy_tier.append((score, token))
+            fuzzy_tier.sort(reverse=True)
+            yield fuzzy_tier
+
+    def _member_scores(self, word: str, active_only: bool) -> Dict[int, float]:
+        """Best score per member for one query word"""
+        scores: Dict[int, float] = {}
+        for tier in self._token_tiers(word):
+            for score, token in tier:
+                for member_id in self._token_members[token]:
+                    if member_id in scores or (active_only and member_id not in self._active):
+                        continue
+                    scores[member_id] = score
+        return scores
+
+    def search(self, query: str, limit: int = 10, active_only: bool = True) -> List[Tuple[int, float]]:
+        """
+        Ranked search over the index. Every query word must match.
+
+        Returns:
+            List of (member_id, score) tuples, best match first
+        """
+        words = list(dict.fromkeys(normalize(query).split()))
+        if not words:
+            return []
+
+        with self._lock:
+            if len(words) == 1:
+                # Tokens arrive best first, so stop once the page is full
+                results = []
+                seen = set()
+                for tier in self._token_tiers(words[0]):
+                    for score, token in tier:
+                        for member_id in sorted(self._token_members[token], reverse=True):
+                            if member_id in seen or (active_only and member_id not in self._active):
+                                continue
+                            seen.add(member_id)
+                            results.append((member_id, score))
+                        if len(results) >= limit:
+                            return results[:limit]
+                return results
+
+            scores = None
+            for word in words:
+                word_scores = self._member_scores(word, active_only)
+                if scores is None:
+                    scores = word_scores
+                else:
+                    scores = {
+                        member_id: scores[member_id] + score
+                        for member_id, score in word_scores.items()
+                        if member_id in scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return ranked[:limit]
+
+
+class MemberSearchBackend:
+    """Base class for member search backends"""
+
+    name = 'base'
+
+    def search(self, query: str, limit: int = 10, active_only: bool = True) -> List[int]:
+        """Return ranked member ids matching the query"""
+        raise NotImplementedError
+
+    def filter_q(self, query: str) -> Q:
+        """Q object restricting a member queryset to search matches"""
+        search_filter = Q()
+        for field in SEARCH_FIELDS:
+            search_filter |= Q(**{f"{field}__icontains": query})
+        return search_filter
+
+    def index_member(self, member: Member) -> None:
+        """Called after a member is saved"""
+
+    def remove_member(self, member_id: int) -> None:
+        """Called after a member is deleted"""
+
+
+class TrigramSearchBackend(MemberSearchBackend):
+    """PostgreSQL pg_trgm backend - ranking and matching happen in the database"""
+
+    name = 'pg_trgm'
+
+    def search(self, query: str, limit: int = 10, active_only: bool = True) -> List[int]:
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        query = query.strip()
+        if not query:
+            return []
+        upper_query = query.upper()
+
+        members = Member.objects.all()
+        if active_only:
+            members = members.filter(status='active')
+
+        # Upper(...) matches the expression of the GIN indexes, which also
+        # serve the icontains filters (UPPER(col::text) LIKE UPPER(%q%))
+        members = members.annotate(
+            search_first_name=Upper('first_name'),
+            search_last_name=Upper('last_name'),
+        )
+
+        substring_filter = self.filter_q(query)
+        fuzzy_filter = (
+            Q(search_first_name__trigram_word_similar=upper_query)
+            | Q(search_last_name__trigram_word_similar=upper_query)
+        )
+
+        ranked = members.filter(substring_filter | fuzzy_filter).annotate(
+            rank=Greatest(
+                TrigramWordSimilarity(Value(upper_query), 'search_first_name'),
+                TrigramWordSimilarity(Value(upper_query), 'search_last_name'),
+            ) + Case(
+                When(
+                    Q(first_name__istartswith=query)
+                    | Q(last_name__istartswith=query)
+                    | Q(phone__startswith=query),
+                    then=Value(1.0),
+                ),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        ).order_by('-rank', '-id')
+
+        return list(ranked.values_list('id', flat=True)[:limit])
+
+
+class NgramSearchBackend(MemberSearchBackend):
+    """In-process trigram index backend for databases without pg_trgm"""
+
+    name = 'ngram'
+
+    def __init__(self):
+        self.index = NgramIndex()
+        # Position in the shared member change feed (members.lookup)
+        self._version: Optional[int] = None
+
+    def ensure_built(self) -> None:
+        """Build the index from the database on first use"""
+        if self.index.is_built:
+            self.sync()
+            return
+        from .lookup import VERSION_KEY
+
+        with self.index._lock:
+            if self.index.is_built:
+                return
+            self._version = cache.get(VERSION_KEY) or 0
+            rows = Member.objects.values_list('id', 'status', *SEARCH_FIELDS)
+            for member_id, status, *values in rows.iterator(chunk_size=2000):
+                self.index.add(member_id, values, is_active=status == 'active')
+            self.index.is_built = True
+            logger.info(f"Built member search index with {len(self.index)} members")
+
+    def sync(self) -> None:
+        """Re-index members changed by other worker processes"""
+        from .lookup import CHANGE_KEY, MAX_REPLAY, VERSION_KEY
+
+        shared = cache.get(VERSION_KEY) or 0
+        if shared == self._version:
+            return
+        with self.index._lock:
+            local = self._version or 0
+            keys = [CHANGE_KEY.format(n) for n in range(local + 1, shared + 1)]
+            changes = cache.get_many(keys) if 0 < len(keys) <= MAX_REPLAY else {}
+            if len(changes) < len(keys) or shared < local:
+                # Too far behind or the cache was cleared: rebuild
+                self.index.clear()
+                self.ensure_built()
+                return
+            member_ids = set(changes.values())
+            rows = Member.objects.filter(id__in=member_ids).values_list('id', 'status', *SEARCH_FIELDS)
+            for member_id, status, *values in rows:
+                member_ids.discard(member_id)
+                self.index.add(member_id, values, is_active=status == 'active')
+            for member_id in member_ids:
+                self.index.remove(member_id)
+            self._version = shared
+
+    # Above this many matches an id__in filter costs more than a plain scan
+    MAX_FILTER_IDS = 2000
+
+    def search(self, query: str, limit: int = 10, active_only: bool = True) -> List[int]:
+        self.ensure_built()
+        return [member_id for member_id, _ in self.index.search(query, limit, active_only)]
+
+    @staticmethod
+    def _is_short(query: str) -> bool:
+        return 0 < len(normalize(query)) < GRAM_SIZE
+
+    def filter_q(self, query: str) -> Q:
+        if self._is_short(query):
+            return super().filter_q(query.strip())
+        member_ids = self.search(query, limit=self.MAX_FILTER_IDS + 1, active_only=False)
+        if len(member_ids) > self.MAX_FILTER_IDS:
+            return super().filter_q(query)
+        return Q(id__in=member_ids)
+
+    def index_member(self, member: Member) -> None:
+        # Until the index is built it will read fresh rows anyway
+        if self.index.is_built:
+            self.index.add(
+                member.id,
+                [getattr(member, field) for field in SEARCH_FIELDS],
+                is_active=member.status == 'active',
+            )
+
+    def remove_member(self, member_id: int) -> None:
+        if self.index.is_built:
+            self.index.remove(member_id)
+
+
+_backend: Optional[MemberSearchBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend() -> MemberSearchBackend:
+    """Return the process-wide search backend for the default database"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if connection.vendor == 'postgresql':
+                    _backend = TrigramSearchBackend()
+                else:
+                    _backend = NgramSearchBackend()
+    return _backend
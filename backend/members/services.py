@@ -9,13 +9,14 @@ import logging
 from django.utils import timezone
 from django.db.models import Q, Count, Avg
 from django.core.exceptions import ValidationError
-from django.core.cache import cache
 from typing import Dict, Any, Optional, List, Tuple
 from decimal import Decimal
 
 from .models import Member, Location, PhysicalProfile
 from memberships.models import Membership
 from attendance.models import AttendanceLog
+from attendance.occupancy import OccupancyService
+from ptf.caching import get_or_compute, ttl
 
 logger = logging.getLogger(__name__)
 
@@ -201,14 +202,10 @@ class MemberService:
             filters &= Q(memberships__plan__membership_type=membership_type)
         
         if search_query:
-            search_filters = (
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(email__icontains=search_query) |
-                Q(phone__icontains=search_query) |
-                Q(id_passport__icontains=search_query)
-            )
-            filters &= search_filters
+            # Served by the pg_trgm indexes on PostgreSQL, or resolved to
+            # matching ids by the in-process index elsewhere
+            from .search import get_search_backend
+            filters &= get_search_backend().filter_q(search_query.strip())
         
         return filters
 
@@ -487,17 +484,14 @@ def get_recent_member_activity():
     """
     today = timezone.now().date()
     week_ago = today - timezone.timedelta(days=7)
+    occupancy = OccupancyService.snapshot()
 
     activity_stats = {
         "new_registrations_this_week": Member.objects.filter(
             registration_date__gte=week_ago
         ).count(),
-        "members_visited_today": AttendanceLog.objects.filter(
-            check_in_time__date=today
-        ).values('member').distinct().count(),
-        "total_visits_today": AttendanceLog.objects.filter(
-            check_in_time__date=today
-        ).count()
+        "members_visited_today": occupancy["members_visited_today"],
+        "total_visits_today": occupancy["checked_in_today"]
     }
 
     return activity_stats
@@ -535,13 +529,11 @@ def get_members_summary():
     Lightweight members summary - only essential stats for UI cards with caching
     Returns: minimal data structure for fast loading
     """
-    # Cache key for members summary (valid for 5 minutes)
-    cache_key = "members_summary"
-    cached_data = cache.get(cache_key)
+    # Served stale while one worker refreshes it
+    return get_or_compute("members_summary", _compute_members_summary, soft_ttl=ttl("members"))
 
-    if cached_data is not None:
-        return cached_data
 
+def _compute_members_summary():
     # Get only essential statistics
     member_stats = get_members_statistics()
     membership_breakdown = get_membership_breakdown()
@@ -573,7 +565,4 @@ def get_members_summary():
         "date": timezone.now().date().isoformat(),
     }
 
-    # Cache for 5 minutes (300 seconds)
-    cache.set(cache_key, result, 300)
-
     return result
\ No newline at end of file
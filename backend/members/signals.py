@@ -0,0 +1,53 @@
+"""
+Model signal receivers for the members app.
+
+Keeps derived data (cached list counts, the member search index, the
+front-desk lookup cache) in step with member, membership and payment
+writes.
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from ptf.pagination import CountStrategy
+from memberships.models import Membership
+from payments.models import Payment
+from .lookup import member_changed
+from .models import Member
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def invalidate_member_list_counts(sender, **kwargs):
+    """Member list filters join memberships, so both models invalidate counts"""
+    CountStrategy.invalidate(Member)
+
+
+@receiver(post_save, sender=Member)
+def index_member_for_search(sender, instance, **kwargs):
+    get_search_backend().index_member(instance)
+
+
+@receiver(post_delete, sender=Member)
+def remove_member_from_search(sender, instance, **kwargs):
+    get_search_backend().remove_member(instance.id)
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def update_lookup_for_member(sender, instance, **kwargs):
+    member_changed(instance.id)
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def update_lookup_for_membership(sender, instance, **kwargs):
+    member_changed(instance.member_id)
+
+
+@receiver(post_save, sender=Payment)
+def update_lookup_for_payment(sender, instance, **kwargs):
+    member_changed(instance.membership.member_id)
@@ -1,3 +1,237 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+
+from ptf.pagination import PaginationHelper, CountStrategy
+from memberships.models import Membership, MembershipPlan
+from payments.models import Payment
+from .lookup import MemberLookupCache
+from .models import Member
+from .search import NgramSearchBackend
+
+
+class CursorPaginationTests(TestCase):
+    """Tests for keyset (cursor) pagination in PaginationHelper"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        base = timezone.now()
+        for i in range(7):
+            member = Member.objects.create(
+                first_name=f"Member{i}", last_name="Test", phone=f"07000000{i:02d}"
+            )
+            # Two members share a registration_date to exercise the id tiebreak
+            Member.objects.filter(id=member.id).update(
+                registration_date=base - timedelta(minutes=i // 2)
+            )
+
+    def _page(self, **params):
+        request = self.factory.get("/all/", params)
+        return PaginationHelper.paginate_queryset_cursor(
+            request, Member.objects.all(), ("registration_date", "id"), 3
+        )
+
+    def test_cursor_walks_all_rows_once_in_order(self):
+        """Following next_cursor visits every member exactly once, newest first"""
+        seen = []
+        page = self._page(pagination="cursor")
+        self.assertFalse(page["has_previous"])
+        while True:
+            seen.extend(member.id for member in page["objects"])
+            if not page["has_next"]:
+                break
+            page = self._page(cursor=page["next_cursor"])
+
+        expected = list(
+            Member.objects.order_by("-registration_date", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_walks_back_to_the_first_page(self):
+        """previous_cursor returns the same pages as the forward walk, in reverse"""
+        pages = [self._page(pagination="cursor")]
+        while pages[-1]["has_next"]:
+            pages.append(self._page(cursor=pages[-1]["next_cursor"]))
+        self.assertIsNone(pages[0]["previous_cursor"])
+
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self._page(cursor=page["previous_cursor"])
+            self.assertEqual([m.id for m in page["objects"]], [m.id for m in expected["objects"]])
+            self.assertEqual(page["next_cursor"], expected["next_cursor"])
+        self.assertFalse(page["has_previous"])
+        self.assertIsNone(page["previous_cursor"])
+
+    def test_invalid_cursor_returns_first_page(self):
+        """A malformed token falls back to the first page"""
+        page = self._page(cursor="not-a-cursor")
+        first = self._page(pagination="cursor")
+        self.assertEqual(
+            [m.id for m in page["objects"]], [m.id for m in first["objects"]]
+        )
+
+    def test_cursor_response_keeps_envelope(self):
+        """Cursor mode returns data/results/pagination without a COUNT"""
+        request = self.factory.get("/all/", {"pagination": "cursor", "limit": 2})
+        with self.assertNumQueries(1):
+            response = PaginationHelper.create_paginated_response(
+                request,
+                Member.objects.all(),
+                lambda m: {"id": m.id},
+                cursor_ordering=("registration_date", "id"),
+            )
+        self.assertEqual(len(response.data["data"]), 2)
+        self.assertEqual(response.data["data"], response.data["results"])
+        self.assertEqual(response.data["pagination"]["mode"], "cursor")
+        self.assertIsNotNone(response.data["pagination"]["next_cursor"])
+
+
+class CountStrategyTests(TestCase):
+    """Tests for the paginated count strategies"""
+
+    def setUp(self):
+        cache.clear()
+        for i in range(3):
+            Member.objects.create(first_name=f"Count{i}", last_name="Test")
+
+    def test_cached_count_reuses_value_until_member_write(self):
+        """Cached counts skip COUNT(*) until a member write invalidates them"""
+        queryset = Member.objects.filter(status="active")
+        self.assertEqual(CountStrategy.count(queryset, CountStrategy.CACHED), (3, "cached"))
+
+        with self.assertNumQueries(0):
+            CountStrategy.count(queryset, CountStrategy.CACHED)
+
+        Member.objects.create(first_name="Count3", last_name="Test")
+        self.assertEqual(CountStrategy.count(queryset, CountStrategy.CACHED), (4, "cached"))
+
+    def test_estimated_falls_back_off_postgresql(self):
+        """Without a planner estimate the strategy reports what produced the count"""
+        total, strategy = CountStrategy.count(Member.objects.all(), CountStrategy.ESTIMATED)
+        self.assertEqual(total, 3)
+        self.assertIn(strategy, (CountStrategy.CACHED, CountStrategy.EXACT))
+
+    def test_response_reports_count_strategy(self):
+        """Paginated responses report which strategy produced the count"""
+        request = RequestFactory().get("/all/", {"count": "cached"})
+        response = PaginationHelper.create_paginated_response(
+            request, Member.objects.all(), lambda m: {"id": m.id}
+        )
+        self.assertEqual(response.data["pagination"]["count_strategy"], "cached")
+        self.assertEqual(response.data["count"], 3)
+
+
+class NgramSearchTests(TestCase):
+    """Tests for the in-process member search index"""
+
+    def setUp(self):
+        self.backend = NgramSearchBackend()
+        self.john = Member.objects.create(first_name="John", last_name="Kamau", phone="0712345678")
+        self.joan = Member.objects.create(first_name="Joan", last_name="Wanjiru", phone="0722000111")
+        self.backend.ensure_built()
+
+    def test_prefix_substring_and_typo_matches(self):
+        """Prefixes rank first; substrings and typos still match"""
+        self.assertCountEqual(self.backend.search("jo"), [self.joan.id, self.john.id])
+        self.assertEqual(self.backend.search("john")[0], self.john.id)
+        self.assertEqual(self.backend.search("345"), [self.john.id])
+        self.assertEqual(self.backend.search("wanjriu"), [self.joan.id])
+        self.assertEqual(self.backend.search("john kam"), [self.john.id])
+
+    def test_queries_shorter_than_a_trigram_match_infixes(self):
+        """One- and two-character infixes fall back to a vocabulary scan"""
+        self.assertEqual(self.backend.search("am"), [self.john.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            njoki = Member.objects.create(first_name="Njoki", last_name="Mwangi")
+        results = self.backend.search("jo")
+        self.assertCountEqual(results[:2], [self.joan.id, self.john.id])
+        self.assertEqual(results[2:], [njoki.id])
+        self.assertEqual(
+            list(Member.objects.filter(self.backend.filter_q("iru")).values_list("id", flat=True)),
+            [self.joan.id],
+        )
+
+    def test_index_follows_member_writes(self):
+        """Saves and deletes reach a built index through the signals"""
+        with patch("members.signals.get_search_backend", return_value=self.backend):
+            self.john.last_name = "Otieno"
+            self.john.save()
+            self.assertEqual(self.backend.search("otieno"), [self.john.id])
+            self.assertEqual(self.backend.search("kamau"), [])
+
+            self.joan.status = "inactive"
+            self.joan.save()
+            self.assertEqual(self.backend.search("joan"), [])
+            self.assertEqual(self.backend.search("joan", active_only=False), [self.joan.id])
+
+            john_id = self.john.id
+            self.john.delete()
+            self.assertNotIn(john_id, self.backend.search("jo", active_only=False))
+
+    def test_writes_from_other_workers_reach_the_index(self):
+        """Another worker's write is replayed from the shared change feed"""
+        with self.captureOnCommitCallbacks(execute=True):
+            # Saved in "another worker": this backend gets no signal
+            self.john.last_name = "Otieno"
+            self.john.save()
+        self.assertEqual(self.backend.search("otieno"), [self.john.id])
+        self.assertEqual(self.backend.search("kamau"), [])
+
+
+class LookupCacheTests(TestCase):
+    """Tests for the in-memory front-desk lookup cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.lookup = MemberLookupCache()
+        self.plan = MembershipPlan.objects.create(
+            plan_name="Indoor Monthly", plan_code="IN-M", membership_type="indoor",
+            plan_type="monthly", sessions_per_week=3,
+        )
+        self.member = Member.objects.create(first_name="Grace", last_name="Achieng", phone="0733111222")
+
+    def test_search_answers_from_memory_after_warm(self):
+        """Once warm, searches run no queries"""
+        self.lookup.warm()
+        with self.assertNumQueries(0):
+            results = self.lookup.search("gra")
+        self.assertEqual([entry.id for entry in results], [self.member.id])
+        self.assertEqual(results[0].payment_status, "unknown")
+
+    def test_short_infixes_match_and_sync_state_is_reported(self):
+        """Two-character infixes match like the members list; sync says where data came from"""
+        self.assertEqual(self.lookup.sync(), "warmed")
+        self.assertEqual(self.lookup.sync(), "current")
+        with self.assertNumQueries(0):
+            self.assertEqual([entry.id for entry in self.lookup.match("ch")], [self.member.id])
+        other = MemberLookupCache()
+        other.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.last_name = "Achieng-Otieno"
+            self.member.save()
+        self.assertEqual(other.sync(), "replayed")
+
+    def test_writes_from_other_processes_are_replayed(self):
+        """Membership and payment writes reach a warm cache through the change counter"""
+        self.lookup.warm()
+        with self.captureOnCommitCallbacks(execute=True):
+            membership = Membership.objects.create(
+                member=self.member, plan=self.plan, total_sessions_allowed=12,
+                start_date=timezone.now().date(), end_date=timezone.now().date() + timedelta(days=30),
+                amount_paid=3000,
+            )
+        entry = self.lookup.search("grace")[0]
+        self.assertEqual((entry.membership_type, entry.payment_status), ("indoor", "pending"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Membership.objects.filter(id=membership.id).update(payment_status="paid")
+            Payment.objects.create(membership=membership, amount=3000, status="completed")
+        self.assertEqual(self.lookup.search("grace")[0].payment_status, "paid")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.status = "inactive"
+            self.member.save()
+        self.assertEqual(self.lookup.search("grace"), [])
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from .views_registration import register_member
-from .views_checkin import checkin, get_member_detail, search_members_optimized
+from .views_checkin import checkin, checkin_batch, get_member_detail, search_members_optimized
 from .views_list import list_all_members, list_indoor_members, list_outdoor_members, MembersSummaryView
 from rest_framework.routers import DefaultRouter
 
@@ -16,6 +16,7 @@ urlpatterns = [
     path("members/<int:member_id>/", get_member_detail, name="member-detail"),  # Fixes 404 error
     path("search/", search_members_optimized, name="members-search"),          # Fast search
     path("member/checkin/<int:member_id>/", checkin, name="checkin-member"),   # Match production endpoint
+    path("member/checkin/batch/", checkin_batch, name="checkin-batch"),        # Offline kiosk sync
 
     # Existing list endpoints (hybrid functionality) - Consider deprecating /all/
     path("all/", list_all_members, name="list-all-members"),
@@ -7,10 +7,13 @@ from rest_framework.authentication import SessionAuthentication
 from django.db.models import Q, Prefetch
 from .models import Member
 from memberships.models import Membership
-from ptf.pagination import PaginationHelper, SearchPaginationHelper
+from ptf.pagination import PaginationHelper, SearchPaginationHelper, CountStrategy
 from .services import get_members_summary
 from django.core.cache import cache
 
+# Stable ordering for opt-in keyset pagination (?pagination=cursor)
+MEMBER_CURSOR_ORDERING = ('registration_date', 'id')
+
 
 class MembersSummaryView(APIView):
     """
@@ -335,7 +338,9 @@ def list_all_members(request):
             search_fields=search_fields,
             data_serializer_func=serialize_member_data_optimized,
             success_message=None,  # Will auto-generate
-            default_page_size=20
+            default_page_size=20,
+            cursor_ordering=MEMBER_CURSOR_ORDERING,
+            default_count_strategy=CountStrategy.CACHED,
         )
 
         # Add summary stats to the paginated response for dashboard-style UI
@@ -403,7 +408,9 @@ def list_indoor_members(request):
             search_fields=search_fields,
             data_serializer_func=serialize_indoor_member_data,
             success_message="Retrieved indoor members successfully",
-            default_page_size=20
+            default_page_size=20,
+            cursor_ordering=MEMBER_CURSOR_ORDERING,
+            default_count_strategy=CountStrategy.CACHED,
         )
         
         # Add backward compatibility field
@@ -463,7 +470,9 @@ def list_outdoor_members(request):
             search_fields=search_fields,
             data_serializer_func=serialize_outdoor_member_data,
             success_message="Retrieved outdoor members successfully",
-            default_page_size=20
+            default_page_size=20,
+            cursor_ordering=MEMBER_CURSOR_ORDERING,
+            default_count_strategy=CountStrategy.CACHED,
         )
         
         # Add backward compatibility field
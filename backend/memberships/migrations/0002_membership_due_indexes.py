@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("memberships", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="membership",
+            index=models.Index(
+                fields=["payment_status", "end_date"], name="membership_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="membership",
+            index=models.Index(fields=["end_date"], name="membership_end_date_idx"),
+        ),
+    ]
@@ -128,6 +128,11 @@ class Membership(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Payments due (by payment status) and renewals due (by end date)
+            models.Index(fields=['payment_status', 'end_date'], name='membership_due_idx'),
+            models.Index(fields=['end_date'], name='membership_end_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.member.first_name} {self.member.last_name} - {self.plan.plan_name}"
@@ -1,4 +1,3 @@
-from django.db import transaction
 from .models import MembershipPlan, Membership
 from members.models import PhysicalProfile
 
@@ -98,70 +97,17 @@ class MembershipService:
     @staticmethod
     def use_session(membership, session_type="regular", notes=""):
         """Use one session from membership with validation"""
-        # Check payment status first
-        if membership.payment_status == 'pending':
-            return False, "Cannot check-in: Payment is still pending. Please complete payment first."
+        from attendance.checkin import CheckInService, CheckInError
 
-        if membership.payment_status == 'overdue':
-            return False, "Cannot check-in: Payment is overdue. Please update payment to continue."
-
-        # Check membership status
-        if membership.status != 'active':
-            return False, f"Cannot check-in: Membership is {membership.status}."
-
-        # Check sessions remaining
-        if membership.sessions_used >= membership.total_sessions_allowed:
-            return False, "No sessions remaining on this membership."
-
-        # Check if membership is expired
-        if membership.is_expired:
-            return False, "Membership has expired. Please renew to continue."
-
-        # All validations passed - proceed with session usage
-        with transaction.atomic():
-            membership.sessions_used += 1
-            membership.save()
-
-            # Create session log entry
-            from .models import SessionLog
-            SessionLog.objects.create(
-                membership=membership,
-                session_type=session_type,
-                notes=notes
+        try:
+            result = CheckInService.check_in(
+                membership_id=membership.id, session_type=session_type, notes=notes
             )
+        except CheckInError as e:
+            return False, str(e)
 
-            # Create attendance log entry for the attendance page
-            from attendance.models import AttendanceLog, Attendance
-            from django.utils import timezone
-
-            # Get member's registration location
-            member_location = None
-            if membership.location:
-                member_location = membership.location.name
-
-            attendance_log = AttendanceLog.objects.create(
-                member=membership.member,
-                visit_type=membership.plan.membership_type,  # 'indoor' or 'outdoor'
-                check_in_time=timezone.now(),
-                status='checked_in',
-                activities=[member_location] if member_location else [],
-                notes=notes
-            )
-
-            # Update daily attendance record
-            daily_attendance = Attendance.get_or_create_today(membership.member)
-            daily_attendance.update_visit_count(membership.plan.membership_type)
-            daily_attendance.set_active_status(True)
-
-            # Update member's last visit
-            membership.member.last_visit = timezone.now()
-            membership.member.total_visits += 1
-            membership.member.save()
-
-        # Clear related cache entries
-        MembershipService.clear_stats_cache(membership.plan.membership_type)
-
-        return True, f"Check-in successful! {membership.sessions_remaining} sessions remaining."
+        membership.sessions_used = result["membership"].sessions_used
+        return True, f"Check-in successful! {result['sessions_remaining']} sessions remaining."
 
     @staticmethod
     def search_memberships(search_query=None, membership_type=None, status_filter=None, location_filter=None):
@@ -197,18 +143,22 @@ class MembershipService:
     @staticmethod
     def get_membership_statistics(membership_type=None, location_filter=None):
         """Get membership statistics with caching and location filtering"""
+        from ptf.caching import get_or_compute, ttl
+
+        # Cache key based on membership type and location; served stale
+        # while one worker refreshes it
+        return get_or_compute(
+            f"membership_stats_{membership_type or 'all'}_{location_filter or 'all'}",
+            lambda: MembershipService._compute_membership_statistics(membership_type, location_filter),
+            soft_ttl=ttl('memberships'),
+        )
+
+    @staticmethod
+    def _compute_membership_statistics(membership_type, location_filter):
         from django.db.models import Count, Sum, Q
         from django.utils import timezone
-        from django.core.cache import cache
         from datetime import timedelta
 
-        # Create cache key based on membership type and location
-        cache_key = f"membership_stats_{membership_type or 'all'}_{location_filter or 'all'}"
-        cached_data = cache.get(cache_key)
-
-        if cached_data is not None:
-            return cached_data
-
         # Base queryset with optimized select_related
         memberships = Membership.objects.select_related('plan', 'location')
 
@@ -257,15 +207,12 @@ class MembershipService:
             'sessions_used_today': sessions_used_today
         }
 
-        # Cache for 5 minutes (300 seconds)
-        cache.set(cache_key, result, 300)
-
         return result
 
     @staticmethod
     def clear_stats_cache(membership_type=None):
         """Clear membership statistics cache"""
-        from django.core.cache import cache
+        from ptf.caching import invalidate
 
         # Clear specific cache entries
         cache_keys = [
@@ -281,8 +228,7 @@ class MembershipService:
             for location_code in location_codes:
                 cache_keys.append(f"membership_stats_{membership_type}_{location_code}")
 
-        for key in cache_keys:
-            cache.delete(key)
+        invalidate(*cache_keys)
 
     @staticmethod
     def suspend_membership(membership, reason=""):
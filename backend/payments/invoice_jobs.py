@@ -0,0 +1,144 @@
+"""
+Bulk invoice jobs
+
+POST invoice/bulk/ queues an InvoiceJob and returns straight away;
+`manage.py process_invoice_jobs` claims queued jobs and works through
+the members' current (latest) memberships - one invoice per member - in
+batches of INVOICE_BATCH_SIZE:
+
+- one query per batch for the memberships (with member and plan) and one
+  for their latest payments
+- one mail connection for the whole job
+- progress saved after every batch, so invoice/bulk/<job_id>/ can report
+  it and a restarted job resumes after the last finished batch. Only
+  counters and the first MAX_JOB_ERRORS errors are kept, so each save
+  writes a row of the same small size however large the job
+
+Claiming is a guarded UPDATE (queued -> running), so any number of workers
+can poll the table without a broker or row locks. A running job whose
+heartbeat (updated_at) is older than STALE_AFTER has lost its worker and
+is queued again.
+"""
+
+import logging
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db.models import DateTimeField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from memberships.models import Membership
+from .invoice_service import InvoiceService
+from .models import InvoiceJob
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = timedelta(minutes=10)
+
+# Failures kept with their member and message; later ones are only counted
+MAX_JOB_ERRORS = 100
+
+PROGRESS_FIELDS = ['total', 'processed', 'succeeded', 'failed', 'emailed', 'cursor', 'errors', 'updated_at']
+
+
+class InvoiceJobService:
+
+    @staticmethod
+    def memberships(member_ids):
+        """Each member's current (latest) membership - what a job invoices"""
+        latest = Membership.objects.filter(member_id=OuterRef('member_id')).order_by('-created_at', '-id')
+        return Membership.objects.filter(member_id__in=member_ids, id=Subquery(latest.values('id')[:1]))
+
+    @staticmethod
+    def enqueue(member_ids, send_email=True, message=''):
+        """Queue a bulk invoice run for the given member ids"""
+        member_ids = list(dict.fromkeys(member_ids))
+        return InvoiceJob.objects.create(
+            member_ids=member_ids,
+            send_email=send_email,
+            message=message,
+            total=InvoiceJobService.memberships(member_ids).count(),
+        )
+
+    @staticmethod
+    def claim(worker=''):
+        """Mark the oldest queued job running and return it, or None if there is none"""
+        while True:
+            job_id = InvoiceJob.objects.filter(status='queued').order_by('created_at', 'id').values_list(
+                'id', flat=True
+            ).first()
+            if job_id is None:
+                return None
+            now = timezone.now()
+            claimed = InvoiceJob.objects.filter(pk=job_id, status='queued').update(
+                status='running',
+                worker=worker,
+                started_at=Coalesce('started_at', Value(now, output_field=DateTimeField())),
+                updated_at=now,
+            )
+            if claimed:
+                return InvoiceJob.objects.get(pk=job_id)
+            # Another worker claimed it first
+
+    @staticmethod
+    def requeue_stale():
+        """Queue running jobs whose worker stopped reporting progress again"""
+        return InvoiceJob.objects.filter(
+            status='running', updated_at__lt=timezone.now() - STALE_AFTER
+        ).update(status='queued', worker='')
+
+    @staticmethod
+    def run(job, batch_size=None):
+        """Work through a claimed job, saving progress after every batch"""
+        batch_size = batch_size or settings.INVOICE_BATCH_SIZE
+        memberships = InvoiceJobService.memberships(job.member_ids).select_related('member', 'plan').order_by('id')
+
+        try:
+            with get_connection() if job.send_email else nullcontext() as connection:
+                while True:
+                    batch = list(memberships.filter(id__gt=job.cursor)[:batch_size])
+                    if not batch:
+                        break
+                    result = InvoiceService.invoice_batch(batch, job.send_email, connection)
+                    job.cursor = batch[-1].id
+                    job.processed += len(batch)
+                    job.succeeded += len(result['details'])
+                    job.failed += len(result['errors'])
+                    job.emailed += sum(detail['status'] == 'sent' for detail in result['details'])
+                    job.errors += result['errors'][:max(MAX_JOB_ERRORS - len(job.errors), 0)]
+                    job.save(update_fields=PROGRESS_FIELDS)
+
+            job.status = 'completed'
+        except Exception as e:
+            logger.exception(f"Invoice job {job.job_id} failed")
+            job.status = 'failed'
+            job.error = str(e)
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        return job
+
+    @staticmethod
+    def status(job):
+        """Progress of a job, as returned by invoice/bulk/<job_id>/"""
+        return {
+            'job_id': str(job.job_id),
+            'status': job.status,
+            'total': job.total,
+            'processed': job.processed,
+            'progress': round(job.processed / job.total * 100, 1) if job.total else 100.0,
+            'summary': {
+                'total_attempted': job.total,
+                'successful': job.succeeded,
+                'failed': job.failed,
+                'emailed': job.emailed,
+            },
+            'errors': job.errors,
+            'error': job.error,
+            'created_at': job.created_at.isoformat(),
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        }
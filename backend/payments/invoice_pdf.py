@@ -0,0 +1,222 @@
+"""
+Invoice PDFs and ZIP exports without native dependencies
+
+The invoice is one A4 page with a fixed layout in Helvetica and
+Helvetica-Bold, two of the standard fonts every PDF reader has built in,
+so nothing is embedded: InvoicePDF draws the page with a few text and
+rectangle operators and writes the seven objects of the document itself.
+Text is measured with the fonts' standard widths to right-align and
+centre it. Documents are produced as a generator of byte chunks, so they
+can be streamed.
+
+iter_zip() streams a ZIP archive of such documents one entry at a time;
+zipfile writes to a non-seekable sink with data descriptors, so nothing
+but the current entry is held in memory.
+"""
+
+import zipfile
+import zlib
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 50
+RIGHT = PAGE_WIDTH - MARGIN
+
+# Standard widths (1/1000 em) of ASCII 32-126
+_WIDTHS = {
+    'F1': [  # Helvetica
+        278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+        1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+        333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+        556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+    ],
+    'F2': [  # Helvetica-Bold
+        278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+        556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+        975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+        667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+        333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+        611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+    ],
+}
+_DEFAULT_WIDTH = 556
+
+BLUE = (0.145, 0.388, 0.922)
+DARK = (0.122, 0.161, 0.216)
+GREY = (0.42, 0.447, 0.502)
+RULE = (0.898, 0.898, 0.898)
+BAND = (0.973, 0.976, 0.98)
+
+
+def text_width(text, font, size):
+    widths = _WIDTHS[font]
+    return sum(
+        widths[ord(char) - 32] if 32 <= ord(char) <= 126 else _DEFAULT_WIDTH for char in text
+    ) * size / 1000
+
+
+def _fit(text, font, size, width):
+    """text, shortened with an ellipsis until it fits width"""
+    if text_width(text, font, size) <= width:
+        return text
+    while text and text_width(text + '...', font, size) > width:
+        text = text[:-1]
+    return text + '...'
+
+
+def _literal(text):
+    """A PDF string literal in WinAnsiEncoding"""
+    encoded = text.encode('cp1252', errors='replace')
+    return b'(' + encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _colour(rgb, operator):
+    return b'%.3f %.3f %.3f %s' % (*rgb, operator)
+
+
+class _Page:
+    """Content stream of one page"""
+
+    def __init__(self):
+        self.ops = []
+
+    def text(self, x, y, text, size=10, font='F1', colour=DARK, align='left'):
+        text = str(text)
+        if align == 'right':
+            x -= text_width(text, font, size)
+        elif align == 'center':
+            x -= text_width(text, font, size) / 2
+        self.ops.append(
+            _colour(colour, b'rg') + b' BT /%s %d Tf %.2f %.2f Td ' % (font.encode(), size, x, y)
+            + _literal(text) + b' Tj ET'
+        )
+
+    def rule(self, y, colour=RULE, width=1):
+        self.ops.append(
+            _colour(colour, b'RG') + b' %.2f w %d %.2f m %d %.2f l S' % (width, MARGIN, y, RIGHT, y)
+        )
+
+    def band(self, y, height, colour=BAND):
+        self.ops.append(_colour(colour, b'rg') + b' %d %.2f %d %.2f re f' % (MARGIN, y, RIGHT - MARGIN, height))
+
+    def content(self):
+        return b'\n'.join(self.ops)
+
+
+class InvoicePDF:
+
+    @staticmethod
+    def draw(invoice_data):
+        """The invoice page's content stream (the layout of payments/invoice.html)"""
+        gym, member = invoice_data['gym_info'], invoice_data['member']
+        membership, payment = invoice_data['membership'], invoice_data['payment']
+        amount = f"{payment['currency']} {payment['amount_due']:,.2f}"
+        page = _Page()
+
+        page.text(MARGIN, 770, gym['name'], size=20, font='F2', colour=BLUE)
+        page.text(RIGHT, 772, 'INVOICE', size=18, font='F2', align='right')
+        page.text(RIGHT, 752, f"Invoice #: {invoice_data['invoice_number']}", align='right')
+        page.text(RIGHT, 738, f"Date: {invoice_data['issue_date']}", align='right')
+        page.text(RIGHT, 724, f"Due Date: {invoice_data['due_date']}", align='right')
+        page.rule(708, width=2)
+
+        page.text(MARGIN, 680, 'Bill To:', size=12, font='F2')
+        page.text(MARGIN, 662, f"{member['first_name']} {member['last_name']}", size=11, font='F2')
+        page.text(MARGIN, 647, f"Member ID: {member['id']}")
+        page.text(MARGIN, 633, f"Email: {member['email'] or ''}")
+        page.text(MARGIN, 619, f"Phone: {member['phone'] or ''}")
+
+        page.band(570, 24)
+        for x, heading in ((MARGIN + 8, 'Description'), (300, 'Type'), (370, 'Period')):
+            page.text(x, 578, heading, font='F2')
+        page.text(RIGHT - 8, 578, 'Amount', font='F2', align='right')
+        page.rule(570)
+        page.text(MARGIN + 8, 550, _fit(f"Membership Fee - {membership['plan_type']}", 'F1', 10, 235))
+        page.text(300, 550, membership['membership_type'])
+        page.text(370, 550, f"From {membership['start_date']}")
+        page.text(RIGHT - 8, 550, amount, align='right')
+        page.rule(538)
+
+        page.text(RIGHT, 505, f"Total Amount Due: {amount}", size=14, font='F2', align='right')
+        page.text(RIGHT, 487, f"Status: {payment['status'].title()}", align='right')
+
+        centre = PAGE_WIDTH / 2
+        page.rule(130)
+        page.text(centre, 110, gym['name'], font='F2', colour=GREY, align='center')
+        page.text(centre, 96, gym['address'], colour=GREY, align='center')
+        page.text(centre, 82, f"Phone: {gym['phone']} | Email: {gym['email']}", colour=GREY, align='center')
+        page.text(centre, 62, f"Thank you for choosing {gym['name']}!", size=8, colour=GREY, align='center')
+        return page.content()
+
+    @staticmethod
+    def iter_pdf(invoice_data):
+        """The invoice as a PDF document, in chunks of bytes"""
+        stream = zlib.compress(InvoicePDF.draw(invoice_data))
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT),
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+            b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream',
+            b'<< /Title ' + _literal(f"Invoice {invoice_data['invoice_number']}") + b' >>',
+        ]
+
+        header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        yield header
+        offset, offsets = len(header), []
+        for number, body in enumerate(objects, 1):
+            chunk = b'%d 0 obj\n' % number + body + b'\nendobj\n'
+            offsets.append(offset)
+            offset += len(chunk)
+            yield chunk
+
+        yield (
+            b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+            + b''.join(b'%010d 00000 n \n' % position for position in offsets)
+            + b'trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (len(objects) + 1, len(objects), offset)
+        )
+
+    @staticmethod
+    def render(invoice_data):
+        """The invoice as PDF bytes"""
+        return b''.join(InvoicePDF.iter_pdf(invoice_data))
+
+
+class _Sink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def iter_zip(entries):
+    """
+    Stream a ZIP archive
+
+    Args:
+        entries: Iterable of (name, date_time tuple, bytes), consumed lazily
+
+    Yields:
+        Chunks of the archive, after every entry and for the central directory
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, date_time, data in entries:
+            archive.writestr(zipfile.ZipInfo(name, date_time), data, compress_type=zipfile.ZIP_DEFLATED)
+            yield from sink.drain()
+    yield from sink.drain()
@@ -1,25 +1,36 @@
+import hashlib
 import uuid
-from datetime import date, timedelta
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import get_template
 from django.conf import settings
+from django.db.models import OuterRef, Subquery
 from django.utils import timezone
+from ptf.caching import ttl
 from .models import Payment
 from memberships.models import Membership
 
+INVOICE_TEMPLATE = 'payments/invoice.html'
+
+# Part of every render cache key; bump when the template or the invoice data change
+INVOICE_RENDER_VERSION = 1
+
 
 class InvoiceService:
     """Service for generating and managing invoices"""
 
     @staticmethod
-    def generate_invoice_data(membership):
-        """Generate invoice data for a membership"""
+    def generate_invoice_data(membership, payment=None):
+        """Generate invoice data for a membership (payment: its latest, if already fetched)"""
         try:
             # Calculate due date (30 days from membership start)
             due_date = membership.created_at.date() + timedelta(days=30)
 
             # Get latest payment or create pending one
-            payment = Payment.objects.filter(membership=membership).first()
+            if payment is None:
+                payment = Payment.objects.filter(membership=membership).first()
             if not payment:
                 # Create a pending payment if none exists
                 payment = Payment.objects.create(
@@ -66,95 +77,91 @@ class InvoiceService:
 
     @staticmethod
     def generate_invoice_html(invoice_data):
-        """Generate HTML invoice template"""
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="utf-8">
-            <title>Invoice {invoice_data['invoice_number']}</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
-                .invoice-container {{ max-width: 800px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                .header {{ display: flex; justify-content: space-between; align-items: center; margin-bottom: 30px; border-bottom: 2px solid #e5e5e5; padding-bottom: 20px; }}
-                .logo {{ font-size: 24px; font-weight: bold; color: #2563eb; }}
-                .invoice-info {{ text-align: right; }}
-                .member-info {{ margin-bottom: 30px; }}
-                .details-table {{ width: 100%; border-collapse: collapse; margin-bottom: 30px; }}
-                .details-table th, .details-table td {{ padding: 12px; text-align: left; border-bottom: 1px solid #e5e5e5; }}
-                .details-table th {{ background-color: #f8f9fa; font-weight: 600; }}
-                .total-section {{ text-align: right; margin-top: 20px; }}
-                .total {{ font-size: 18px; font-weight: bold; color: #1f2937; }}
-                .footer {{ margin-top: 40px; padding-top: 20px; border-top: 1px solid #e5e5e5; text-align: center; color: #6b7280; }}
-                .status-badge {{ padding: 4px 12px; border-radius: 20px; font-size: 12px; font-weight: 600; }}
-                .status-pending {{ background-color: #fef3c7; color: #d97706; }}
-                .status-paid {{ background-color: #dcfce7; color: #16a34a; }}
-            </style>
-        </head>
-        <body>
-            <div class="invoice-container">
-                <div class="header">
-                    <div class="logo">{invoice_data['gym_info']['name']}</div>
-                    <div class="invoice-info">
-                        <h2>INVOICE</h2>
-                        <p><strong>Invoice #:</strong> {invoice_data['invoice_number']}</p>
-                        <p><strong>Date:</strong> {invoice_data['issue_date']}</p>
-                        <p><strong>Due Date:</strong> {invoice_data['due_date']}</p>
-                    </div>
-                </div>
-
-                <div class="member-info">
-                    <h3>Bill To:</h3>
-                    <p><strong>{invoice_data['member']['first_name']} {invoice_data['member']['last_name']}</strong></p>
-                    <p>Member ID: {invoice_data['member']['id']}</p>
-                    <p>Email: {invoice_data['member']['email']}</p>
-                    <p>Phone: {invoice_data['member']['phone']}</p>
-                </div>
-
-                <table class="details-table">
-                    <thead>
-                        <tr>
-                            <th>Description</th>
-                            <th>Type</th>
-                            <th>Period</th>
-                            <th>Amount</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        <tr>
-                            <td>Membership Fee - {invoice_data['membership']['plan_type']}</td>
-                            <td><span class="status-badge status-pending">{invoice_data['membership']['membership_type']}</span></td>
-                            <td>From {invoice_data['membership']['start_date']}</td>
-                            <td>{invoice_data['payment']['currency']} {invoice_data['payment']['amount_due']:,.2f}</td>
-                        </tr>
-                    </tbody>
-                </table>
-
-                <div class="total-section">
-                    <p class="total">Total Amount Due: {invoice_data['payment']['currency']} {invoice_data['payment']['amount_due']:,.2f}</p>
-                    <p>Status: <span class="status-badge status-{invoice_data['payment']['status']}">{invoice_data['payment']['status'].title()}</span></p>
-                </div>
-
-                <div class="footer">
-                    <p><strong>{invoice_data['gym_info']['name']}</strong></p>
-                    <p>{invoice_data['gym_info']['address']}</p>
-                    <p>Phone: {invoice_data['gym_info']['phone']} | Email: {invoice_data['gym_info']['email']}</p>
-                    <p style="margin-top: 15px; font-size: 12px;">Thank you for choosing {invoice_data['gym_info']['name']}!</p>
-                </div>
-            </div>
-        </body>
-        </html>
         """
-        return html_content
+        Render the invoice HTML
+
+        payments/invoice.html is compiled once per process by the template
+        loader; its stylesheet and page chrome are static text, so a render
+        only fills in (and escapes) the invoice's fields.
+        """
+        return get_template(INVOICE_TEMPLATE).render({
+            'invoice': invoice_data,
+            'amount_due': f"{invoice_data['payment']['amount_due']:,.2f}",
+        })
+
+    @staticmethod
+    def invoice_memberships():
+        """
+        Memberships with everything an invoice's cache key depends on:
+        member, plan and the latest payment's id, status and updated_at
+        """
+        latest = Payment.objects.filter(membership=OuterRef('pk')).order_by('-created_at', '-id')
+        return Membership.objects.select_related('member', 'plan').annotate(
+            latest_payment_id=Subquery(latest.values('id')[:1]),
+            latest_payment_status=Subquery(latest.values('status')[:1]),
+            latest_payment_updated_at=Subquery(latest.values('updated_at')[:1]),
+        )
+
+    @staticmethod
+    def invoice_etag(membership):
+        """
+        Content address of a membership's invoice (a membership from
+        invoice_memberships): a digest of every input that can change it
+        """
+        parts = (
+            INVOICE_RENDER_VERSION,
+            membership.pk,
+            membership.updated_at,
+            membership.member.updated_at,
+            membership.plan.updated_at,
+            membership.latest_payment_id,
+            membership.latest_payment_status,
+            membership.latest_payment_updated_at,
+            # The invoice number and issue date carry the day
+            timezone.now().date(),
+        )
+        return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+    @staticmethod
+    def get_invoice(membership):
+        """
+        Invoice data and HTML for a membership from invoice_memberships,
+        served from the render cache when its content address is cached
+
+        Returns:
+            (invoice_data, invoice_html, etag)
+        """
+        etag = InvoiceService.invoice_etag(membership)
+        key = f"invoice_render_{etag}"
+        cached = cache.get(key)
+        if cached is not None:
+            return (*cached, etag)
+
+        invoice_data = InvoiceService.generate_invoice_data(membership)
+        invoice_html = InvoiceService.generate_invoice_html(invoice_data)
+        # Without a payment, generating the invoice just created one, so
+        # the next request has a different address anyway
+        if membership.latest_payment_id is not None:
+            cache.set(key, (invoice_data, invoice_html), ttl('invoices', 86400))
+        return invoice_data, invoice_html, etag
 
     @staticmethod
     def send_invoice_email(member_email, invoice_data, invoice_html):
         """Send invoice via email"""
         try:
-            subject = f"Invoice {invoice_data['invoice_number']} - {invoice_data['gym_info']['name']}"
+            InvoiceService.build_invoice_email(member_email, invoice_data, invoice_html).send()
+            return True
+
+        except Exception as e:
+            raise Exception(f"Failed to send invoice email: {str(e)}")
 
-            # Plain text version
-            message = f"""
+    @staticmethod
+    def build_invoice_email(member_email, invoice_data, invoice_html, connection=None):
+        """Invoice email message with a plain text body and the HTML invoice"""
+        subject = f"Invoice {invoice_data['invoice_number']} - {invoice_data['gym_info']['name']}"
+
+        # Plain text version
+        message = f"""
             Dear {invoice_data['member']['first_name']} {invoice_data['member']['last_name']},
 
             Please find your membership invoice details below:
@@ -176,20 +183,15 @@ class InvoiceService:
             {invoice_data['gym_info']['name']} Team
             """
 
-            # Send email with HTML content
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[member_email],
-                html_message=invoice_html,
-                fail_silently=False,
-            )
-
-            return True
-
-        except Exception as e:
-            raise Exception(f"Failed to send invoice email: {str(e)}")
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[member_email],
+            connection=connection,
+        )
+        email.attach_alternative(invoice_html, 'text/html')
+        return email
 
     @staticmethod
     def create_and_send_invoice(membership, send_email=True):
@@ -228,50 +230,84 @@ class InvoiceService:
             }
 
     @staticmethod
-    def send_bulk_invoices(member_ids, send_email=True):
-        """Send invoices to multiple members"""
-        results = {
-            'success': 0,
-            'failed': 0,
-            'errors': [],
-            'details': []
-        }
+    def latest_payments(memberships):
+        """Latest payment of each membership, keyed by membership id - one query"""
+        latest = Payment.objects.filter(membership=OuterRef('pk')).order_by('-created_at', '-id').values('id')[:1]
+        payment_ids = Membership.objects.filter(
+            pk__in=[membership.pk for membership in memberships]
+        ).annotate(latest=Subquery(latest)).values('latest')
+        return {payment.membership_id: payment for payment in Payment.objects.filter(pk__in=payment_ids)}
 
-        try:
-            memberships = Membership.objects.filter(member_id__in=member_ids)
-
-            for membership in memberships:
-                try:
-                    result = InvoiceService.create_and_send_invoice(membership, send_email)
-
-                    if result['success']:
-                        results['success'] += 1
-                        results['details'].append({
-                            'member_id': membership.member.id,
-                            'email': membership.member.email,
-                            'status': 'sent' if result['email_sent'] else 'generated',
-                            'invoice_number': result['invoice_data']['invoice_number']
-                        })
-                    else:
-                        results['failed'] += 1
-                        results['errors'].append({
-                            'member_id': membership.member.id,
-                            'error': result['error']
-                        })
-
-                except Exception as e:
-                    results['failed'] += 1
-                    results['errors'].append({
-                        'member_id': membership.member_id,
-                        'error': str(e)
-                    })
-
-            return results
+    @staticmethod
+    def invoice_batch(memberships, send_email=True, connection=None):
+        """
+        Generate, and optionally email, invoices for a batch of memberships
 
-        except Exception as e:
-            return {
-                'success': 0,
-                'failed': len(member_ids),
-                'errors': [{'general': str(e)}],
-                'details': []
-            }
\ No newline at end of file
+        The memberships should come with member and plan selected. Their
+        latest payments are fetched in one query, and every email goes out
+        over the given connection (opened once by the caller).
+
+        Returns:
+            {'details': [{member_id, email, status, invoice_number}], 'errors': [{member_id, error}]}
+        """
+        payments = InvoiceService.latest_payments(memberships)
+        details, errors, outgoing = [], [], []
+        for membership in memberships:
+            member = membership.member
+            try:
+                invoice_data = InvoiceService.generate_invoice_data(membership, payments.get(membership.pk))
+                invoice_html = InvoiceService.generate_invoice_html(invoice_data)
+            except Exception as e:
+                errors.append({'member_id': member.id, 'error': str(e)})
+                continue
+
+            detail = {
+                'member_id': member.id,
+                'email': member.email,
+                'status': 'generated',
+                'invoice_number': invoice_data['invoice_number'],
+            }
+            if send_email and member.email:
+                outgoing.append((detail, InvoiceService.build_invoice_email(
+                    member.email, invoice_data, invoice_html, connection=connection
+                )))
+            else:
+                details.append(detail)
+
+        for detail, email in outgoing:
+            # One message at a time over the shared connection: a failure is
+            # pinned on its member and nothing already sent is sent again
+            try:
+                email.send()
+            except Exception as e:
+                errors.append({'member_id': detail['member_id'], 'error': f"Failed to send invoice email: {e}"})
+            else:
+                details.append({**detail, 'status': 'sent'})
+
+        return {'details': details, 'errors': errors}
+
+    @staticmethod
+    def invoices_between(start, end, batch_size=100):
+        """
+        Invoice data for memberships created from start to end (inclusive
+        dates), generated lazily a batch at a time
+
+        Nothing is written: a membership without a payment is invoiced
+        against an unsaved pending one.
+
+        Yields:
+            (membership, invoice_data)
+        """
+        memberships = Membership.objects.filter(
+            created_at__gte=timezone.make_aware(datetime.combine(start, time.min)),
+            created_at__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+        ).select_related('member', 'plan').order_by('created_at', 'id').iterator(chunk_size=batch_size)
+
+        while True:
+            batch = list(islice(memberships, batch_size))
+            if not batch:
+                return
+            payments = InvoiceService.latest_payments(batch)
+            for membership in batch:
+                payment = payments.get(membership.pk) or Payment(membership=membership, amount=membership.amount_paid)
+                yield membership, InvoiceService.generate_invoice_data(membership, payment)
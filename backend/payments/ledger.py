@@ -0,0 +1,241 @@
+"""
+Payments ledger
+
+Every change to what a membership owes is an append-only LedgerEntry:
+
+- charge: the plan price, posted when the membership is created, and
+  the difference when the price changes
+- payment: money received when a Payment completes, and the matching
+  negative receipt if it is later failed, edited or deleted
+- adjustment: manual corrections
+
+Each entry updates the membership's MembershipBalance and the
+DailyRevenueSummary of its booking day in the same transaction, with
+F() increments, so outstanding and revenue figures are a read of a few
+precomputed rows. Entries are never edited, so the increments stay exact;
+`manage.py rebuild_ledger` posts entries missing for older rows and
+recomputes both summaries from the entries.
+
+The ledger is the authoritative record of money received: the monthly
+revenue rollups (payments.rollups) are derived from its payment entries.
+"""
+
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import DailyRevenueSummary, LedgerEntry, MembershipBalance
+from .rollups import RevenueRollupService
+
+ZERO = Decimal('0')
+
+
+def _bump(model, lookup, **deltas):
+    """Add deltas to the row matching lookup, creating it first if needed"""
+    updates = {name: F(name) + value for name, value in deltas.items()}
+    updates['updated_at'] = timezone.now()
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Created concurrently
+        model.objects.filter(**lookup).update(**updates)
+
+
+def _booked_on(payment):
+    paid_at = payment.completed_at or payment.updated_at
+    return timezone.localdate(paid_at) if paid_at else timezone.localdate()
+
+
+class LedgerService:
+
+    @staticmethod
+    def post(membership_id, entry_type, amount, payment=None, description='', booked_on=None):
+        """
+        Append an entry and apply it to the balance and daily summary
+
+        Args:
+            amount: Signed change to what the member owes
+        """
+        booked_on = booked_on or timezone.localdate()
+        balance = {'balance': amount}
+        day = {}
+        if entry_type == 'charge':
+            balance['charged'] = day['charged'] = amount
+        elif entry_type == 'payment':
+            balance['paid'] = day['received'] = -amount
+            day['payments'] = 1 if amount < 0 else -1
+        else:
+            balance['adjusted'] = day['adjusted'] = amount
+
+        with transaction.atomic():
+            entry = LedgerEntry.objects.create(
+                membership_id=membership_id,
+                entry_type=entry_type,
+                amount=amount,
+                payment=payment,
+                description=description,
+                booked_on=booked_on,
+            )
+            _bump(MembershipBalance, {'membership_id': membership_id}, **balance)
+            _bump(DailyRevenueSummary, {'date': booked_on}, **day)
+            if entry_type == 'payment':
+                RevenueRollupService.schedule({booked_on.replace(day=1)})
+        return entry
+
+    @staticmethod
+    def sync_charges(membership):
+        """
+        Post a charge for whatever the membership's charges lack of its price
+
+        The first call charges the plan price; after a price change it
+        charges (or credits) the difference. Safe to call repeatedly.
+        """
+        with transaction.atomic():
+            _bump(MembershipBalance, {'membership_id': membership.pk})
+            posted = LedgerEntry.objects.filter(membership_id=membership.pk, entry_type='charge').aggregate(
+                total=Sum('amount')
+            )['total']
+            difference = membership.amount_paid - (posted or ZERO)
+            if not difference:
+                return None
+            return LedgerService.post(
+                membership.pk,
+                'charge',
+                difference,
+                description='Membership fee' if posted is None else f"Price changed to {membership.amount_paid}",
+                booked_on=None if posted is not None else timezone.localdate(membership.created_at),
+            )
+
+    @staticmethod
+    def adjust(membership, amount, description=''):
+        """Correct what a membership owes by a signed amount"""
+        if not amount:
+            return None
+        return LedgerService.post(membership.pk, 'adjustment', amount, description=description)
+
+    @staticmethod
+    def sync_payment(payment, removed=False):
+        """
+        Post whatever makes a payment's entries match its current state
+
+        A completed payment nets to -amount, any other status (or a payment
+        being deleted) to zero. Safe to call repeatedly: nothing is posted
+        when the entries already match.
+        """
+        target = -payment.amount if payment.status == 'completed' and not removed else ZERO
+        with transaction.atomic():
+            # Touching the balance row first serializes syncs of one membership
+            _bump(MembershipBalance, {'membership_id': payment.membership_id})
+            posted = LedgerEntry.objects.filter(payment_id=payment.pk).aggregate(
+                total=Sum('amount')
+            )['total'] or ZERO
+            difference = target - posted
+            if not difference:
+                return None
+            receipt = difference < 0
+            return LedgerService.post(
+                payment.membership_id,
+                'payment',
+                difference,
+                # A deleted payment's entries keep their amounts but lose the link
+                payment=None if removed else payment,
+                description=f"Payment {'received' if receipt else 'reversed'} ({payment.payment_id})",
+                booked_on=_booked_on(payment) if receipt else None,
+            )
+
+    @staticmethod
+    def reverse_membership(membership):
+        """
+        Post whatever nets a membership's entries to zero, before it is deleted
+
+        Each payment is reversed on its own, so daily payment counts stay
+        right. The entries are kept; deleting the membership only unlinks them.
+        """
+        with transaction.atomic():
+            _bump(MembershipBalance, {'membership_id': membership.pk})
+            entries = LedgerEntry.objects.filter(membership_id=membership.pk)
+            # Their rollup rows lose the plan once the membership is gone
+            months = {
+                day.replace(day=1)
+                for day in entries.filter(entry_type='payment').values_list('booked_on', flat=True).distinct()
+            }
+            if months:
+                RevenueRollupService.schedule(months)
+            for row in entries.values('entry_type', 'payment_id').annotate(total=Sum('amount')).order_by():
+                if row['total']:
+                    LedgerService.post(
+                        membership.pk, row['entry_type'], -row['total'],
+                        description=f"Membership {membership.pk} deleted",
+                    )
+
+    @staticmethod
+    def revenue_between(start, end):
+        """
+        Money received from start to end (inclusive dates) - one range read
+
+        Returns:
+            {'received', 'payments', 'charged', 'adjusted'}
+        """
+        totals = DailyRevenueSummary.objects.filter(date__range=(start, end)).aggregate(
+            received=Sum('received'),
+            payments=Sum('payments'),
+            charged=Sum('charged'),
+            adjusted=Sum('adjusted'),
+        )
+        return {name: value or (0 if name == 'payments' else ZERO) for name, value in totals.items()}
+
+    @staticmethod
+    def rebuild_summaries():
+        """
+        Recompute every MembershipBalance and DailyRevenueSummary from the
+        entries - two grouped queries
+
+        Returns:
+            (balances, days) written
+        """
+        def by_type(entry_type):
+            return Sum('amount', filter=Q(entry_type=entry_type))
+
+        balances = [
+            MembershipBalance(
+                membership_id=row['membership_id'],
+                charged=row['charged'] or ZERO,
+                paid=-(row['paid'] or ZERO),
+                adjusted=row['adjusted'] or ZERO,
+                balance=row['balance'],
+            )
+            # Entries of deleted memberships only count towards the days
+            for row in LedgerEntry.objects.filter(membership__isnull=False).values('membership_id').annotate(
+                charged=by_type('charge'),
+                paid=by_type('payment'),
+                adjusted=by_type('adjustment'),
+                balance=Sum('amount'),
+            ).order_by()
+        ]
+        days = [
+            DailyRevenueSummary(
+                date=row['booked_on'],
+                received=-(row['paid'] or ZERO),
+                payments=row['receipts'] - row['reversals'],
+                charged=row['charged'] or ZERO,
+                adjusted=row['adjusted'] or ZERO,
+            )
+            for row in LedgerEntry.objects.values('booked_on').annotate(
+                charged=by_type('charge'),
+                paid=by_type('payment'),
+                adjusted=by_type('adjustment'),
+                receipts=Count('id', filter=Q(entry_type='payment', amount__lt=0)),
+                reversals=Count('id', filter=Q(entry_type='payment', amount__gt=0)),
+            ).order_by()
+        ]
+        with transaction.atomic():
+            MembershipBalance.objects.all().delete()
+            DailyRevenueSummary.objects.all().delete()
+            MembershipBalance.objects.bulk_create(balances, batch_size=500)
+            DailyRevenueSummary.objects.bulk_create(days, batch_size=500)
+        return len(balances), len(days)
@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from payments.models import LedgerEntry
+from payments.rollups import RevenueRollupService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild monthly revenue rollups from the payments ledger, a month at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First month to rebuild (YYYY-MM); defaults to the first ledger payment')
+        parser.add_argument('--end', help='Last month to rebuild (YYYY-MM); defaults to this month')
+
+    def handle(self, *args, **options):
+        end = self.parse_month(options['end']) or timezone.localdate().replace(day=1)
+        start = self.parse_month(options['start'])
+        if start is None:
+            first = LedgerEntry.objects.filter(entry_type='payment').aggregate(first=Min('booked_on'))['first']
+            if first is None:
+                self.stdout.write('No ledger payments to roll up.')
+                return
+            start = first.replace(day=1)
+        if start > end:
+            raise CommandError('--start must not be after --end')
+
+        month, total = start, 0
+        while month <= end:
+            rows = RevenueRollupService.rebuild(month, month)
+            total += rows
+            self.stdout.write(f'{month:%Y-%m}: {rows} rollup rows')
+            month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} rollup rows from {start:%Y-%m} to {end:%Y-%m}'))
+
+    def parse_month(self, value):
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(f'{value}-01')
+        except ValueError:
+            raise CommandError(f'Invalid month: {value}')
@@ -0,0 +1,40 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from payments.invoice_jobs import InvoiceJobService
+
+
+class Command(BaseCommand):
+    help = 'Work through queued bulk invoice jobs (runs until stopped unless --once is given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds between polls of an empty queue')
+        parser.add_argument('--batch-size', type=int, help='Memberships per batch; defaults to INVOICE_BATCH_SIZE')
+
+    def handle(self, *args, **options):
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+
+        while True:
+            close_old_connections()
+            requeued = InvoiceJobService.requeue_stale()
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stalled jobs')
+
+            job = InvoiceJobService.claim(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Job {job.job_id}: {len(job.member_ids)} members')
+            job = InvoiceJobService.run(job, options['batch_size'])
+            style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+            self.stdout.write(style(
+                f'Job {job.job_id} {job.status}: {job.succeeded} invoiced, {job.failed} failed'
+            ))
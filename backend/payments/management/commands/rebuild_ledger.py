@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from memberships.models import Membership
+from payments.ledger import LedgerService
+from payments.models import LedgerEntry, Payment
+
+
+class Command(BaseCommand):
+    help = (
+        'Post ledger entries missing for older memberships and completed payments, '
+        'then recompute balances and daily revenue from the ledger '
+        '(run backfill_revenue_rollups afterwards for the monthly rollups)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Memberships created before the ledger: charge the plan price
+        uncharged = Membership.objects.exclude(amount_paid=0).filter(
+            ~Exists(LedgerEntry.objects.filter(membership=OuterRef('pk'), entry_type='charge'))
+        ).values_list('id', 'amount_paid', 'created_at')
+        charges = [
+            LedgerEntry(
+                membership_id=membership_id, entry_type='charge', amount=amount,
+                description='Membership fee', booked_on=timezone.localdate(created_at),
+            )
+            for membership_id, amount, created_at in uncharged.iterator(chunk_size=batch_size)
+        ]
+        LedgerEntry.objects.bulk_create(charges, batch_size=batch_size)
+        self.stdout.write(f'Charged {len(charges)} memberships')
+
+        # Completed payments without entries: book them on the day they completed
+        unposted = Payment.objects.filter(status='completed').filter(
+            ~Exists(LedgerEntry.objects.filter(payment=OuterRef('pk')))
+        ).annotate(paid_at=Coalesce('completed_at', 'updated_at')).values_list(
+            'id', 'payment_id', 'membership_id', 'amount', 'paid_at'
+        )
+        receipts = [
+            LedgerEntry(
+                membership_id=membership_id, entry_type='payment', amount=-amount, payment_id=pk,
+                description=f'Payment received ({payment_id})', booked_on=timezone.localdate(paid_at),
+            )
+            for pk, payment_id, membership_id, amount, paid_at in unposted.iterator(chunk_size=batch_size)
+        ]
+        LedgerEntry.objects.bulk_create(receipts, batch_size=batch_size)
+        self.stdout.write(f'Posted {len(receipts)} payments')
+
+        balances, days = LedgerService.rebuild_summaries()
+        outstanding = LedgerEntry.objects.aggregate(total=Sum('amount'))['total'] or 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {balances} balances and {days} daily summaries ({outstanding} outstanding)'
+        ))
@@ -0,0 +1,316 @@
+# Generated by Django 5.2.3 on 2026-10-17 05:36
+
+import django.db.models.deletion
+import uuid
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("members", "0005_member_other_names_trgm"),
+        ("memberships", "0002_membership_due_indexes"),
+        ("payments", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRevenueSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+                (
+                    "received",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                ("payments", models.IntegerField(default=0)),
+                (
+                    "charged",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                (
+                    "adjusted",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["-date"],
+            },
+        ),
+        migrations.CreateModel(
+            name="InvoiceJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "job_id",
+                    models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("member_ids", models.JSONField(default=list)),
+                ("send_email", models.BooleanField(default=True)),
+                ("message", models.TextField(blank=True, default="")),
+                ("total", models.IntegerField(default=0)),
+                ("processed", models.IntegerField(default=0)),
+                ("succeeded", models.IntegerField(default=0)),
+                ("failed", models.IntegerField(default=0)),
+                ("cursor", models.BigIntegerField(default=0)),
+                ("details", models.JSONField(default=list)),
+                ("errors", models.JSONField(default=list)),
+                ("error", models.TextField(blank=True, default="")),
+                ("worker", models.CharField(blank=True, default="", max_length=100)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="LedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "entry_type",
+                    models.CharField(
+                        choices=[
+                            ("charge", "Charge"),
+                            ("payment", "Payment"),
+                            ("adjustment", "Adjustment"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "description",
+                    models.CharField(blank=True, default="", max_length=200),
+                ),
+                ("booked_on", models.DateField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["created_at", "id"],
+            },
+        ),
+        migrations.CreateModel(
+            name="MembershipBalance",
+            fields=[
+                (
+                    "membership",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="ledger_balance",
+                        serialize=False,
+                        to="memberships.membership",
+                    ),
+                ),
+                (
+                    "charged",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                (
+                    "paid",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                (
+                    "adjusted",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                (
+                    "balance",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="MonthlyRevenueRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField(help_text="First day of the month")),
+                (
+                    "membership_type",
+                    models.CharField(
+                        blank=True,
+                        choices=[("indoor", "Indoor"), ("outdoor", "Outdoor")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "payment_method",
+                    models.CharField(blank=True, default="", max_length=50),
+                ),
+                ("payments", models.IntegerField(default=0)),
+                (
+                    "amount",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=12
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["-month"],
+            },
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="completed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="payment_created_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="invoicejob",
+            index=models.Index(
+                fields=["status", "created_at"], name="invoice_job_queue_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="ledgerentry",
+            name="membership",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="ledger_entries",
+                to="memberships.membership",
+            ),
+        ),
+        migrations.AddField(
+            model_name="ledgerentry",
+            name="payment",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="ledger_entries",
+                to="payments.payment",
+            ),
+        ),
+        migrations.AddField(
+            model_name="monthlyrevenuerollup",
+            name="location",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="revenue_rollups",
+                to="members.location",
+            ),
+        ),
+        migrations.AddField(
+            model_name="monthlyrevenuerollup",
+            name="plan",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="revenue_rollups",
+                to="memberships.membershipplan",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ledgerentry",
+            index=models.Index(
+                fields=["membership", "created_at"], name="ledger_membership_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ledgerentry",
+            index=models.Index(fields=["booked_on"], name="ledger_booked_on_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="monthlyrevenuerollup",
+            index=models.Index(
+                fields=["location", "month"], name="revenue_rollup_location_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="monthlyrevenuerollup",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "month",
+                    "membership_type",
+                    "plan",
+                    "location",
+                    "payment_method",
+                ),
+                name="revenue_rollup_bucket",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="monthlyrevenuerollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("location__isnull", True)),
+                fields=("month", "membership_type", "plan", "payment_method"),
+                name="revenue_rollup_bucket_no_location",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0002_ledger_and_revenue_rollups"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="invoicejob",
+            name="details",
+        ),
+        migrations.AddField(
+            model_name="invoicejob",
+            name="emailed",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,6 +1,9 @@
 import uuid
+from decimal import Decimal
+
 from django.db import models
-from memberships.models import Membership
+from django.utils import timezone
+from memberships.models import Membership, MembershipPlan
 
 
 class PaymentMethod(models.Model):
@@ -50,11 +53,222 @@ class Payment(models.Model):
     
     # Timestamps
     initiated_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Supports keyset pagination over (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='payment_created_keyset_idx'),
+        ]
     
     def __str__(self):
-        return f"Payment {self.payment_id} - {self.status}"
\ No newline at end of file
+        return f"Payment {self.payment_id} - {self.status}"
+
+    def save(self, *args, **kwargs):
+        # Revenue is booked in the month the payment completed
+        if self.status == 'completed' and self.completed_at is None:
+            self.completed_at = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'completed_at'}
+        super().save(*args, **kwargs)
+
+
+class MonthlyRevenueRollup(models.Model):
+    """
+    Money received per (calendar month, membership type, plan, location,
+    payment method), derived from the ledger's payment entries by
+    payments.rollups. Revenue trends read a range of these rows.
+    """
+
+    month = models.DateField(help_text="First day of the month")
+    # Empty for entries of deleted memberships
+    membership_type = models.CharField(max_length=10, choices=MembershipPlan.MEMBERSHIP_TYPES, blank=True)
+    plan = models.ForeignKey(
+        MembershipPlan,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='revenue_rollups',
+    )
+    location = models.ForeignKey(
+        'members.Location',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='revenue_rollups',
+    )
+    # PaymentMethod name ('' when the method was removed)
+    payment_method = models.CharField(max_length=50, blank=True, default='')
+
+    payments = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'membership_type', 'plan', 'location', 'payment_method'],
+                name='revenue_rollup_bucket',
+            ),
+            # NULLs are distinct in the constraint above
+            models.UniqueConstraint(
+                fields=['month', 'membership_type', 'plan', 'payment_method'],
+                condition=models.Q(location__isnull=True),
+                name='revenue_rollup_bucket_no_location',
+            ),
+        ]
+        indexes = [
+            # Per-location revenue trends (analytics.locations)
+            models.Index(fields=['location', 'month'], name='revenue_rollup_location_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} - {self.plan_id} - {self.amount}"
+
+class LedgerEntry(models.Model):
+    """
+    One line of a membership's account, kept by payments.ledger.
+
+    Entries are append-only: a correction is a new entry (an adjustment,
+    or a negative receipt for a reversed payment), never an edit, so the
+    balances and daily summaries below can be maintained by increments.
+    Deleting a membership posts entries that net its ledger to zero and
+    keeps them all, without the link to the membership.
+    """
+
+    ENTRY_TYPES = [
+        ('charge', 'Charge'),
+        ('payment', 'Payment'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    membership = models.ForeignKey(
+        Membership,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='ledger_entries',
+    )
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    # Signed change to what the member owes: charges are positive, receipts negative
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='ledger_entries',
+    )
+    description = models.CharField(max_length=200, blank=True, default='')
+    # Day the entry counts towards in DailyRevenueSummary
+    booked_on = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['membership', 'created_at'], name='ledger_membership_idx'),
+            models.Index(fields=['booked_on'], name='ledger_booked_on_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.entry_type} {self.amount} - membership {self.membership_id}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger entries are append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries are append-only")
+
+
+class MembershipBalance(models.Model):
+    """Running totals of a membership's ledger entries"""
+
+    membership = models.OneToOneField(
+        Membership,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ledger_balance',
+    )
+    charged = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # Money received, net of reversals
+    paid = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    adjusted = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # Outstanding: charged - paid + adjusted
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Membership {self.membership_id} owes {self.balance}"
+
+
+class DailyRevenueSummary(models.Model):
+    """Ledger entries per booking day: money received, charges and adjustments"""
+
+    date = models.DateField(unique=True)
+    received = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    # Receipts less reversals
+    payments = models.IntegerField(default=0)
+    charged = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    adjusted = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.date} - {self.received}"
+
+
+class InvoiceJob(models.Model):
+    """
+    A bulk invoice run, queued by the API and worked through in batches by
+    `manage.py process_invoice_jobs` (payments.invoice_jobs)
+    """
+
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    member_ids = models.JSONField(default=list)
+    send_email = models.BooleanField(default=True)
+    message = models.TextField(blank=True, default='')
+
+    # Progress
+    total = models.IntegerField(default=0)
+    processed = models.IntegerField(default=0)
+    succeeded = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    # Last membership id processed, so a restarted job resumes after it
+    cursor = models.BigIntegerField(default=0)
+    emailed = models.IntegerField(default=0)
+    # The first MAX_JOB_ERRORS failures (payments.invoice_jobs); `failed` counts them all
+    errors = models.JSONField(default=list)
+    error = models.TextField(blank=True, default='')
+
+    worker = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Doubles as the worker heartbeat while running
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='invoice_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Invoice job {self.job_id} - {self.status}"
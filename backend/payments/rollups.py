@@ -0,0 +1,180 @@
+"""
+Monthly revenue rollups
+
+MonthlyRevenueRollup holds money received per (calendar month, membership
+type, plan, location, payment method), so revenue trends are a read of a
+few rows instead of one aggregate per month.
+
+The rollups are derived from the payments ledger (payments.ledger), which
+is the authoritative record of money received: they group the same
+payment entries as DailyRevenueSummary, so every revenue figure agrees.
+
+- An entry counts towards the month it is booked on: a receipt the day
+  its payment completed, a reversal the day it was reversed.
+- Posting a payment entry re-aggregates its month once the transaction
+  commits. Recomputing a month rather than incrementing a row keeps the
+  totals exact after retries.
+- Entries of deleted memberships have no plan or membership type.
+- `manage.py backfill_revenue_rollups` rebuilds history.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import LedgerEntry, MonthlyRevenueRollup
+
+logger = logging.getLogger(__name__)
+
+RECEIPTS = Count('id', filter=Q(amount__lt=0))
+REVERSALS = Count('id', filter=Q(amount__gt=0))
+
+
+def _next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class RevenueRollupService:
+
+    @staticmethod
+    def entries_between(first_month, last_month):
+        """Payment ledger entries booked from first_month to the end of last_month"""
+        return LedgerEntry.objects.filter(
+            entry_type='payment', booked_on__gte=first_month, booked_on__lt=_next_month(last_month),
+        )
+
+    @staticmethod
+    def _aggregate(entries):
+        """Rollup rows for a queryset of payment entries - one grouped query"""
+        rows = entries.values(
+            month=TruncMonth('booked_on'),
+            membership_type=Coalesce('membership__plan__membership_type', Value('')),
+            plan_id=F('membership__plan_id'),
+            location_id=F('membership__location_id'),
+            method=Coalesce('payment__payment_method__name', Value('')),
+        ).annotate(receipts=RECEIPTS, reversals=REVERSALS, total=Sum('amount')).order_by()
+        return [
+            MonthlyRevenueRollup(
+                month=row['month'],
+                membership_type=row['membership_type'],
+                plan_id=row['plan_id'],
+                location_id=row['location_id'],
+                payment_method=row['method'],
+                payments=row['receipts'] - row['reversals'],
+                amount=-row['total'],
+            )
+            for row in rows
+        ]
+
+    @staticmethod
+    def rebuild(first_month, last_month):
+        """
+        Recompute every rollup from first_month to last_month (inclusive)
+
+        Returns:
+            Number of rollup rows written
+        """
+        first_month, last_month = first_month.replace(day=1), last_month.replace(day=1)
+        entries = RevenueRollupService.entries_between(first_month, last_month)
+        for attempt in range(2):
+            rows = RevenueRollupService._aggregate(entries)
+            try:
+                with transaction.atomic():
+                    MonthlyRevenueRollup.objects.filter(month__range=(first_month, last_month)).delete()
+                    MonthlyRevenueRollup.objects.bulk_create(rows, batch_size=500)
+                return len(rows)
+            except IntegrityError:
+                # A concurrent refresh wrote the same month first
+                if attempt:
+                    raise
+
+    @staticmethod
+    def refresh(months):
+        """Recompute the rollups of the given months"""
+        for month in sorted(set(months)):
+            RevenueRollupService.rebuild(month, month)
+
+    @staticmethod
+    def schedule(months):
+        """Refresh months once the current transaction commits"""
+        months = set(months)
+
+        def refresh():
+            try:
+                RevenueRollupService.refresh(months)
+            except Exception as e:
+                # The backfill command repairs any month missed here
+                logger.warning(f"Revenue rollup refresh failed for {sorted(months)}: {e}")
+
+        transaction.on_commit(refresh)
+
+    @staticmethod
+    def monthly_totals(first_month, last_month):
+        """
+        Revenue per month and membership type - one range read
+
+        Returns:
+            {month: {'revenue', 'payments', 'indoor', 'outdoor'}};
+            months without payment entries are absent
+        """
+        rows = MonthlyRevenueRollup.objects.filter(
+            month__range=(first_month, last_month)
+        ).values('month', 'membership_type').annotate(
+            amount=Sum('amount'), payments=Sum('payments')
+        ).order_by()
+
+        months = {}
+        for row in rows:
+            month = months.setdefault(row['month'], {'revenue': 0, 'payments': 0, 'indoor': 0, 'outdoor': 0})
+            month['revenue'] += row['amount']
+            month['payments'] += row['payments']
+            if row['membership_type']:
+                month[row['membership_type']] = month.get(row['membership_type'], 0) + row['amount']
+        return months
+
+    @staticmethod
+    def totals_between(start, end):
+        """
+        Money received from start to end (inclusive dates)
+
+        Whole months come from the rollups; the partial months at either
+        edge of the range are summed from the ledger, so any range costs at
+        most two queries.
+
+        Returns:
+            {'revenue', 'payments', 'indoor', 'outdoor'}
+        """
+        first_full = start if start.day == 1 else _next_month(start)
+        after_full = _next_month(end) if _next_month(end) == end + timedelta(days=1) else end.replace(day=1)
+        totals = {'revenue': 0, 'payments': 0, 'indoor': 0, 'outdoor': 0}
+
+        def add(membership_type, amount, payments):
+            totals['revenue'] += amount or 0
+            totals['payments'] += payments
+            if membership_type:
+                totals[membership_type] = totals.get(membership_type, 0) + (amount or 0)
+
+        edges = Q()
+        if first_full < after_full:
+            rows = MonthlyRevenueRollup.objects.filter(
+                month__gte=first_full, month__lt=after_full
+            ).values('membership_type').annotate(amount=Sum('amount'), payments=Sum('payments')).order_by()
+            for row in rows:
+                add(row['membership_type'], row['amount'], row['payments'])
+            if start < first_full:
+                edges |= Q(booked_on__gte=start, booked_on__lt=first_full)
+            if after_full <= end:
+                edges |= Q(booked_on__gte=after_full, booked_on__lte=end)
+        else:
+            edges = Q(booked_on__range=(start, end))
+
+        if edges:
+            rows = LedgerEntry.objects.filter(entry_type='payment').filter(edges).values(
+                membership_type=F('membership__plan__membership_type')
+            ).annotate(total=Sum('amount'), receipts=RECEIPTS, reversals=REVERSALS).order_by()
+            for row in rows:
+                add(row['membership_type'], -row['total'], row['receipts'] - row['reversals'])
+        return totals
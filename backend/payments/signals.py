@@ -0,0 +1,60 @@
+"""
+Model signal receivers for the payments app.
+
+Posts ledger entries for new memberships, price changes and payments, and
+reverses a membership's ledger before it is deleted. The monthly revenue
+rollups follow the ledger (payments.ledger).
+"""
+
+from django.db.models import QuerySet
+from django.db.models.signals import post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from memberships.models import Membership
+from .ledger import LedgerService
+from .models import Payment
+
+
+@receiver(post_init, sender=Payment)
+def remember_ledger_status(sender, instance, **kwargs):
+    # Only payments that are or were completed have ledger entries to sync
+    instance._ledger_synced = bool(instance.pk) and (
+        'status' in instance.get_deferred_fields() or instance.status == 'completed'
+    )
+
+
+@receiver(post_save, sender=Payment)
+def post_payment_to_ledger(sender, instance, **kwargs):
+    if instance.status == 'completed' or instance._ledger_synced:
+        LedgerService.sync_payment(instance)
+    instance._ledger_synced = instance.status == 'completed'
+
+
+@receiver(pre_delete, sender=Payment)
+def reverse_deleted_payment(sender, instance, origin=None, **kwargs):
+    # Payments deleted with their membership are reversed by reverse_deleted_membership
+    deleted_directly = isinstance(origin, Payment) or (isinstance(origin, QuerySet) and origin.model is Payment)
+    if deleted_directly and instance._ledger_synced:
+        LedgerService.sync_payment(instance, removed=True)
+
+
+@receiver(post_init, sender=Membership)
+def remember_ledger_price(sender, instance, **kwargs):
+    if instance.pk and 'amount_paid' not in instance.get_deferred_fields():
+        instance._ledger_price = instance.amount_paid
+    else:
+        instance._ledger_price = None
+
+
+@receiver(post_save, sender=Membership)
+def post_membership_to_ledger(sender, instance, created, **kwargs):
+    if 'amount_paid' in instance.get_deferred_fields():
+        return
+    if created or instance.amount_paid != instance._ledger_price:
+        LedgerService.sync_charges(instance)
+    instance._ledger_price = instance.amount_paid
+
+
+@receiver(pre_delete, sender=Membership)
+def reverse_deleted_membership(sender, instance, **kwargs):
+    LedgerService.reverse_membership(instance)
@@ -0,0 +1,447 @@
+import re
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from members.models import Location, Member
+from memberships.models import Membership, MembershipPlan
+from .invoice_jobs import InvoiceJobService
+from .invoice_service import InvoiceService
+from .ledger import LedgerService
+from .models import (
+    DailyRevenueSummary, InvoiceJob, LedgerEntry, MembershipBalance, MonthlyRevenueRollup, Payment, PaymentMethod,
+)
+from .rollups import RevenueRollupService
+
+
+class MonthlyRevenueRollupTests(TestCase):
+    """Tests for the monthly revenue rollups derived from the ledger"""
+
+    def setUp(self):
+        self.plan = MembershipPlan.objects.create(
+            plan_name="Outdoor Weekly", plan_code="OUT-W", membership_type="outdoor", plan_type="weekly",
+        )
+        self.location = Location.objects.create(name="Karura Forest", code="karura")
+        self.cash = PaymentMethod.objects.create(name="Cash", payment_type="cash")
+        member = Member.objects.create(first_name="Revenue", last_name="Member")
+        today = timezone.localdate()
+        self.membership = Membership.objects.create(
+            member=member, plan=self.plan, location=self.location, start_date=today,
+            end_date=today + timedelta(days=7), amount_paid=1000, total_sessions_allowed=2,
+        )
+        self.this_month = today.replace(day=1)
+
+    def pay(self, amount, status="pending", completed_on=None):
+        completed_at = None
+        if completed_on:
+            completed_at = timezone.make_aware(timezone.datetime.combine(completed_on, timezone.datetime.min.time()))
+            completed_at += timedelta(hours=12)
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(
+                membership=self.membership, payment_method=self.cash, amount=amount, status=status,
+                completed_at=completed_at,
+            )
+
+    def test_confirmation_updates_the_month(self):
+        payment = self.pay(1000)
+        self.pay(500, status="completed")
+        self.assertEqual(MonthlyRevenueRollup.objects.get().amount, Decimal("500"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.status = "completed"
+            payment.save()
+
+        row = MonthlyRevenueRollup.objects.get()
+        self.assertEqual(
+            (row.month, row.membership_type, row.plan, row.location, row.payment_method, row.payments, row.amount),
+            (self.this_month, "outdoor", self.plan, self.location, "Cash", 2, Decimal("1500")),
+        )
+        self.assertIsNotNone(payment.completed_at)
+
+        # Reversing a payment takes it out again
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.status = "failed"
+            payment.save()
+        self.assertEqual(MonthlyRevenueRollup.objects.get().amount, Decimal("500"))
+
+    def test_revenue_counts_towards_the_completion_month(self):
+        last_month = (self.this_month - timedelta(days=1)).replace(day=1)
+        self.pay(800, status="completed", completed_on=last_month)
+
+        totals = RevenueRollupService.monthly_totals(last_month, self.this_month)
+        self.assertEqual(list(totals), [last_month])
+        self.assertEqual(totals[last_month]["outdoor"], Decimal("800"))
+
+    def test_totals_between_combines_months_and_edges(self):
+        self.pay(100, status="completed", completed_on=date(2025, 1, 20))   # partial month, inside
+        self.pay(200, status="completed", completed_on=date(2025, 1, 5))    # before the range
+        self.pay(400, status="completed", completed_on=date(2025, 2, 14))   # whole month
+        self.pay(800, status="completed", completed_on=date(2025, 3, 10))   # partial month, inside
+        self.pay(1600, status="completed", completed_on=date(2025, 3, 20))  # after the range
+
+        with self.assertNumQueries(2):
+            totals = RevenueRollupService.totals_between(date(2025, 1, 15), date(2025, 3, 15))
+        self.assertEqual((totals["revenue"], totals["payments"], totals["outdoor"]), (Decimal("1300"), 3, Decimal("1300")))
+        self.assertEqual(RevenueRollupService.totals_between(date(2025, 2, 1), date(2025, 2, 28))["revenue"], Decimal("400"))
+        self.assertEqual(RevenueRollupService.totals_between(date(2025, 3, 11), date(2025, 3, 19))["revenue"], 0)
+
+    def test_rollups_agree_with_the_daily_summaries(self):
+        last_month = (self.this_month - timedelta(days=1)).replace(day=1)
+        payment = self.pay(900, status="completed", completed_on=last_month)
+        # Reversed this month: last month keeps the receipt, this month books the reversal
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.status = "failed"
+            payment.save()
+
+        for first, last in ((last_month, last_month), (self.this_month, timezone.localdate())):
+            daily = LedgerService.revenue_between(first, last)
+            monthly = RevenueRollupService.totals_between(first, last)
+            self.assertEqual((monthly["revenue"], monthly["payments"]), (daily["received"], daily["payments"]))
+        self.assertEqual(RevenueRollupService.monthly_totals(last_month, last_month)[last_month]["revenue"], 900)
+
+    def test_backfill_rebuilds_from_the_ledger(self):
+        self.pay(700, status="completed")
+        MonthlyRevenueRollup.objects.all().delete()
+
+        call_command("backfill_revenue_rollups", stdout=StringIO())
+
+        self.assertEqual(MonthlyRevenueRollup.objects.get().amount, Decimal("700"))
+
+
+class LedgerTests(TestCase):
+    """Tests for the append-only ledger and its balances and daily summaries"""
+
+    def setUp(self):
+        plan = MembershipPlan.objects.create(
+            plan_name="Indoor Monthly", plan_code="IN-M", membership_type="indoor", plan_type="monthly",
+        )
+        member = Member.objects.create(first_name="Ledger", last_name="Member")
+        today = timezone.localdate()
+        self.membership = Membership.objects.create(
+            member=member, plan=plan, start_date=today, end_date=today + timedelta(days=30),
+            amount_paid=3000, total_sessions_allowed=12,
+        )
+        self.today = today
+
+    def balance(self):
+        row = MembershipBalance.objects.get(membership=self.membership)
+        return row.charged, row.paid, row.balance
+
+    def test_payments_post_receipts_and_reversals(self):
+        self.assertEqual(self.balance(), (3000, 0, 3000))
+
+        payment = Payment.objects.create(membership=self.membership, amount=1000)
+        self.assertEqual(self.balance(), (3000, 0, 3000))
+        payment.status = "completed"
+        payment.save()
+        payment.save()  # nothing new to post
+        self.assertEqual(self.balance(), (3000, 1000, 2000))
+
+        payment.status = "failed"
+        payment.save()
+        self.assertEqual(self.balance(), (3000, 0, 3000))
+        self.assertEqual(
+            list(LedgerEntry.objects.values_list("entry_type", "amount")),
+            [("charge", Decimal("3000")), ("payment", Decimal("-1000")), ("payment", Decimal("1000"))],
+        )
+        day = DailyRevenueSummary.objects.get(date=self.today)
+        self.assertEqual((day.received, day.payments, day.charged), (0, 0, 3000))
+
+        # Deleting a completed payment reverses it too
+        Payment.objects.create(membership=self.membership, amount=500, status="completed").delete()
+        self.assertEqual(self.balance(), (3000, 0, 3000))
+
+    def test_deleting_a_membership_reverses_its_ledger(self):
+        Payment.objects.create(membership=self.membership, amount=1000, status="completed")
+        self.assertEqual(LedgerService.revenue_between(self.today, self.today)["received"], 1000)
+
+        self.membership.member.delete()
+
+        revenue = LedgerService.revenue_between(self.today, self.today)
+        self.assertEqual((revenue["received"], revenue["payments"], revenue["charged"]), (0, 0, 0))
+        self.assertEqual(LedgerEntry.objects.filter(membership__isnull=True).count(), 4)
+        self.assertFalse(MembershipBalance.objects.exists())
+
+        # The summaries still match the entries
+        LedgerService.rebuild_summaries()
+        self.assertEqual(LedgerService.revenue_between(self.today, self.today), revenue)
+
+    def test_price_change_charges_the_difference(self):
+        self.membership.amount_paid = 3500
+        self.membership.save()
+        self.membership.save()
+        self.assertEqual(self.balance(), (3500, 0, 3500))
+
+    def test_entries_are_append_only(self):
+        entry = LedgerEntry.objects.get()
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+    def test_payment_stats_read_the_daily_summaries(self):
+        Payment.objects.create(membership=self.membership, amount=1200, status="completed")
+        user = get_user_model().objects.create_superuser("owner@example.com", "x")
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {AccessToken.for_user(user)}"
+
+        stats = self.client.get("/payments/stats/").json()["stats"]
+        self.assertEqual((stats["total_revenue"], stats["total_payments"]), (1200.0, 1))
+
+    def test_rebuild_ledger_backfills_older_rows(self):
+        payment = Payment.objects.create(membership=self.membership, amount=1000, status="completed")
+        LedgerEntry.objects.all()._raw_delete(LedgerEntry.objects.db)
+        MembershipBalance.objects.all().delete()
+        DailyRevenueSummary.objects.all().delete()
+
+        call_command("rebuild_ledger", stdout=StringIO())
+        call_command("rebuild_ledger", stdout=StringIO())
+
+        self.assertEqual(self.balance(), (3000, 1000, 2000))
+        self.assertEqual(LedgerEntry.objects.get(entry_type="payment").payment, payment)
+        self.assertEqual(DailyRevenueSummary.objects.get().received, 1000)
+
+
+class DueListTests(TestCase):
+    """Tests for the payments-due and renewals-due lists"""
+
+    def setUp(self):
+        plan = MembershipPlan.objects.create(
+            plan_name="Indoor Monthly", plan_code="IN-M", membership_type="indoor", plan_type="monthly",
+        )
+        today = timezone.localdate()
+        rows = [
+            ("Overdue", "overdue", -3, 1000),
+            ("Today", "pending", 0, 2000),
+            ("Soon", "pending", 5, 3000),
+            ("Later", "pending", 20, 4000),
+            ("Paid", "paid", 10, 5000),
+        ]
+        for name, payment_status, days, amount in rows:
+            member = Member.objects.create(first_name=name, last_name="Member")
+            Membership.objects.create(
+                member=member, plan=plan, payment_status=payment_status, amount_paid=amount,
+                total_sessions_allowed=12, start_date=today - timedelta(days=30),
+                end_date=today + timedelta(days=days),
+            )
+        user = get_user_model().objects.create_user("desk@example.com", "x")
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {AccessToken.for_user(user)}"
+        self.client.get("/payments/due/")  # records last activity
+
+    def test_payments_due_are_classified_and_paged_in_the_database(self):
+        # User lookup, stats aggregate, page
+        with self.assertNumQueries(3):
+            response = self.client.get("/payments/due/?limit=2")
+
+        data = response.json()
+        self.assertEqual(data["count"], 4)
+        self.assertEqual(
+            data["stats"],
+            {"total": 4, "overdue": 1, "due_today": 1, "due_soon": 1,
+             "total_outstanding": 10000.0, "average_amount": 2500.0},
+        )
+        self.assertEqual(len(data["results"]), 2)
+        self.assertTrue(data["pagination"]["has_next"])
+
+        overdue = self.client.get("/payments/due/?status=overdue").json()
+        row, = overdue["results"]
+        self.assertEqual((row["firstName"], row["status"], row["daysOverdue"]), ("Overdue", "overdue", 3))
+        self.assertEqual((overdue["stats"]["total"], overdue["stats"]["due_today"]), (1, 1))
+
+    def test_renewals_due_by_urgency(self):
+        data = self.client.get("/renewals/due/?urgency=critical").json()
+
+        self.assertEqual([row["firstName"] for row in data["results"]], ["Today", "Soon"])
+        self.assertEqual([row["daysUntilExpiry"] for row in data["results"]], [0, 5])
+        self.assertEqual(
+            {key: data["stats"][key] for key in ("total", "critical", "high", "medium", "low")},
+            {"total": 2, "critical": 2, "high": 1, "medium": 1, "low": 0},
+        )
+        self.assertEqual(data["stats"]["total_revenue"], 5000.0)
+
+
+class InvoiceJobTests(TestCase):
+    """Tests for queued bulk invoices and the worker command"""
+
+    def setUp(self):
+        plan = MembershipPlan.objects.create(
+            plan_name="Indoor Monthly", plan_code="IN-M", membership_type="indoor", plan_type="monthly",
+        )
+        today = timezone.localdate()
+        self.members = []
+        for i, email in enumerate(["one@example.com", "two@example.com", ""]):
+            member = Member.objects.create(first_name=f"Invoice{i}", last_name="Member", email=email)
+            membership = Membership.objects.create(
+                member=member, plan=plan, start_date=today, end_date=today + timedelta(days=30),
+                amount_paid=2000, total_sessions_allowed=12,
+            )
+            Payment.objects.create(membership=membership, amount=2000)
+            self.members.append(member)
+        user = get_user_model().objects.create_user("desk@example.com", "x")
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {AccessToken.for_user(user)}"
+
+    def test_bulk_invoices_are_queued_and_sent_by_the_worker(self):
+        # An expired membership: only each member's latest one is invoiced
+        today = timezone.localdate()
+        expired = Membership.objects.create(
+            member=self.members[0], plan=MembershipPlan.objects.get(), start_date=today - timedelta(days=60),
+            end_date=today - timedelta(days=30), amount_paid=2000, total_sessions_allowed=12,
+        )
+        Membership.objects.filter(pk=expired.pk).update(created_at=timezone.now() - timedelta(days=60))
+        member_ids = [member.id for member in self.members]
+        response = self.client.post("/invoice/bulk/", {"member_ids": member_ids}, content_type="application/json")
+        self.assertEqual(response.status_code, 202)
+        job = response.json()["job"]
+        self.assertEqual((job["status"], job["total"], job["processed"]), ("queued", 3, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+        call_command("process_invoice_jobs", "--once", "--batch-size", "2", stdout=StringIO())
+
+        job = self.client.get(f"/invoice/bulk/{job['job_id']}/").json()["job"]
+        self.assertEqual((job["status"], job["processed"], job["progress"]), ("completed", 3, 100.0))
+        self.assertEqual(job["summary"], {"total_attempted": 3, "successful": 3, "failed": 0, "emailed": 2})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ["one@example.com", "two@example.com"])
+
+    def test_batches_read_latest_payments_in_one_query(self):
+        memberships = list(Membership.objects.select_related("member", "plan"))
+        with self.assertNumQueries(1):
+            result = InvoiceService.invoice_batch(memberships, send_email=False)
+        self.assertEqual(len(result["details"]), 3)
+
+    def test_a_job_keeps_counters_and_the_first_errors(self):
+        InvoiceJobService.enqueue([member.id for member in self.members])
+        job = InvoiceJobService.claim()
+
+        with patch("payments.invoice_jobs.MAX_JOB_ERRORS", 2), \
+                patch.object(InvoiceService, "generate_invoice_data", side_effect=ValueError("no plan price")):
+            InvoiceJobService.run(job, batch_size=1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.succeeded, job.failed), ("completed", 3, 0, 3))
+        self.assertEqual([error["member_id"] for error in job.errors], [member.id for member in self.members[:2]])
+
+    def test_a_job_is_claimed_once(self):
+        job = InvoiceJobService.enqueue([self.members[0].id])
+        self.assertEqual(InvoiceJobService.claim("a").pk, job.pk)
+        self.assertIsNone(InvoiceJobService.claim("b"))
+
+        # A worker that stopped reporting progress gives the job back
+        InvoiceJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(InvoiceJobService.requeue_stale(), 1)
+        self.assertEqual(InvoiceJobService.claim("b").worker, "b")
+
+
+class InvoiceRenderCacheTests(TestCase):
+    """Tests for the compiled invoice template and the render cache"""
+
+    def setUp(self):
+        cache.clear()
+        plan = MembershipPlan.objects.create(
+            plan_name="Indoor Monthly", plan_code="IN-M", membership_type="indoor", plan_type="monthly",
+        )
+        today = timezone.localdate()
+        self.member = Member.objects.create(first_name="<b>Amy", last_name="Member", email="amy@example.com")
+        membership = Membership.objects.create(
+            member=self.member, plan=plan, start_date=today, end_date=today + timedelta(days=30),
+            amount_paid=2500, total_sessions_allowed=12,
+        )
+        self.payment = Payment.objects.create(membership=membership, amount=2500)
+        user = get_user_model().objects.create_superuser("owner@example.com", "x")
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {AccessToken.for_user(user)}"
+        self.client.get(f"/invoice/{self.member.id}/preview/")  # records last activity
+
+    def test_repeated_previews_are_served_from_the_cache(self):
+        # User lookup and the membership with its latest payment; no render
+        with self.assertNumQueries(2):
+            data = self.client.get(f"/invoice/{self.member.id}/preview/").json()
+        self.assertEqual(data["invoice_data"]["payment"]["amount_due"], 2500.0)
+
+    def test_download_revalidates_with_etag(self):
+        url = f"/invoice/{self.member.id}/download/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        html = response.content.decode()
+        self.assertIn("KES 2,500.00", html)
+        self.assertIn("&lt;b&gt;Amy", html)
+
+        etag = response["ETag"]
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((not_modified.status_code, not_modified.content), (304, b""))
+
+        # Confirming the payment changes the invoice, and its address
+        self.payment.status = "completed"
+        self.payment.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertIn("Completed", changed.content.decode())
+
+
+class InvoicePDFTests(TestCase):
+    """Tests for streamed invoice PDFs and the ZIP export"""
+
+    def setUp(self):
+        cache.clear()
+        self.plan = MembershipPlan.objects.create(
+            plan_name="Outdoor Weekly", plan_code="OUT-W", membership_type="outdoor", plan_type="weekly",
+        )
+        self.member = self.join("Paula", amount=1500)
+        Payment.objects.create(membership=self.member.memberships.get(), amount=1500)
+        user = get_user_model().objects.create_superuser("owner@example.com", "x")
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {AccessToken.for_user(user)}"
+
+    def join(self, name, amount=1000, days_ago=0):
+        member = Member.objects.create(first_name=name, last_name="Member", email=f"{name.lower()}@example.com")
+        today = timezone.localdate()
+        membership = Membership.objects.create(
+            member=member, plan=self.plan, start_date=today, end_date=today + timedelta(days=7),
+            amount_paid=amount, total_sessions_allowed=2,
+        )
+        if days_ago:
+            Membership.objects.filter(pk=membership.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return member
+
+    def test_pdf_download_is_a_valid_document(self):
+        response = self.client.get(f"/invoice/{self.member.id}/pdf/")
+        self.assertEqual((response.status_code, response["Content-Type"]), (200, "application/pdf"))
+        pdf = b"".join(response.streaming_content)
+
+        self.assertTrue(pdf.startswith(b"%PDF-1.4"))
+        self.assertTrue(pdf.endswith(b"%%EOF\n"))
+        # Every cross-reference entry points at its object
+        start = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+        self.assertEqual(pdf[start:start + 4], b"xref")
+        for number, offset in enumerate(re.findall(rb"(\d{10}) 00000 n", pdf), 1):
+            self.assertTrue(pdf[int(offset):].startswith(b"%d 0 obj" % number))
+
+        not_modified = self.client.get(f"/invoice/{self.member.id}/pdf/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_export_streams_a_zip_for_the_range(self):
+        self.join("Quinn")                 # no payment yet
+        self.join("Older", days_ago=40)    # outside the range
+        today = timezone.localdate()
+        payments = Payment.objects.count()
+
+        response = self.client.get(f"/invoice/export/?start={today - timedelta(days=7)}&end={today}")
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+
+        self.assertEqual(len(archive.namelist()), 2)
+        self.assertIsNone(archive.testzip())
+        self.assertTrue(all(archive.read(name).startswith(b"%PDF") for name in archive.namelist()))
+        # Exporting writes nothing
+        self.assertEqual(Payment.objects.count(), payments)
+
+    def test_export_rejects_bad_ranges(self):
+        self.assertEqual(self.client.get("/invoice/export/?start=2025-02-01").status_code, 400)
+        self.assertEqual(self.client.get("/invoice/export/?start=2025-02-01&end=2025-01-01").status_code, 400)
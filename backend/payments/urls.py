@@ -15,8 +15,11 @@ from .views_due import (
 from .views_invoice import (
     send_invoice,
     send_bulk_invoices,
+    bulk_invoice_status,
     preview_invoice,
     download_invoice,
+    download_invoice_pdf,
+    export_invoices,
 )
 from . import views
 
@@ -43,7 +46,10 @@ urlpatterns = [
 
     # INVOICE ENDPOINTS
     path("invoice/bulk/", send_bulk_invoices, name="send-bulk-invoices"),
+    path("invoice/bulk/<uuid:job_id>/", bulk_invoice_status, name="bulk-invoice-status"),
+    path("invoice/export/", export_invoices, name="export-invoices"),
     path("invoice/<str:member_id>/", send_invoice, name="send-invoice"),
     path("invoice/<str:member_id>/preview/", preview_invoice, name="preview-invoice"),
     path("invoice/<str:member_id>/download/", download_invoice, name="download-invoice"),
+    path("invoice/<str:member_id>/pdf/", download_invoice_pdf, name="download-invoice-pdf"),
 ]
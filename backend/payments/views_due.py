@@ -1,133 +1,207 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from accounts.permissions import IsSuperAdminPermission
-from django.db.models import Q, Sum, Count
+from django.db.models import (
+    Case, CharField, Count, DateField, DurationField, ExpressionWrapper, F, Q, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import timedelta
 from memberships.models import Membership
+from .ledger import LedgerService
 from .models import Payment
 
 
+def _days_between(later, earlier):
+    """SQL date difference (a DurationField, whole days)"""
+    return ExpressionWrapper(later - earlier, output_field=DurationField())
+
+
+def _search(queryset, search):
+    if not search:
+        return queryset
+    return queryset.filter(
+        Q(member__first_name__icontains=search)
+        | Q(member__last_name__icontains=search)
+        | Q(member__email__icontains=search)
+        | Q(member__id__icontains=search)
+    )
+
+
+def _page_params(request):
+    page = max(int(request.GET.get("page", 1)), 1)
+    limit = max(int(request.GET.get("limit", 50)), 1)
+    return page, limit
+
+
+def _pagination(page, limit, total):
+    return {
+        "page": page,
+        "limit": limit,
+        "total_pages": (total + limit - 1) // limit,
+        "has_next": page * limit < total,
+        "has_previous": page > 1,
+    }
+
+
+def annotate_due_status(queryset, today):
+    """
+    Payment due bucket and days overdue by end date, computed in SQL
+
+    due_status: overdue (ended), due_today, due_soon (within 7 days) or current
+    """
+    today_value = Value(today, output_field=DateField())
+    return queryset.annotate(
+        due_status=Case(
+            When(end_date__lt=today, then=Value("overdue")),
+            When(end_date=today, then=Value("due_today")),
+            When(end_date__lte=today + timedelta(days=7), then=Value("due_soon")),
+            default=Value("current"),
+            output_field=CharField(),
+        ),
+        days_overdue=Case(
+            When(end_date__lt=today, then=_days_between(today_value, F("end_date"))),
+            default=Value(timedelta(0)),
+            output_field=DurationField(),
+        ),
+    )
+
+
+def annotate_renewal_urgency(queryset, today):
+    """
+    Renewal urgency and days until expiry, computed in SQL
+
+    urgency: critical (within 7 days), high (15), medium (30) or low
+    """
+    return queryset.annotate(
+        urgency=Case(
+            When(end_date__lte=today + timedelta(days=7), then=Value("critical")),
+            When(end_date__lte=today + timedelta(days=15), then=Value("high")),
+            When(end_date__lte=today + timedelta(days=30), then=Value("medium")),
+            default=Value("low"),
+            output_field=CharField(),
+        ),
+        days_until_expiry=_days_between(F("end_date"), Value(today, output_field=DateField())),
+    )
+
+
+def serialize_payment_due(membership):
+    member, plan = membership.member, membership.plan
+    amount = float(membership.amount_paid)
+    outstanding = float(membership.outstanding)
+    due_date = membership.end_date.isoformat()
+    days_overdue = membership.days_overdue.days
+    return {
+        "id": membership.id,
+        "member_id": member.id,
+        "first_name": member.first_name,
+        "last_name": member.last_name,
+        "firstName": member.first_name,  # Frontend expects camelCase
+        "lastName": member.last_name,  # Frontend expects camelCase
+        "email": member.email,
+        "phone": member.phone,
+        "membership_type": plan.membership_type,
+        "membershipType": plan.membership_type,  # Frontend expects camelCase
+        "plan_type": plan.plan_name,
+        "planType": plan.plan_name,  # Frontend expects camelCase
+        "amount": amount,
+        "due_date": due_date,
+        "dueDate": due_date,  # Frontend expects camelCase
+        "status": membership.due_status,
+        "days_overdue": days_overdue,
+        "daysOverdue": days_overdue,  # Frontend expects camelCase
+        "total_outstanding": outstanding,
+        "totalOutstanding": outstanding,  # Frontend expects camelCase
+        "invoice_number": f"INV-{membership.id}",
+        "invoiceNumber": f"INV-{membership.id}",  # Frontend expects camelCase
+        "payment_method": "M-Pesa",  # Default
+        "paymentMethod": "M-Pesa",  # Frontend expects camelCase
+    }
+
+
+def serialize_renewal_due(membership):
+    member, plan = membership.member, membership.plan
+    expiry_date = membership.end_date.isoformat()
+    last_renewal = membership.created_at.date().isoformat()
+    days_until_expiry = membership.days_until_expiry.days
+    return {
+        "id": membership.id,
+        "member_id": member.id,
+        "first_name": member.first_name,
+        "last_name": member.last_name,
+        "firstName": member.first_name,  # Frontend expects camelCase
+        "lastName": member.last_name,  # Frontend expects camelCase
+        "email": member.email,
+        "phone": member.phone,
+        "membership_type": plan.membership_type,
+        "membershipType": plan.membership_type,  # Frontend expects camelCase
+        "current_plan": plan.plan_name,
+        "currentPlan": plan.plan_name,  # Frontend expects camelCase
+        "amount": float(membership.amount_paid),
+        "expiry_date": expiry_date,
+        "expiryDate": expiry_date,  # Frontend expects camelCase
+        "urgency": membership.urgency,
+        "days_until_expiry": days_until_expiry,
+        "daysUntilExpiry": days_until_expiry,  # Frontend expects camelCase
+        "last_renewal": last_renewal,
+        "lastRenewal": last_renewal,  # Frontend expects camelCase
+        "total_renewals": 1,  # Could be calculated from payment history
+        "totalRenewals": 1,  # Frontend expects camelCase
+        "preferred_contact": "sms",  # Default
+        "preferredContact": "sms",  # Frontend expects camelCase
+    }
+
+
 @api_view(["GET"])
 def list_payments_due(request):
-    """List all payments due with comprehensive stats"""
+    """
+    List all payments due with comprehensive stats
+
+    Classification, the status filter, stats and the page are all computed
+    in the database: two queries whatever the number of memberships owing.
+    Outstanding amounts are the ledger balances (the plan price for
+    memberships the ledger has not picked up yet).
+    """
     try:
         # Query parameters
         search = request.GET.get("search", "")
         status_filter = request.GET.get("status", "")
-        page = int(request.GET.get("page", 1))
-        limit = int(request.GET.get("limit", 50))
+        page, limit = _page_params(request)
 
-        # Base queryset - memberships with pending/overdue payments
-        queryset = (
-            Membership.objects.filter(payment_status__in=["pending", "overdue"])
-            .select_related("member", "plan")
-            .order_by("-created_at")
-        )
-
-        # Apply search filter
-        if search:
-            queryset = queryset.filter(
-                Q(member__first_name__icontains=search)
-                | Q(member__last_name__icontains=search)
-                | Q(member__email__icontains=search)
-                | Q(member__id__icontains=search)
-            )
-
-        # Calculate payment status based on expiry date
+        # Memberships with pending/overdue payments
         today = timezone.now().date()
+        queryset = annotate_due_status(
+            _search(Membership.objects.filter(payment_status__in=["pending", "overdue"]), search),
+            today,
+        ).annotate(outstanding=Coalesce("ledger_balance__balance", "amount_paid"))
+
+        # Overdue and due-today counts cover every status; the rest follow the filter
+        selected = Q(due_status=status_filter) if status_filter else Q()
+        stats = queryset.aggregate(
+            total=Count("id", filter=selected),
+            overdue=Count("id", filter=Q(due_status="overdue")),
+            due_today=Count("id", filter=Q(due_status="due_today")),
+            due_soon=Count("id", filter=selected & Q(due_status="due_soon")),
+            total_outstanding=Sum("outstanding", filter=selected),
+        )
+        total = stats["total"]
+        stats["total_outstanding"] = float(stats["total_outstanding"] or 0)
+        stats["average_amount"] = stats["total_outstanding"] / total if total else 0
 
-        payments_due = []
-        total_outstanding = 0
-        overdue_count = 0
-        due_today_count = 0
-
-        for membership in queryset:
-            expiry_date = membership.end_date
-            if expiry_date:
-                days_diff = (expiry_date - today).days
-
-                # Determine status
-                if days_diff < 0:
-                    payment_status = "overdue"
-                    days_overdue = abs(days_diff)
-                    overdue_count += 1
-                elif days_diff == 0:
-                    payment_status = "due_today"
-                    days_overdue = 0
-                    due_today_count += 1
-                elif days_diff <= 7:
-                    payment_status = "due_soon"
-                    days_overdue = 0
-                else:
-                    payment_status = "current"
-                    days_overdue = 0
-
-                # Apply status filter
-                if status_filter and payment_status != status_filter:
-                    continue
-
-                amount = float(membership.amount_paid)
-                total_outstanding += amount
-
-                payment_data = {
-                    "id": membership.id,
-                    "member_id": membership.member.id,
-                    "first_name": membership.member.first_name,
-                    "last_name": membership.member.last_name,
-                    "firstName": membership.member.first_name,  # Frontend expects camelCase
-                    "lastName": membership.member.last_name,  # Frontend expects camelCase
-                    "email": membership.member.email,
-                    "phone": membership.member.phone,
-                    "membership_type": membership.plan.membership_type,
-                    "membershipType": membership.plan.membership_type,  # Frontend expects camelCase
-                    "plan_type": membership.plan.plan_name,
-                    "planType": membership.plan.plan_name,  # Frontend expects camelCase
-                    "amount": amount,
-                    "due_date": expiry_date.isoformat(),
-                    "dueDate": expiry_date.isoformat(),  # Frontend expects camelCase
-                    "status": payment_status,
-                    "days_overdue": days_overdue,
-                    "daysOverdue": days_overdue,  # Frontend expects camelCase
-                    "total_outstanding": amount,
-                    "totalOutstanding": amount,  # Frontend expects camelCase
-                    "invoice_number": f"INV-{membership.id}",
-                    "invoiceNumber": f"INV-{membership.id}",  # Frontend expects camelCase
-                    "payment_method": "M-Pesa",  # Default
-                    "paymentMethod": "M-Pesa",  # Frontend expects camelCase
-                }
-                payments_due.append(payment_data)
-
-        # Apply pagination
         start_idx = (page - 1) * limit
-        end_idx = start_idx + limit
-        paginated_data = payments_due[start_idx:end_idx]
-
-        # Calculate comprehensive stats
-        stats = {
-            "total": len(payments_due),
-            "overdue": overdue_count,
-            "due_today": due_today_count,
-            "due_soon": len([p for p in payments_due if p["status"] == "due_soon"]),
-            "total_outstanding": total_outstanding,
-            "average_amount": (
-                total_outstanding / len(payments_due) if payments_due else 0
-            ),
-        }
+        memberships = (
+            queryset.filter(selected)
+            .select_related("member", "plan")
+            .order_by("-created_at", "-id")[start_idx:start_idx + limit]
+        )
 
         return Response(
             {
                 "success": True,
-                "results": paginated_data,
-                "count": len(payments_due),
+                "results": [serialize_payment_due(membership) for membership in memberships],
+                "count": total,
                 "stats": stats,
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total_pages": (len(payments_due) + limit - 1) // limit,
-                    "has_next": end_idx < len(payments_due),
-                    "has_previous": page > 1,
-                },
+                "pagination": _pagination(page, limit, total),
             }
         )
 
@@ -137,120 +211,54 @@ def list_payments_due(request):
 
 @api_view(["GET"])
 def list_renewals_due(request):
-    """List all renewals due with comprehensive stats"""
+    """
+    List all renewals due in the next 60 days with comprehensive stats
+
+    Urgency, the urgency filter, stats and the page are computed in the
+    database: two queries whatever the number of renewals.
+    """
     try:
         # Query parameters
         search = request.GET.get("search", "")
         urgency_filter = request.GET.get("urgency", "")
-        page = int(request.GET.get("page", 1))
-        limit = int(request.GET.get("limit", 50))
+        page, limit = _page_params(request)
 
         # Get memberships expiring in next 60 days
         today = timezone.now().date()
         future_date = today + timedelta(days=60)
-
-        queryset = (
-            Membership.objects.filter(end_date__lte=future_date, end_date__gte=today)
-            .select_related("member", "plan")
-            .order_by("end_date")
+        queryset = annotate_renewal_urgency(
+            _search(Membership.objects.filter(end_date__lte=future_date, end_date__gte=today), search),
+            today,
         )
 
-        # Apply search filter
-        if search:
-            queryset = queryset.filter(
-                Q(member__first_name__icontains=search)
-                | Q(member__last_name__icontains=search)
-                | Q(member__email__icontains=search)
-                | Q(member__id__icontains=search)
-            )
-
-        renewals_due = []
-        total_revenue = 0
-        critical_count = 0
-        high_count = 0
-        medium_count = 0
-
-        for membership in queryset:
-            expiry_date = membership.end_date
-            days_until_expiry = (expiry_date - today).days
-
-            # Determine urgency
-            if days_until_expiry <= 7:
-                urgency = "critical"
-                critical_count += 1
-            elif days_until_expiry <= 15:
-                urgency = "high"
-                high_count += 1
-            elif days_until_expiry <= 30:
-                urgency = "medium"
-                medium_count += 1
-            else:
-                urgency = "low"
-
-            # Apply urgency filter
-            if urgency_filter and urgency != urgency_filter:
-                continue
-
-            amount = float(membership.amount_paid)
-            total_revenue += amount
-
-            renewal_data = {
-                "id": membership.id,
-                "member_id": membership.member.id,
-                "first_name": membership.member.first_name,
-                "last_name": membership.member.last_name,
-                "firstName": membership.member.first_name,  # Frontend expects camelCase
-                "lastName": membership.member.last_name,  # Frontend expects camelCase
-                "email": membership.member.email,
-                "phone": membership.member.phone,
-                "membership_type": membership.plan.membership_type,
-                "membershipType": membership.plan.membership_type,  # Frontend expects camelCase
-                "current_plan": membership.plan.plan_name,
-                "currentPlan": membership.plan.plan_name,  # Frontend expects camelCase
-                "amount": amount,
-                "expiry_date": expiry_date.isoformat(),
-                "expiryDate": expiry_date.isoformat(),  # Frontend expects camelCase
-                "urgency": urgency,
-                "days_until_expiry": days_until_expiry,
-                "daysUntilExpiry": days_until_expiry,  # Frontend expects camelCase
-                "last_renewal": membership.created_at.date().isoformat(),
-                "lastRenewal": membership.created_at.date().isoformat(),  # Frontend expects camelCase
-                "total_renewals": 1,  # Could be calculated from payment history
-                "totalRenewals": 1,  # Frontend expects camelCase
-                "preferred_contact": "sms",  # Default
-                "preferredContact": "sms",  # Frontend expects camelCase
-            }
-            renewals_due.append(renewal_data)
+        # Urgency counts cover every urgency; totals follow the filter
+        selected = Q(urgency=urgency_filter) if urgency_filter else Q()
+        stats = queryset.aggregate(
+            total=Count("id", filter=selected),
+            critical=Count("id", filter=Q(urgency="critical")),
+            high=Count("id", filter=Q(urgency="high")),
+            medium=Count("id", filter=Q(urgency="medium")),
+            low=Count("id", filter=Q(urgency="low")),
+            total_revenue=Sum("amount_paid", filter=selected),
+        )
+        total = stats["total"]
+        stats["total_revenue"] = float(stats["total_revenue"] or 0)
+        stats["average_amount"] = stats["total_revenue"] / total if total else 0
 
-        # Apply pagination
         start_idx = (page - 1) * limit
-        end_idx = start_idx + limit
-        paginated_data = renewals_due[start_idx:end_idx]
-
-        # Calculate comprehensive stats
-        stats = {
-            "total": len(renewals_due),
-            "critical": critical_count,
-            "high": high_count,
-            "medium": medium_count,
-            "low": len(renewals_due) - critical_count - high_count - medium_count,
-            "total_revenue": total_revenue,
-            "average_amount": total_revenue / len(renewals_due) if renewals_due else 0,
-        }
+        memberships = (
+            queryset.filter(selected)
+            .select_related("member", "plan")
+            .order_by("end_date", "id")[start_idx:start_idx + limit]
+        )
 
         return Response(
             {
                 "success": True,
-                "results": paginated_data,
-                "count": len(renewals_due),
+                "results": [serialize_renewal_due(membership) for membership in memberships],
+                "count": total,
                 "stats": stats,
-                "pagination": {
-                    "page": page,
-                    "limit": limit,
-                    "total_pages": (len(renewals_due) + limit - 1) // limit,
-                    "has_next": end_idx < len(renewals_due),
-                    "has_previous": page > 1,
-                },
+                "pagination": _pagination(page, limit, total),
             }
         )
 
@@ -276,16 +284,11 @@ def payment_stats(request):
         else:
             start_date = today - timedelta(days=30)
 
-        # Get payment statistics
-        payments = Payment.objects.filter(created_at__date__gte=start_date)
-
-        total_revenue = (
-            payments.filter(status="completed").aggregate(total=Sum("amount"))["total"]
-            or 0
-        )
-
-        total_payments = payments.filter(status="completed").count()
-        pending_payments = payments.filter(status="pending").count()
+        # Money received, from the ledger's daily summaries
+        revenue = LedgerService.revenue_between(start_date, today)
+        pending_payments = Payment.objects.filter(
+            created_at__date__gte=start_date, status="pending"
+        ).count()
 
         # Get overdue payments
         overdue_memberships = Membership.objects.filter(
@@ -293,8 +296,8 @@ def payment_stats(request):
         ).count()
 
         stats = {
-            "total_revenue": float(total_revenue),
-            "total_payments": total_payments,
+            "total_revenue": float(revenue["received"]),
+            "total_payments": revenue["payments"],
             "pending_payments": pending_payments,
             "overdue_payments": overdue_memberships,
             "timeframe": timeframe,
@@ -3,12 +3,31 @@ from rest_framework.response import Response
 from accounts.permissions import IsAdminPermission
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+from datetime import date
 from memberships.models import Membership
+from .invoice_jobs import InvoiceJobService
+from .invoice_pdf import InvoicePDF, iter_zip
 from .invoice_service import InvoiceService
+from .models import InvoiceJob
 import json
 
 
+def _revalidate(request, etag):
+    """A 304 for a client that already has this version of an invoice, else None"""
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return HttpResponseNotModified()
+    return None
+
+
+def _cache_headers(response, etag):
+    response['ETag'] = etag
+    # Cached by the browser, but revalidated on every download
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @api_view(['POST'])
 def send_invoice(request, member_id):
     """Send invoice to a specific member"""
@@ -65,7 +84,12 @@ def send_invoice(request, member_id):
 
 @api_view(['POST'])
 def send_bulk_invoices(request):
-    """Send invoices to multiple members"""
+    """
+    Queue invoices for multiple members
+
+    The invoices are generated and sent by the process_invoice_jobs worker;
+    poll the returned status_url for progress.
+    """
     try:
         data = request.data
         member_ids = data.get('member_ids', [])
@@ -73,32 +97,26 @@ def send_bulk_invoices(request):
         message = data.get('message', '')
         urgency = data.get('urgency', 'normal')
 
-        if not member_ids:
+        if not member_ids or not isinstance(member_ids, list):
             return Response({
                 'success': False,
                 'error': 'No member IDs provided'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Send bulk invoices
-        results = InvoiceService.send_bulk_invoices(member_ids, send_email)
+        job = InvoiceJobService.enqueue(member_ids, send_email, message)
 
         response_data = {
             'success': True,
-            'message': f'Bulk invoice operation completed',
-            'summary': {
-                'total_attempted': len(member_ids),
-                'successful': results['success'],
-                'failed': results['failed']
-            },
-            'details': results['details'],
-            'errors': results['errors']
+            'message': f'Invoices queued for {len(job.member_ids)} members',
+            'job': InvoiceJobService.status(job),
+            'status_url': request.build_absolute_uri(f'{job.job_id}/'),
         }
 
         # Add custom message to response if provided
         if message:
             response_data['custom_message'] = message
 
-        return Response(response_data, status=status.HTTP_200_OK)
+        return Response(response_data, status=status.HTTP_202_ACCEPTED)
 
     except Exception as e:
         return Response({
@@ -107,34 +125,40 @@ def send_bulk_invoices(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+def bulk_invoice_status(request, job_id):
+    """Progress and results of a bulk invoice job"""
+    job = get_object_or_404(InvoiceJob, job_id=job_id)
+    return Response({'success': True, 'job': InvoiceJobService.status(job)})
+
+
 @api_view(['GET'])
 @permission_classes([IsAdminPermission])
 def preview_invoice(request, member_id):
     """Preview invoice for a member without sending"""
     try:
         # Get membership
-        membership = get_object_or_404(Membership, member__id=member_id)
-
-        # Generate invoice data only (don't send email)
-        result = InvoiceService.create_and_send_invoice(membership, send_email=False)
-
-        if result['success']:
-            return Response({
-                'success': True,
-                'invoice_data': result['invoice_data'],
-                'member': {
-                    'id': membership.member_id,
-                    'name': f"{membership.member.first_name} {membership.member.last_name}",
-                    'email': membership.member.email
-                }
-            }, status=status.HTTP_200_OK)
+        membership = InvoiceService.invoice_memberships().get(member__id=member_id)
 
-        else:
+        # Invoice data only (don't send email), from the render cache when unchanged
+        try:
+            invoice_data, _, _ = InvoiceService.get_invoice(membership)
+        except Exception as e:
             return Response({
                 'success': False,
-                'error': result['error']
+                'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+        return Response({
+            'success': True,
+            'invoice_data': invoice_data,
+            'member': {
+                'id': membership.member_id,
+                'name': f"{membership.member.first_name} {membership.member.last_name}",
+                'email': membership.member.email
+            }
+        }, status=status.HTTP_200_OK)
+
     except Membership.DoesNotExist:
         return Response({
             'success': False,
@@ -151,29 +175,69 @@ def preview_invoice(request, member_id):
 @api_view(['GET'])
 @permission_classes([IsAdminPermission])
 def download_invoice(request, member_id):
-    """Download invoice as HTML file"""
+    """
+    Download invoice as HTML file
+
+    The ETag is the invoice's content address, so a client that already has
+    this version gets a 304 without the invoice being rendered or read
+    from the cache.
+    """
     try:
         # Get membership
-        membership = get_object_or_404(Membership, member__id=member_id)
-
-        # Generate invoice HTML
-        result = InvoiceService.create_and_send_invoice(membership, send_email=False)
-
-        if result['success']:
-            invoice_html = result['invoice_html']
-            invoice_number = result['invoice_data']['invoice_number']
+        membership = InvoiceService.invoice_memberships().get(member__id=member_id)
+
+        etag = quote_etag(InvoiceService.invoice_etag(membership))
+        response = _revalidate(request, etag)
+        if response is None:
+            try:
+                invoice_data, invoice_html, _ = InvoiceService.get_invoice(membership)
+            except Exception as e:
+                return Response({
+                    'success': False,
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
 
             # Create HTTP response with HTML content
             response = HttpResponse(invoice_html, content_type='text/html')
-            response['Content-Disposition'] = f'attachment; filename="invoice_{invoice_number}.html"'
+            response['Content-Disposition'] = f'attachment; filename="invoice_{invoice_data["invoice_number"]}.html"'
 
-            return response
+        return _cache_headers(response, etag)
 
-        else:
-            return Response({
-                'success': False,
-                'error': result['error']
-            }, status=status.HTTP_400_BAD_REQUEST)
+    except Membership.DoesNotExist:
+        return Response({
+            'success': False,
+            'error': 'Member not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    except Exception as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminPermission])
+def download_invoice_pdf(request, member_id):
+    """Download invoice as a PDF, streamed, with the same revalidation as download_invoice"""
+    try:
+        membership = InvoiceService.invoice_memberships().get(member__id=member_id)
+
+        etag = quote_etag(f"pdf-{InvoiceService.invoice_etag(membership)}")
+        response = _revalidate(request, etag)
+        if response is None:
+            try:
+                invoice_data, _, _ = InvoiceService.get_invoice(membership)
+            except Exception as e:
+                return Response({
+                    'success': False,
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            response = StreamingHttpResponse(InvoicePDF.iter_pdf(invoice_data), content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="invoice_{invoice_data["invoice_number"]}.pdf"'
+
+        return _cache_headers(response, etag)
 
     except Membership.DoesNotExist:
         return Response({
@@ -185,4 +249,41 @@ def download_invoice(request, member_id):
         return Response({
             'success': False,
             'error': str(e)
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminPermission])
+def export_invoices(request):
+    """
+    Export the invoices of memberships created from ?start= to ?end=
+    (YYYY-MM-DD, inclusive) as a ZIP of PDFs
+
+    The archive is streamed: invoices are generated a batch at a time as it
+    is sent, so memory use does not grow with the number of invoices.
+    """
+    try:
+        start = date.fromisoformat(request.GET.get('start', ''))
+        end = date.fromisoformat(request.GET.get('end', ''))
+    except ValueError:
+        return Response({
+            'success': False,
+            'error': 'start and end must be dates (YYYY-MM-DD)'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if start > end:
+        return Response({
+            'success': False,
+            'error': 'start must not be after end'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    entries = (
+        (
+            f"{invoice_data['invoice_number']}-{membership.pk}.pdf",
+            invoice_data['issue_date'].timetuple()[:6],
+            InvoicePDF.render(invoice_data),
+        )
+        for membership, invoice_data in InvoiceService.invoices_between(start, end)
+    )
+    response = StreamingHttpResponse(iter_zip(entries), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="invoices_{start}_{end}.zip"'
+    return response
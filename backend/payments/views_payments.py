@@ -3,9 +3,11 @@ from rest_framework.response import Response
 from accounts.permissions import IsAdminPermission
 from rest_framework import status
 from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from .models import Payment, PaymentMethod
 from memberships.models import Membership
+from ptf.pagination import PaginationHelper
 
 
 @api_view(["POST"])
@@ -107,13 +109,13 @@ def list_pending_payments_detailed(request):
 @api_view(["GET"])
 @permission_classes([IsAdminPermission])
 def list_completed_payments(request):
-    """List completed payments - use existing fields only"""
+    """List completed payments, most recently completed first"""
     try:
         completed_payments = (
             Payment.objects.filter(status="completed")
             .select_related("membership__member", "membership__plan", "payment_method")
-            .order_by("-updated_at")
-        )  # Use updated_at instead of completed_at
+            .order_by(F("completed_at").desc(nulls_last=True), "-updated_at")
+        )
 
         payments_data = []
         for payment in completed_payments:
@@ -126,7 +128,7 @@ def list_completed_payments(request):
                 "payment_method": (
                     payment.payment_method.name if payment.payment_method else "Unknown"
                 ),
-                "completed_at": payment.updated_at.isoformat(),  # Use updated_at
+                "completed_at": (payment.completed_at or payment.updated_at).isoformat(),
                 "external_reference": getattr(payment, "external_reference", "") or "",
             }
             payments_data.append(payment_info)
@@ -223,32 +225,49 @@ def record_manual_payment(request):
         return Response({"error": str(e)}, status=500)
 
 
+def serialize_payment_list_item(payment):
+    """Serialize a payment row for the payments list endpoints"""
+    member = payment.membership.member
+    plan = payment.membership.plan
+
+    return {
+        "payment_id": str(payment.payment_id),
+        "member_name": f"{member.first_name} {member.last_name}",
+        "plan_name": plan.plan_name,
+        "amount": str(payment.amount),
+        "payment_method": (
+            payment.payment_method.name if payment.payment_method else "Unknown"
+        ),
+        "status": payment.status,
+        "created_at": payment.created_at.isoformat(),
+    }
+
+
 @api_view(["GET"])
 @permission_classes([IsAdminPermission])
 def list_all_payments(request):
-    """List all payments"""
+    """
+    List all payments
+    Pass ?pagination=cursor (then ?cursor=<next_cursor>) for keyset pagination
+    """
     try:
         payments = Payment.objects.select_related(
             "membership__member", "membership__plan", "payment_method"
         ).order_by("-created_at")
 
-        payments_data = []
-        for payment in payments:
-            member = payment.membership.member
-            plan = payment.membership.plan
+        if PaginationHelper.is_cursor_request(request):
+            response = PaginationHelper.create_cursor_paginated_response(
+                request,
+                payments,
+                serialize_payment_list_item,
+                ordering=("created_at", "id"),
+                success_message="Retrieved payments successfully",
+            )
+            # Add backward compatibility field
+            response.data["payments"] = response.data["data"]
+            return response
 
-            payment_info = {
-                "payment_id": str(payment.payment_id),
-                "member_name": f"{member.first_name} {member.last_name}",
-                "plan_name": plan.plan_name,
-                "amount": str(payment.amount),
-                "payment_method": (
-                    payment.payment_method.name if payment.payment_method else "Unknown"
-                ),
-                "status": payment.status,
-                "created_at": payment.created_at.isoformat(),
-            }
-            payments_data.append(payment_info)
+        payments_data = [serialize_payment_list_item(payment) for payment in payments]
 
         return Response(
             {"success": True, "payments": payments_data, "count": len(payments_data)}
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ptf.settings')
 
 application = get_asgi_application()
+
+# Warm the front-desk member lookup cache so the first check-in search is fast
+from members.lookup import warm_lookup_cache  # noqa: E402
+
+warm_lookup_cache()
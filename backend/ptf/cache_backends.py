@@ -0,0 +1,182 @@
+"""
+SQLite cache backend
+
+A cache shared by every worker process on the host without an external
+service: entries live in their own SQLite file (WAL mode), separate from
+the application database so cache writes never wait on it.
+
+Writes run in BEGIN IMMEDIATE transactions, so add() and incr() are
+atomic across processes - the refresh locks in ptf.caching and the change
+counters (front-desk lookup, member search) rely on that.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "ptf.cache_backends.SQLiteCache",
+            "LOCATION": "/var/cache/ptf/cache.sqlite3",
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        }
+    }
+"""
+
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+LIVE = '(expires IS NULL OR expires > ?)'
+
+# Share of set() calls that also purge expired entries
+CULL_PROBABILITY = 0.01
+
+# SQLite's default limit on bound parameters is 999
+MAX_PARAMS = 500
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    @staticmethod
+    def _dumps(value):
+        return sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    def _upsert(self, conn, key, value, timeout):
+        conn.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires',
+            (key, self._dumps(value), self.get_backend_timeout(timeout)),
+        )
+
+    def _cull(self, conn):
+        conn.execute(f'DELETE FROM cache WHERE NOT {LIVE}', (time.time(),))
+        count = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries and self._cull_frequency:
+            # Drop the entries closest to expiry (non-expiring ones last)
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            f'SELECT value FROM cache WHERE key = ? AND {LIVE}', (key, time.time())
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        stored = list(key_map)
+        result = {}
+        for i in range(0, len(stored), MAX_PARAMS):
+            chunk = stored[i:i + MAX_PARAMS]
+            rows = self._connection().execute(
+                f'SELECT key, value FROM cache WHERE key IN ({",".join("?" * len(chunk))}) AND {LIVE}',
+                (*chunk, time.time()),
+            )
+            for key, value in rows:
+                result[key_map[key]] = pickle.loads(value)
+        return result
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {LIVE}', (key, time.time())
+        ).fetchone() is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as conn:
+            self._upsert(conn, key, value, timeout)
+            if random.random() < CULL_PROBABILITY:
+                self._cull(conn)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as conn:
+            for key, value in data.items():
+                self._upsert(conn, self.make_and_validate_key(key, version=version), value, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as conn:
+            conn.execute(f'DELETE FROM cache WHERE key = ? AND NOT {LIVE}', (key, time.time()))
+            cursor = conn.execute(
+                'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) ON CONFLICT(key) DO NOTHING',
+                (key, self._dumps(value), self.get_backend_timeout(timeout)),
+            )
+            return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as conn:
+            cursor = conn.execute(
+                f'UPDATE cache SET expires = ? WHERE key = ? AND {LIVE}',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            )
+            return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as conn:
+            row = conn.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {LIVE}', (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            conn.execute('UPDATE cache SET value = ? WHERE key = ?', (self._dumps(value), key))
+            return value
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._write() as conn:
+            return conn.execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        keys = [(self.make_and_validate_key(key, version=version),) for key in keys]
+        if keys:
+            with self._write() as conn:
+                conn.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    def clear(self):
+        with self._write() as conn:
+            conn.execute('DELETE FROM cache')
@@ -0,0 +1,121 @@
+"""
+Stale-while-revalidate caching for expensive aggregates
+
+get_or_compute() stores a value with two lifetimes:
+
+- soft TTL: while fresh, the cached value is returned as is
+- hard TTL: once past the soft TTL but before the cache drops it, the stale
+  value is still returned immediately and a single background refresh
+  recomputes it
+
+A refresh lock (cache.add) makes sure only one caller recomputes a key at
+a time, so an expiring dashboard key does not make every worker run the
+same aggregates at once. Callers that miss the cache entirely while
+another caller computes it wait briefly for that result instead.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = '{}:refresh'
+
+# A crashed refresh releases its lock after this long
+LOCK_TIMEOUT = 60
+
+# Default hard TTL, as a multiple of the soft TTL
+HARD_TTL_FACTOR = 6
+
+# How long a cache miss waits for another caller's computation
+WAIT_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+
+_refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+
+
+def _entry(value, soft_ttl):
+    return (time.time() + soft_ttl, value)
+
+
+def _is_entry(entry):
+    return isinstance(entry, tuple) and len(entry) == 2
+
+
+def _refresh(key, compute, soft_ttl, hard_ttl):
+    try:
+        value = compute()
+        cache.set(key, _entry(value, soft_ttl), hard_ttl)
+        return value
+    finally:
+        cache.delete(LOCK_KEY.format(key))
+
+
+def _refresh_in_background(key, compute, soft_ttl, hard_ttl):
+    def run():
+        try:
+            _refresh(key, compute, soft_ttl, hard_ttl)
+        except Exception:
+            logger.exception(f"Background refresh of cache key {key} failed")
+        finally:
+            connections.close_all()
+
+    if getattr(settings, 'CACHE_BACKGROUND_REFRESH', True):
+        _refresher.submit(run)
+    else:
+        run()
+
+
+def ttl(namespace, default=300):
+    """Configured freshness in seconds for a cache namespace (settings.CACHE_TTLS)"""
+    return getattr(settings, 'CACHE_TTLS', {}).get(namespace, default)
+
+
+def get_or_compute(key, compute, soft_ttl, hard_ttl=None):
+    """
+    Cached value of compute(), refreshed in the background once stale
+
+    Args:
+        key: Cache key
+        compute: Zero-argument callable producing the value
+        soft_ttl: Seconds the value is served without a refresh
+        hard_ttl: Seconds a stale value may still be served (default 6x soft_ttl)
+
+    Returns:
+        The cached, stale or freshly computed value
+    """
+    hard_ttl = hard_ttl or soft_ttl * HARD_TTL_FACTOR
+    entry = cache.get(key)
+    if _is_entry(entry):
+        fresh_until, value = entry
+        if time.time() >= fresh_until and cache.add(LOCK_KEY.format(key), True, LOCK_TIMEOUT):
+            _refresh_in_background(key, compute, soft_ttl, hard_ttl)
+        return value
+
+    if cache.add(LOCK_KEY.format(key), True, LOCK_TIMEOUT):
+        return _refresh(key, compute, soft_ttl, hard_ttl)
+
+    # Another caller is computing it - wait for that result
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if _is_entry(entry):
+            return entry[1]
+    logger.warning(f"Gave up waiting for cache key {key}; computing it here")
+    return compute()
+
+
+def store(key, value, soft_ttl, hard_ttl=None):
+    """Cache a value computed ahead of time (e.g. by a scheduled command) for get_or_compute()"""
+    cache.set(key, _entry(value, soft_ttl), hard_ttl or soft_ttl * HARD_TTL_FACTOR)
+
+
+def invalidate(*keys):
+    """Drop cached values so the next read recomputes them"""
+    cache.delete_many(keys)
@@ -3,9 +3,130 @@ Centralized pagination utilities for the PTF application.
 This module provides consistent pagination across all API endpoints.
 """
 
+import base64
+import hashlib
+import json
+import logging
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
 from rest_framework.response import Response
 
+logger = logging.getLogger(__name__)
+
+
+class CountStrategy:
+    """
+    Strategies for producing the total count of a paginated queryset.
+
+    - exact: plain COUNT(*) on every request
+    - cached: exact COUNT(*) cached per filter set, invalidated on model writes
+    - estimated: PostgreSQL planner row estimate (falls back to cached elsewhere,
+      and to exact when the estimate is small enough to count cheaply)
+    """
+
+    EXACT = 'exact'
+    CACHED = 'cached'
+    ESTIMATED = 'estimated'
+    CHOICES = (EXACT, CACHED, ESTIMATED)
+
+    CACHE_TIMEOUT = 300  # 5 minutes
+    ESTIMATE_EXACT_THRESHOLD = 1000  # Below this an exact count is cheap anyway
+
+    @staticmethod
+    def from_request(request, default=None):
+        """Read the ?count= parameter, falling back to the endpoint default"""
+        strategy = request.GET.get('count', default or CountStrategy.EXACT)
+        return strategy if strategy in CountStrategy.CHOICES else (default or CountStrategy.EXACT)
+
+    @staticmethod
+    def _version_key(model):
+        return f"paginated_count_version_{model._meta.label_lower}"
+
+    @staticmethod
+    def invalidate(model):
+        """Invalidate every cached count for querysets over this model"""
+        key = CountStrategy._version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    @staticmethod
+    def count(queryset, strategy):
+        """
+        Count a queryset using the requested strategy.
+
+        Returns:
+            tuple: (count, strategy actually used)
+        """
+        if strategy == CountStrategy.ESTIMATED:
+            estimate = CountStrategy._planner_estimate(queryset)
+            if estimate is None:
+                strategy = CountStrategy.CACHED
+            elif estimate < CountStrategy.ESTIMATE_EXACT_THRESHOLD:
+                return queryset.count(), CountStrategy.EXACT
+            else:
+                return estimate, CountStrategy.ESTIMATED
+
+        if strategy == CountStrategy.CACHED:
+            try:
+                sql, params = queryset.query.sql_with_params()
+            except EmptyResultSet:
+                return 0, CountStrategy.EXACT
+            version = cache.get(CountStrategy._version_key(queryset.model), 0)
+            digest = hashlib.md5(f"{sql}|{params!r}".encode()).hexdigest()
+            cache_key = f"paginated_count_{queryset.model._meta.label_lower}_{version}_{digest}"
+            total = cache.get(cache_key)
+            if total is None:
+                total = queryset.count()
+                cache.set(cache_key, total, CountStrategy.CACHE_TIMEOUT)
+            return total, CountStrategy.CACHED
+
+        return queryset.count(), CountStrategy.EXACT
+
+    @staticmethod
+    def _planner_estimate(queryset):
+        """Row estimate from EXPLAIN on PostgreSQL, None when unavailable"""
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        try:
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        except EmptyResultSet:
+            return 0
+        except Exception:
+            return None
+
+
+class StrategyPaginator(Paginator):
+    """Django Paginator whose total count comes from a CountStrategy"""
+
+    def __init__(self, object_list, per_page, count_strategy=CountStrategy.EXACT, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_strategy = count_strategy
+        self.count_strategy_used = None
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            self.count_strategy_used = CountStrategy.EXACT
+            return super().count
+        total, self.count_strategy_used = CountStrategy.count(
+            self.object_list, self.count_strategy
+        )
+        return total
+
 
 class PaginationHelper:
     """
@@ -14,9 +135,134 @@ class PaginationHelper:
     
     DEFAULT_PAGE_SIZE = 20
     MAX_PAGE_SIZE = 100
+    CURSOR_PARAM = 'cursor'
+    
+    @staticmethod
+    def is_cursor_request(request):
+        """
+        Check whether the client opted into cursor (keyset) pagination.
+        Either ?pagination=cursor (first page) or ?cursor=<token> (next pages).
+        """
+        return (
+            request.GET.get('pagination') == 'cursor'
+            or PaginationHelper.CURSOR_PARAM in request.GET
+        )
     
     @staticmethod
-    def paginate_queryset(request, queryset, default_page_size=None):
+    def encode_cursor(values, before=False):
+        """
+        Encode the ordering values of a boundary row into an opaque token.
+        A `before` token pages back to the rows preceding that row.
+        """
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        payload = json.dumps({'before': values} if before else values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(token, model, ordering):
+        """
+        Decode a cursor token back into typed ordering values.
+
+        Returns:
+            tuple: (values, before), or (None, False) for missing or malformed
+            tokens (treated as first page)
+        """
+        if not token:
+            return None, False
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            before = isinstance(values, dict)
+            if before:
+                values = values.get('before')
+            if not isinstance(values, list) or len(values) != len(ordering):
+                return None, False
+            return [
+                model._meta.get_field(field).to_python(value)
+                for field, value in zip(ordering, values)
+            ], before
+        except (ValueError, TypeError, ValidationError):
+            return None, False
+    
+    @staticmethod
+    def paginate_queryset_cursor(request, queryset, ordering, default_page_size=None):
+        """
+        Paginate a queryset with keyset (cursor) pagination.
+        
+        Rows are returned newest first over a stable ordering such as
+        ('registration_date', 'id'). Each page filters past the last row of the
+        previous page instead of using OFFSET, and no COUNT(*) is issued, so
+        page N costs the same as page 1. previous_cursor pages back the same
+        way, reading the preceding rows in ascending order.
+        
+        Args:
+            request: Django request object
+            queryset: Django queryset to paginate
+            ordering: Tuple of field names forming a unique ordering (last one must be unique)
+            default_page_size: Default page size if not specified (defaults to 20)
+        
+        Returns:
+            dict: Contains paginated data and cursor metadata
+        """
+        limit = PaginationHelper._get_page_size(request, default_page_size)
+        token = request.GET.get(PaginationHelper.CURSOR_PARAM, '')
+        values, before = PaginationHelper.decode_cursor(token, queryset.model, ordering)
+        lookup = 'gt' if before else 'lt'
+        
+        if values is not None:
+            # (a, b) < (x, y)  <=>  a < x OR (a = x AND b < y), generalised
+            keyset_filter = Q()
+            for i, field in enumerate(ordering):
+                condition = Q(**{f"{field}__{lookup}": values[i]})
+                for prev_field, prev_value in zip(ordering[:i], values[:i]):
+                    condition &= Q(**{prev_field: prev_value})
+                keyset_filter |= condition
+            queryset = queryset.filter(keyset_filter)
+        
+        queryset = queryset.order_by(*[field if before else f"-{field}" for field in ordering])
+        
+        # Fetch one extra row to know whether another page exists
+        rows = list(queryset[:limit + 1])
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if before:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, values is not None
+        
+        next_cursor = previous_cursor = None
+        if has_next and rows:
+            next_cursor = PaginationHelper.encode_cursor(
+                [getattr(rows[-1], field) for field in ordering]
+            )
+        if has_previous and rows:
+            previous_cursor = PaginationHelper.encode_cursor(
+                [getattr(rows[0], field) for field in ordering], before=True
+            )
+        
+        return {
+            'objects': rows,
+            'per_page': limit,
+            'cursor': token or None,
+            'next_cursor': next_cursor,
+            'previous_cursor': previous_cursor,
+            'has_next': has_next,
+            'has_previous': has_previous,
+        }
+    
+    @staticmethod
+    def _get_page_size(request, default_page_size=None):
+        """Read and clamp the page size from limit/page_size request parameters"""
+        default = default_page_size or PaginationHelper.DEFAULT_PAGE_SIZE
+        try:
+            limit = int(request.GET.get('limit', request.GET.get('page_size', default)))
+        except (ValueError, TypeError):
+            limit = default
+        return max(min(limit, PaginationHelper.MAX_PAGE_SIZE), 1)
+    
+    @staticmethod
+    def paginate_queryset(request, queryset, default_page_size=None, default_count_strategy=None):
         """
         Paginate a queryset based on request parameters.
         
@@ -24,6 +270,8 @@ class PaginationHelper:
             request: Django request object
             queryset: Django queryset to paginate
             default_page_size: Default page size if not specified (defaults to 20)
+            default_count_strategy: CountStrategy used when ?count= is not given
+                (defaults to exact)
         
         Returns:
             dict: Contains paginated data and metadata
@@ -48,7 +296,10 @@ class PaginationHelper:
         page = max(page, 1)    # Ensure minimum page of 1
         
         # Create paginator
-        paginator = Paginator(queryset, limit)
+        paginator = StrategyPaginator(
+            queryset, limit,
+            count_strategy=CountStrategy.from_request(request, default_count_strategy)
+        )
         
         try:
             paginated_data = paginator.page(page)
@@ -67,15 +318,78 @@ class PaginationHelper:
             'per_page': limit,
             'total_pages': paginator.num_pages,
             'total_count': paginator.count,
+            'count_strategy': paginator.count_strategy_used,
             'has_next': paginated_data.has_next(),
             'has_previous': paginated_data.has_previous(),
             'next_page': page + 1 if paginated_data.has_next() else None,
             'previous_page': page - 1 if paginated_data.has_previous() else None,
         }
     
+    @staticmethod
+    def _serialize_objects(objects, data_serializer_func):
+        """Serialize page objects, skipping (and reporting) any that fail"""
+        serialized_data = []
+        for obj in objects:
+            try:
+                serialized_obj = data_serializer_func(obj)
+                serialized_data.append(serialized_obj)
+            except Exception:
+                # Log the error but continue with other objects
+                logger.exception(f"Error serializing object {getattr(obj, 'id', 'unknown')}")
+                continue
+        return serialized_data
+    
+    @staticmethod
+    def create_cursor_paginated_response(request, queryset, data_serializer_func, ordering,
+                                         success_message=None, default_page_size=None):
+        """
+        Create a cursor-paginated response using the same envelope as page mode.
+        Count fields are None because keyset pagination never runs COUNT(*).
+        """
+        paginated_data = PaginationHelper.paginate_queryset_cursor(
+            request, queryset, ordering, default_page_size
+        )
+        serialized_data = PaginationHelper._serialize_objects(
+            paginated_data['objects'], data_serializer_func
+        )
+        
+        response_data = {
+            'success': True,
+            'data': serialized_data,
+            'results': serialized_data,  # Alternative field name for compatibility
+            'count': None,
+            'total': None,
+            'next': f"cursor={paginated_data['next_cursor']}" if paginated_data['has_next'] else None,
+            'previous': f"cursor={paginated_data['previous_cursor']}" if paginated_data['previous_cursor'] else None,
+            'pagination': {
+                'mode': 'cursor',
+                'page': None,
+                'page_size': paginated_data['per_page'],
+                'per_page': paginated_data['per_page'],
+                'total_pages': None,
+                'total_count': None,
+                'count_strategy': None,
+                'has_next': paginated_data['has_next'],
+                'has_previous': paginated_data['has_previous'],
+                'next_page': None,
+                'previous_page': None,
+                'cursor': paginated_data['cursor'],
+                'next_cursor': paginated_data['next_cursor'],
+                'previous_cursor': paginated_data['previous_cursor'],
+            },
+        }
+        
+        if success_message:
+            response_data['message'] = success_message
+        else:
+            response_data['message'] = f"Retrieved {len(serialized_data)} items successfully"
+        
+        return Response(response_data)
+    
     @staticmethod
     def create_paginated_response(request, queryset, data_serializer_func, 
-                                success_message=None, default_page_size=None):
+                                success_message=None, default_page_size=None,
+                                cursor_ordering=None, default_count_strategy=None):
         """
         Create a complete paginated response.
         
@@ -85,25 +399,28 @@ class PaginationHelper:
             data_serializer_func: Function to serialize each object in the queryset
             success_message: Optional success message
             default_page_size: Default page size if not specified
+            cursor_ordering: Optional stable ordering, e.g. ('registration_date', 'id').
+                When given, clients can opt into keyset pagination with ?pagination=cursor
+            default_count_strategy: CountStrategy used when ?count= is not given
         
         Returns:
             Response: DRF Response object with paginated data
         """
+        if cursor_ordering and PaginationHelper.is_cursor_request(request):
+            return PaginationHelper.create_cursor_paginated_response(
+                request, queryset, data_serializer_func, cursor_ordering,
+                success_message, default_page_size
+            )
+        
         # Get paginated data
         paginated_data = PaginationHelper.paginate_queryset(
-            request, queryset, default_page_size
+            request, queryset, default_page_size, default_count_strategy
         )
         
         # Serialize the objects
-        serialized_data = []
-        for obj in paginated_data['objects']:
-            try:
-                serialized_obj = data_serializer_func(obj)
-                serialized_data.append(serialized_obj)
-            except Exception as e:
-                # Log the error but continue with other objects
-                print(f"Error serializing object {obj.id if hasattr(obj, 'id') else 'unknown'}: {e}")
-                continue
+        serialized_data = PaginationHelper._serialize_objects(
+            paginated_data['objects'], data_serializer_func
+        )
         
         # Create response data with both new and legacy formats
         response_data = {
@@ -115,11 +432,13 @@ class PaginationHelper:
             'next': f"page={paginated_data['next_page']}" if paginated_data['has_next'] else None,
             'previous': f"page={paginated_data['previous_page']}" if paginated_data['has_previous'] else None,
             'pagination': {
+                'mode': 'page',
                 'page': paginated_data['page'],
                 'page_size': paginated_data['per_page'],
                 'per_page': paginated_data['per_page'],
                 'total_pages': paginated_data['total_pages'],
                 'total_count': paginated_data['total_count'],
+                'count_strategy': paginated_data['count_strategy'],
                 'has_next': paginated_data['has_next'],
                 'has_previous': paginated_data['has_previous'],
                 'next_page': paginated_data['next_page'],
@@ -165,7 +484,8 @@ class SearchPaginationHelper(PaginationHelper):
     
     @staticmethod
     def search_and_paginate(request, queryset, search_fields, data_serializer_func,
-                          success_message=None, default_page_size=None):
+                          success_message=None, default_page_size=None,
+                          cursor_ordering=None, default_count_strategy=None):
         """
         Search and paginate a queryset.
         
@@ -176,12 +496,12 @@ class SearchPaginationHelper(PaginationHelper):
             data_serializer_func: Function to serialize each object
             success_message: Optional success message
             default_page_size: Default page size if not specified
+            cursor_ordering: Optional stable ordering enabling ?pagination=cursor
+            default_count_strategy: CountStrategy used when ?count= is not given
         
         Returns:
             Response: DRF Response object with searched and paginated data
         """
-        from django.db.models import Q
-        
         # Get search query - support both 'q' and 'search' parameters
         search_query = request.GET.get('search', request.GET.get('q', '')).strip()
         
@@ -198,5 +518,7 @@ class SearchPaginationHelper(PaginationHelper):
                 success_message = f"Search results for '{search_query}'"
         
         return PaginationHelper.create_paginated_response(
-            request, queryset, data_serializer_func, success_message, default_page_size
+            request, queryset, data_serializer_func, success_message, default_page_size,
+            cursor_ordering=cursor_ordering,
+            default_count_strategy=default_count_strategy
         )
\ No newline at end of file
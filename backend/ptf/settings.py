@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 import dj_database_url
@@ -23,6 +24,7 @@ INSTALLED_APPS = [
     "django_extensions",
     "django.contrib.messages",
     "django.contrib.staticfiles",  # Needed for admin panel (even if no static files served)
+    "django.contrib.postgres",  # Trigram lookups for member search
     # Your apps
     "members",
     "accounts",
@@ -89,6 +91,71 @@ else:
         }
     }
 
+# CACHE CONFIG
+# CACHE_BACKEND selects the cache every worker shares:
+# - "sqlite" (default): one SQLite file per host, no external service.
+#   Only for single-host setups: other hosts and containers (scaled web
+#   instances, the invoice worker) never see its entries or invalidations
+# - "redis": REDIS_URL; shared across hosts, what deployments use (app.yaml)
+# - "locmem": per-process memory, the default for the test runner
+TESTING = "test" in sys.argv
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem" if TESTING else "sqlite")
+if CACHE_BACKEND == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0"),
+            "KEY_PREFIX": "ptf",
+        }
+    }
+elif CACHE_BACKEND == "locmem":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "ptf.cache_backends.SQLiteCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / "cache.sqlite3")),
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        }
+    }
+
+# Seconds cached values stay fresh, per namespace; override one with
+# CACHE_TTL_<NAMESPACE>, e.g. CACHE_TTL_ANALYTICS=900
+CACHE_TTLS = {
+    namespace: int(os.getenv(f"CACHE_TTL_{namespace.upper()}", default))
+    for namespace, default in {
+        "analytics": 600,
+        # Comprehensive analytics sections
+        "analytics_overview": 600,
+        "analytics_membership": 600,
+        "analytics_payments": 300,
+        "analytics_attendance": 300,
+        "analytics_revenue": 900,
+        "analytics_engagement": 1800,
+        "analytics_outdoor": 600,
+        "dashboard": 300,
+        "members": 300,
+        "memberships": 300,
+        "admin_dashboard": 30,
+        "session_stats": 60,
+        "admin_count": 300,
+        "cohorts": 86400,
+        # Rendered invoices; keys change with their content, so only memory is at stake
+        "invoices": 86400,
+    }.items()
+}
+
+# Compute comprehensive analytics sections concurrently on a small thread
+# pool (serial under the test runner). Each pool thread holds one database
+# connection, so keep ANALYTICS_WORKERS well below the connection limit
+ANALYTICS_PARALLEL = os.getenv("ANALYTICS_PARALLEL", "False" if TESTING else "True") == "True"
+ANALYTICS_WORKERS = max(1, int(os.getenv("ANALYTICS_WORKERS", "2")))
+
 # PASSWORD VALIDATION
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -232,5 +299,8 @@ DEFAULT_FROM_EMAIL = os.getenv(
 if DEBUG and not EMAIL_HOST_USER:
     EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
+# Memberships invoiced per batch by bulk invoice jobs (process_invoice_jobs)
+INVOICE_BATCH_SIZE = int(os.getenv("INVOICE_BATCH_SIZE", "50"))
+
 # ACTIVITY TRACKING
 ACTIVITY_UPDATE_THRESHOLD = int(os.getenv("ACTIVITY_UPDATE_THRESHOLD", "3"))
@@ -13,6 +13,10 @@ import { usePaymentsDue, usePaymentProcessor, usePaymentReminders } from '../../
 import { formatCurrency, formatDate } from '../../utils/formatters';
 import paymentService from '../../services/paymentService';
 
+// Bulk invoice progress is polled until the job finishes or this long has passed
+const BULK_INVOICE_POLL_MS = 2000;
+const BULK_INVOICE_WAIT_MS = 60000;
+
 const PaymentsDue = () => {
   const [selectedPayment, setSelectedPayment] = useState(null);
   const [showPaymentModal, setShowPaymentModal] = useState(false);
@@ -102,10 +106,26 @@ const PaymentsDue = () => {
         urgency: 'normal'
       });
 
-      showToast(
-        `Bulk invoices sent: ${result.summary.successful} successful, ${result.summary.failed} failed`,
-        result.summary.failed > 0 ? 'warning' : 'success'
-      );
+      // Invoices are sent in the background; report once the job finishes
+      showToast(result.message, 'success');
+      let job = result.job;
+      const deadline = Date.now() + BULK_INVOICE_WAIT_MS;
+      while ((job.status === 'queued' || job.status === 'running') && Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, BULK_INVOICE_POLL_MS));
+        job = (await paymentService.getBulkInvoiceStatus(job.job_id)).job;
+      }
+
+      if (job.status === 'queued' || job.status === 'running') {
+        // Not finished in time; the worker carries on without this page
+        showToast(`Bulk invoices queued (${job.processed}/${job.total} sent), check back later`, 'info');
+      } else if (job.status === 'failed') {
+        showToast(`Bulk invoices failed: ${job.error}`, 'error');
+      } else {
+        showToast(
+          `Bulk invoices sent: ${job.summary.successful} successful, ${job.summary.failed} failed`,
+          job.summary.failed > 0 ? 'warning' : 'success'
+        );
+      }
 
       refetch();
     } catch (error) {
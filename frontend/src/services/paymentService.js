@@ -211,6 +211,16 @@ export const paymentService = {
     }
   },
 
+  // Progress of a queued bulk invoice job
+  getBulkInvoiceStatus: async (jobId) => {
+    try {
+      const response = await apiClient.get(`/invoice/bulk/${jobId}/`);
+      return response.data;
+    } catch (error) {
+      throw new Error(error.response?.data?.error || 'Failed to fetch bulk invoice status');
+    }
+  },
+
   // Preview invoice for a member
   previewInvoice: async (memberId) => {
     try {
@@ -221,18 +231,18 @@ export const paymentService = {
     }
   },
 
-  // Download invoice as HTML file
+  // Download invoice as PDF file
   downloadInvoice: async (memberId) => {
     try {
-      const response = await apiClient.get(`/invoice/${memberId}/download/`, {
+      const response = await apiClient.get(`/invoice/${memberId}/pdf/`, {
         responseType: 'blob'
       });
 
       // Create download link
-      const url = window.URL.createObjectURL(new Blob([response.data]));
+      const url = window.URL.createObjectURL(new Blob([response.data], { type: 'application/pdf' }));
       const link = document.createElement('a');
       link.href = url;
-      link.setAttribute('download', `invoice_${memberId}.html`);
+      link.setAttribute('download', `invoice_${memberId}.pdf`);
       document.body.appendChild(link);
       link.click();
       link.remove();